@@ -0,0 +1,60 @@
+"""
+Startup benchmark for the on-disk code cache of `make_function`.
+
+Each run spawns fresh interpreters which generate `N_FUNCS` distinct functions
+through `decorative` and `adapt`, and reports the time spent doing so with the
+cache disabled, cold (empty cache directory) and warm.
+
+    python3 -m benchmarks.bench_code_cache
+"""
+import os
+import sys
+import tempfile
+import subprocess
+
+N_FUNCS = 500
+N_REPEATS = 5
+
+_WORKLOAD = f"""
+import time
+start = time.perf_counter()
+
+from nagisa.core.functools import decorative, adapt
+
+for i in range({N_FUNCS}):
+    params = ", ".join(f"a{{j}}" for j in range(i % 7 + 1))
+    ns = {{}}
+    exec(f"def f_{{i}}({{params}}, f=None): pass", ns)
+    decorative(name="f", f=ns[f"f_{{i}}"])
+    adapt(["x"], ns[f"f_{{i}}"], args=[f"x.{{j}}" for j in range(i % 7 + 1)], kwargs={{"f": f"x.n{{i}}"}})
+
+print(time.perf_counter() - start)
+"""
+
+
+def _run(cache_dir):
+    env = dict(os.environ)
+    env.pop("NAGISA_CODE_CACHE_DIR", None)
+    if cache_dir is not None:
+        env["NAGISA_CODE_CACHE_DIR"] = cache_dir
+    output = subprocess.check_output([sys.executable, "-c", _WORKLOAD], env=env)
+    return float(output)
+
+
+def main():
+    disabled = min(_run(None) for _ in range(N_REPEATS))
+
+    cold, warm = [], []
+    for _ in range(N_REPEATS):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(_run(cache_dir))
+            warm.append(_run(cache_dir))
+
+    print(f"generated functions: {N_FUNCS}")
+    print(f"  cache disabled: {disabled * 1000:8.2f} ms")
+    print(f"  cache cold:     {min(cold) * 1000:8.2f} ms")
+    print(f"  cache warm:     {min(warm) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
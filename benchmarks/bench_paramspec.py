@@ -0,0 +1,61 @@
+"""
+Benchmark for `match_spec`, comparing the memoized path against parsing the
+spec and introspecting the signature on every call, and measuring the cost
+of registering functions into a `ResourceItemRegistry`-like registry.
+
+    python3 -m benchmarks.bench_paramspec
+"""
+import timeit
+
+from nagisa.core.functools import paramspec
+from nagisa.core.misc.registry import MultiEntryConditionalFunctionRegistry
+
+N_FUNCS = 1000
+SPEC = ["cfg | c?", "meta | m?", ...]
+
+
+def _make_functions():
+    funcs = []
+    for i in range(N_FUNCS):
+        ns = {}
+        params = ", ".join(["cfg", "meta", "id"] + [f"dep{j}" for j in range(i % 5)])
+        exec(f"def res_{i}({params}): pass", ns)
+        funcs.append(ns[f"res_{i}"])
+    return funcs
+
+
+def _uncached(funcs):
+    for f in funcs:
+        paramspec._ParamSpecMatcher(SPEC, paramspec._get_params(f)).match()
+
+
+def _cached(funcs):
+    for f in funcs:
+        paramspec.match_spec(SPEC, f)
+
+
+def _register(funcs):
+    class _Registry(MultiEntryConditionalFunctionRegistry):
+        _func_spec_ = SPEC
+        _when_spec_ = ["cfg | c?", "meta | m?"]
+
+    registry = _Registry("bench")
+    for f in funcs:
+        registry.register(f.__name__, f)
+
+
+def main():
+    funcs = _make_functions()
+    number = 5
+
+    for name, fn in [
+        ("match_spec, uncached", _uncached),
+        ("match_spec, memoized", _cached),
+        ("registry registration", _register),
+    ]:
+        elapsed = min(timeit.repeat(lambda: fn(funcs), number=number, repeat=5)) / number
+        print(f"{name:24s} {elapsed / N_FUNCS * 1e6:8.2f} us/function")
+
+
+if __name__ == "__main__":
+    main()
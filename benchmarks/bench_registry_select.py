@@ -0,0 +1,54 @@
+"""
+Per-sample overhead of `DataResolver.get_item` with and without the selection
+cache of conditional function registries.
+
+    python3 -m benchmarks.bench_registry_select
+"""
+import timeit
+
+from nagisa.dl.torch.data import Resource, Item
+from nagisa.dl.torch.data._data_resolver import DataResolver
+from nagisa.dl.torch.data.dataset import DatasetMeta
+
+N_IDS = 2000
+N_VARIANTS = 8
+
+
+def _is_dataset(i):
+    return lambda m: m.name == f"dataset{i}"
+
+
+def _setup():
+    for i in range(N_VARIANTS):
+
+        @Resource.r("name")
+        @Resource.when(_is_dataset(i))
+        def name(id):  # pylint: disable=redefined-builtin
+            return id
+
+        @Item.r("item")
+        @Item.when(_is_dataset(i))
+        def item(id, name):  # pylint: disable=redefined-builtin
+            return name
+
+
+def _run(resolver):
+    for id in range(N_IDS):  # pylint: disable=redefined-builtin
+        with resolver.new_scope():
+            resolver.get_item(id, "item")
+
+
+def main():
+    _setup()
+    meta = DatasetMeta(name=f"dataset{N_VARIANTS - 1}", split="train")
+    resolver = DataResolver("mock", meta)
+
+    for enabled in (False, True):
+        Resource.cache_select = Item.cache_select = enabled
+        elapsed = min(timeit.repeat(lambda: _run(resolver), number=1, repeat=5))
+        label = "cached" if enabled else "uncached"
+        print(f"select {label:9s} {elapsed / N_IDS * 1e6:8.2f} us/sample")
+
+
+if __name__ == "__main__":
+    main()
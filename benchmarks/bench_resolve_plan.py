@@ -0,0 +1,72 @@
+"""
+Per-sample overhead of `DataResolver.get_item` with and without compiled plans,
+and the effect of computing independent I/O bound resources in threads.
+
+    python3 -m benchmarks.bench_resolve_plan
+"""
+import time
+import timeit
+
+from nagisa.dl.torch.data import Resource, Item
+from nagisa.dl.torch.data._data_resolver import DataResolver
+
+N_IDS = 2000
+N_IO_IDS = 50
+DEPTH = 6
+
+
+def _setup():
+    @Resource.r
+    def root():
+        return 0
+
+    @Resource.r("level0")
+    def level0(id, root):  # pylint: disable=redefined-builtin
+        return id + root
+
+    for i in range(1, DEPTH):
+        exec(  # pylint: disable=exec-used
+            f"@Resource.r\ndef level{i}(id, level{i - 1}):\n    return level{i - 1} + 1\n",
+            {"Resource": Resource},
+        )
+
+    exec(  # pylint: disable=exec-used
+        f"@Item.r\ndef item(id, level{DEPTH - 1}):\n    return level{DEPTH - 1}\n",
+        {"Item": Item},
+    )
+
+    for i in range(4):
+        exec(  # pylint: disable=exec-used
+            f"@Resource.r\ndef io{i}(id):\n    time.sleep(0.002)\n    return id\n",
+            {"Resource": Resource, "time": time},
+        )
+
+    @Item.r
+    def io_item(id, io0, io1, io2, io3):  # pylint: disable=redefined-builtin
+        return io0 + io1 + io2 + io3
+
+
+def _run(resolver, item_key, n_ids):
+    for id in range(n_ids):  # pylint: disable=redefined-builtin
+        with resolver.new_scope():
+            resolver.get_item(id, item_key)
+
+
+def main():
+    _setup()
+
+    resolver = DataResolver("mock", None)
+    for enabled in (False, True):
+        resolver.use_plans = enabled
+        elapsed = min(timeit.repeat(lambda: _run(resolver, "item", N_IDS), number=1, repeat=5))
+        label = "planned" if enabled else "recursive"
+        print(f"{label:18s} {elapsed / N_IDS * 1e6:8.2f} us/sample")
+
+    for threads in (0, 4):
+        resolver = DataResolver("mock", None, plan_threads=threads)
+        elapsed = min(timeit.repeat(lambda: _run(resolver, "io_item", N_IO_IDS), number=1, repeat=3))
+        print(f"io, {threads} threads{'':5s} {elapsed / N_IO_IDS * 1e6:8.2f} us/sample")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import importlib
+
+
+def _lazy_submodules(module_name, submodules):
+    submodules = frozenset(submodules)
+
+    def __getattr__(name):
+        if name in submodules:
+            return importlib.import_module(f"{module_name}.{name}")
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(module_name))) | submodules)
+
+    return __getattr__, __dir__
+
+
+__getattr__, __dir__ = _lazy_submodules(__name__, ["functools", "misc", "primitive", "state"])
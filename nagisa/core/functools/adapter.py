@@ -1,7 +1,8 @@
+import types
 import functools
 import itertools
 import importlib
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from typing import List, Dict, Callable, Optional, Any, Set
 
 from nagisa.core.misc.naming import isidentifier, isaccessor
@@ -17,6 +18,9 @@ __all__ = [
 
 _ParsedMapping = namedtuple("_ParsedMapping", ("args", "kwargs"))
 
+_ADAPTER_CODE_CACHE_SIZE = 4096
+_adapter_code_cache = OrderedDict()
+
 
 class _Adapter:
     def __init__(self, signature, f, args, kwargs):
@@ -100,7 +104,7 @@ class _Adapter:
         if not self.used_names:
             return ""
 
-        return f"""___INPUT___ = dict({', '.join(x + '=' + x for x in self.used_names)})"""
+        return f"""___INPUT___ = dict({', '.join(x + '=' + x for x in sorted(self.used_names))})"""
 
     def _snippet_func_body_(self):
         str_arg_list = self._snippet_call_func_()
@@ -111,21 +115,69 @@ class _Adapter:
             return ___FUNC___({str_arg_list})
         """
 
+    def compile(self) -> types.CodeType:
+        return make_function(self.f.__name__, self._snippet_func_body_()).__code__
+
     def make(self):
-        func_name = self.f.__name__
-        new_f = make_function(
-            func_name,
-            self._snippet_func_body_(),
-            globals=dict(
-                dict=dict,
-                ___FUNC___=self.f,
-                ___ACCESSOR_GET___=importlib.import_module('nagisa.core.misc.accessor').get,
-            ),
+        return _bind_adapter_code(self.compile(), self.f)
+
+
+def _freeze_accessor(accessor: Any):
+    T = type(accessor)
+    if T in (tuple, list):
+        return (T, tuple(map(_freeze_accessor, accessor)))
+    if T is dict:
+        return (T, tuple((k, _freeze_accessor(v)) for k, v in accessor.items()))
+    return accessor
+
+
+def _adapter_cache_key(signature, args, kwargs) -> Optional[tuple]:
+    try:
+        key = (
+            tuple(signature),
+            None if args is None else _freeze_accessor(args),
+            None if kwargs is None else _freeze_accessor(kwargs),
         )
-        functools.update_wrapper(new_f, self.f)
+        hash(key)
+    except TypeError:
+        return None
+    return key
 
-        new_f.__is_adapter__ = True
-        return new_f
+
+def _bind_adapter_code(code: types.CodeType, f: Callable) -> Callable:
+    new_f = types.FunctionType(
+        code,
+        dict(
+            dict=dict,
+            ___FUNC___=f,
+            ___ACCESSOR_GET___=importlib.import_module('nagisa.core.misc.accessor').get,
+        ),
+        f.__name__,
+    )
+    functools.update_wrapper(new_f, f)
+
+    new_f.__is_adapter__ = True
+    return new_f
+
+
+def _make_adapter(signature, f, args, kwargs) -> Callable:
+    assert callable(f)
+
+    key = _adapter_cache_key(signature, args, kwargs)
+    code = _adapter_code_cache.get(key) if key is not None else None
+    if code is None:
+        code = _Adapter(signature, f, args, kwargs).compile()
+        if key is not None:
+            _adapter_code_cache[key] = code
+            if len(_adapter_code_cache) > _ADAPTER_CODE_CACHE_SIZE:
+                _adapter_code_cache.popitem(last=False)
+    else:
+        try:
+            _adapter_code_cache.move_to_end(key)
+        except KeyError:
+            pass
+
+    return _bind_adapter_code(code, f)
 
 
 @decorative(name='f')
@@ -136,7 +188,7 @@ def adapt(
     args: Optional[List] = None,
     kwargs: Optional[Dict] = None,
 ) -> Callable:
-    return _Adapter(signature, f, args, kwargs).make()
+    return _make_adapter(signature, f, args, kwargs)
 
 
 def make_annotator(
@@ -168,10 +220,46 @@ def make_annotator(
     return _decorator
 
 
+def _copy_function(f: types.FunctionType) -> types.FunctionType:
+    new_f = types.FunctionType(f.__code__, f.__globals__, f.__name__, f.__defaults__, f.__closure__)
+    new_f.__kwdefaults__ = f.__kwdefaults__
+    functools.update_wrapper(new_f, f)
+    return new_f
+
+
+def _is_placeholder_name(name: str) -> bool:
+    return name[:1] == '_' and name[1:].isdigit()
+
+
+def _is_identity_mapping(f: Callable, signature: List[str], args: List) -> bool:
+    if type(f) is not types.FunctionType or args != signature:
+        return False
+
+    code = f.__code__
+    if code.co_kwonlyargcount or code.co_argcount != len(signature):
+        return False
+
+    # Placeholder names are generated for `*` and `...` positions and are
+    # never passed by keyword, so only the spec-given names have to agree.
+    params = code.co_varnames[:code.co_argcount]
+    return all(
+        name == param or _is_placeholder_name(name) and name not in params
+        for name, param in zip(signature, params)
+    )
+
+
 @decorative(name='f')
 def adapt_spec(spec, f: Optional[Callable] = None, keep_meta: bool = False) -> Callable:
     remaining, signature, args = match_spec(spec, f)
-    new_f = adapt(signature, f, args=args)
+    if _is_identity_mapping(f, signature, args):
+        # `f` can already be called the way the spec demands, so expose a copy
+        # sharing its code instead of paying an extra frame on every call. The
+        # copy carries the adapter metadata, leaving `f` free to be adapted to
+        # other specs.
+        new_f = _copy_function(f)
+        new_f.__is_adapter__ = True
+    else:
+        new_f = adapt(signature, f, args=args)
 
     if keep_meta:
         new_f.__remaining__ = remaining
@@ -1,17 +1,91 @@
+import os
+import sys
 import types
+import marshal
 import inspect
+import hashlib
+import tempfile
 import textwrap
 import functools
+import importlib.util
 from typing import Optional, Callable
 
 __all__ = [
     'make_function',
+    'set_code_cache_dir',
     'emulate',
     'wraps',
     'decorative',
 ]
 
 
+_CODE_CACHE_ENVVAR = 'NAGISA_CODE_CACHE_DIR'
+_code_cache_dir = os.environ.get(_CODE_CACHE_ENVVAR) or None
+
+
+def set_code_cache_dir(path: Optional[str]) -> Optional[str]:
+    """
+    Set the directory where `make_function` persists compiled code. `None`
+    disables the on-disk cache. Returns the previous directory.
+    """
+    global _code_cache_dir
+    previous, _code_cache_dir = _code_cache_dir, None if path is None else os.fspath(path)
+    return previous
+
+
+def _code_cache_filename(source: str) -> str:
+    digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    return os.path.join(_code_cache_dir, f'{digest}.{sys.implementation.cache_tag}.code')
+
+
+def _load_cached_code(filename: str) -> Optional[types.CodeType]:
+    magic = importlib.util.MAGIC_NUMBER
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if not data.startswith(magic):
+        return None
+    try:
+        code = marshal.loads(data[len(magic):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return code if isinstance(code, types.CodeType) else None
+
+
+def _dump_cached_code(filename: str, code: types.CodeType):
+    # Write to a temp file first so that concurrent processes never observe
+    # a partially written cache entry.
+    try:
+        os.makedirs(_code_cache_dir, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=_code_cache_dir, suffix='.tmp')
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(importlib.util.MAGIC_NUMBER)
+            f.write(marshal.dumps(code))
+        os.replace(tmp_name, filename)
+    except OSError:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def _compile_source(source: str) -> types.CodeType:
+    if _code_cache_dir is None:
+        return compile(source, "<string>", "exec")
+
+    filename = _code_cache_filename(source)
+    code = _load_cached_code(filename)
+    if code is None:
+        code = compile(source, "<string>", "exec")
+        _dump_cached_code(filename, code)
+    return code
+
+
 # pylint: disable=redefined-builtin
 def make_function(
     name: str,
@@ -21,7 +95,7 @@ def make_function(
     globals: Optional[dict] = None,
 ) -> Callable:
     body = textwrap.dedent(body)
-    code = compile(body, "<string>", "exec")
+    code = _compile_source(body)
     if globals is None:
         globals = {}
 
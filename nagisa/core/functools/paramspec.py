@@ -1,7 +1,9 @@
 import re
+import types
 import inspect
+import functools
 from collections import namedtuple
-from typing import Union, List, Callable, Optional
+from typing import Union, List, Callable, Optional, Tuple
 
 __all__ = [
     "match_spec",
@@ -13,45 +15,94 @@ ParamsSpecType = List[Union[str, type(Ellipsis)]]
 
 _param_spec_pattern = re.compile(r"^(?P<names>[\w\s\|]+)\s*(?P<optional>\?)?|(?P<placeholder>\*)$")
 
+_SPEC_CACHE_SIZE = 1024
+_PARAMS_CACHE_SIZE = 8192
+_MATCH_CACHE_SIZE = 8192
+
+
+def _parse_param_spec(spec_item: str) -> Optional[_ParsedParamSpec]:
+    matched = _param_spec_pattern.match(spec_item)
+
+    if matched is None:
+        return None
+
+    if matched.group("placeholder") is not None:
+        return _ParsedParamSpec("", frozenset(), False, True)
+
+    names = [x.strip() for x in re.split(r"\s*\|\s*", matched.group("names"))]
+    if not all(map(str.isidentifier, names)):
+        return None
+
+    return _ParsedParamSpec(
+        name=names[0],
+        aliases=frozenset(names),
+        optional=matched.group("optional") is not None,
+        placeholder=False,
+    )
+
+
+def _parse_spec_list(spec) -> Tuple[Tuple[_ParsedParamSpec, ...], bool]:
+    parsed_specs = []
+    has_remaining = False
+    for i, x in enumerate(spec):
+        if x is ...:
+            if i != len(spec) - 1:
+                raise RuntimeError("... should be at the last of spec")
+            has_remaining = True
+            continue
+
+        if not isinstance(x, str):
+            raise RuntimeError(f"Bad param spec: {x!r}")
+        parsed_spec_item = _parse_param_spec(x)
+        if parsed_spec_item is None:
+            raise RuntimeError(f"Bad param spec: {x!r}")
+        parsed_specs.append(parsed_spec_item)
+
+    return tuple(parsed_specs), has_remaining
+
+
+_parse_spec_list_cached = functools.lru_cache(maxsize=_SPEC_CACHE_SIZE)(_parse_spec_list)
+
+
+def _get_params(f: Callable) -> Tuple[str, ...]:
+    sig = inspect.signature(f)
+    if not all(p.kind in (
+            inspect.Parameter.POSITIONAL_ONLY,
+            inspect.Parameter.POSITIONAL_OR_KEYWORD,
+    ) for p in sig.parameters.values()):
+        raise TypeError(f"Expect all arguments of {f} to be positional, got {sig}")
+    return tuple(sig.parameters)
+
+
+@functools.lru_cache(maxsize=_PARAMS_CACHE_SIZE)
+def _get_params_by_code(code: types.CodeType) -> Optional[Tuple[str, ...]]:
+    if code.co_kwonlyargcount or code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS):
+        return None
+    return tuple(code.co_varnames[:code.co_argcount])
+
+
+def _get_params_cached(f: Callable) -> Tuple[str, ...]:
+    # For plain functions the parameter list is fully determined by the code
+    # object, unless `inspect.signature` is redirected by `__signature__` or
+    # `__wrapped__`.
+    if type(f) is types.FunctionType:
+        attrs = f.__dict__
+        if "__wrapped__" not in attrs and "__signature__" not in attrs:
+            params = _get_params_by_code(f.__code__)
+            if params is not None:
+                return params
+
+    return _get_params(f)
+
 
 class _ParamSpecMatcher:
-    def __init__(self, spec: ParamsSpecType, f: Callable):
-        self.parsed_specs = []
-        self.has_remaining = False
+    def __init__(self, spec: ParamsSpecType, params: Tuple[str, ...], parsed=None):
         self.spec = spec
-        self.params = self._check_static_and_get_params_(f)
-        self._parse_specs_(spec)
-
-    @staticmethod
-    def _check_static_and_get_params_(f: Callable) -> List[str]:
-        sig = inspect.signature(f)
-        if not all(p.kind in (
-                inspect.Parameter.POSITIONAL_ONLY,
-                inspect.Parameter.POSITIONAL_OR_KEYWORD,
-        ) for p in sig.parameters.values()):
-            raise TypeError(f"Expect all arguments of {f} to be positional, got {sig}")
-        return list(sig.parameters)
-
-    @staticmethod
-    def _parse_param_spec_(spec_item: str) -> Optional[_ParsedParamSpec]:
-        matched = _param_spec_pattern.match(spec_item)
-
-        if matched is None:
-            return None
-
-        if matched.group("placeholder") is not None:
-            return _ParsedParamSpec("", frozenset(), False, True)
-
-        names = [x.strip() for x in re.split(r"\s*\|\s*", matched.group("names"))]
-        if not all(map(str.isidentifier, names)):
-            return None
-
-        return _ParsedParamSpec(
-            name=names[0],
-            aliases=frozenset(names),
-            optional=matched.group("optional") is not None,
-            placeholder=False,
-        )
+        self.params = list(params)
+        if parsed is None:
+            parsed = _parse_spec_list(spec)
+        parsed_specs, self.has_remaining = parsed
+        self.parsed_specs = list(parsed_specs)
 
     def _name_generator_(self):
         used_names = set(x.name for x in self.parsed_specs) | set(self.params)
@@ -64,21 +115,6 @@ class _ParamSpecMatcher:
                 yield name
             counter += 1
 
-    def _parse_specs_(self, spec):
-        for i, x in enumerate(spec):
-            if x is ...:
-                if i != len(spec) - 1:
-                    raise RuntimeError("... should be at the last of spec")
-                self.has_remaining = True
-                continue
-
-            if not isinstance(x, str):
-                raise RuntimeError(f"Bad param spec: {x!r}")
-            parsed_spec_item = self._parse_param_spec_(x)
-            if parsed_spec_item is None:
-                raise RuntimeError(f"Bad param spec: {x!r}")
-            self.parsed_specs.append(parsed_spec_item)
-
     def match(self):
         adapter_signature = []
         adapter_args = []
@@ -131,5 +167,20 @@ class _ParamSpecMatcher:
         return Matched(remaining, adapter_signature, adapter_args)
 
 
+@functools.lru_cache(maxsize=_MATCH_CACHE_SIZE)
+def _match_cached(spec: tuple, params: Tuple[str, ...]) -> Matched:
+    return _ParamSpecMatcher(list(spec), params, parsed=_parse_spec_list_cached(spec)).match()
+
+
 def match_spec(spec: ParamsSpecType, f: Callable) -> Matched:
-    return _ParamSpecMatcher(spec, f).match()
+    params = _get_params_cached(f)
+
+    try:
+        spec_key = tuple(spec)
+        hash(spec_key)
+    except TypeError:
+        return _ParamSpecMatcher(spec, params).match()
+
+    matched = _match_cached(spec_key, params)
+    # Hand out fresh lists so that callers never mutate the cached result.
+    return Matched(*map(list, matched))
@@ -0,0 +1,15 @@
+from nagisa.core import _lazy_submodules
+
+__getattr__, __dir__ = _lazy_submodules(
+    __name__,
+    [
+        "accessor",
+        "cache",
+        "io",
+        "naming",
+        "progressbar",
+        "registry",
+        "serialization",
+        "testing",
+    ],
+)
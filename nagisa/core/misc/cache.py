@@ -1,29 +1,530 @@
+import io
+import os
+import sys
 import enum
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
 import contextlib
+import collections
+import concurrent.futures
+
+
+def fingerprint(obj):
+    """
+    Returns a hashable value which changes whenever `obj` changes. Objects
+    may customize it by defining `_fingerprint_()`. Raises `TypeError` if no
+    fingerprint can be derived.
+    """
+    custom = getattr(obj, "_fingerprint_", None)
+    if custom is not None:
+        return custom()
+
+    hash(obj)
+    return obj
+
+
+def estimate_size(value) -> int:
+    """
+    Estimates memory held by `value` in bytes. Arrays and tensors report their
+    buffer size, other objects fall back to `sys.getsizeof`.
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    return sys.getsizeof(value)
+
+
+_policy_classes = {}
+
+
+class EvictionPolicy:
+    """
+    Tracks keys stored in a `Cache` and decides which of them to evict when
+    the cache exceeds its limits.
+    """
+    def __init_subclass__(cls, key=None):
+        if key is not None:
+            _policy_classes[key] = cls
+
+    def on_set(self, key):
+        pass
+
+    def on_get(self, key):
+        pass
+
+    def on_delete(self, key):
+        pass
+
+    def expired(self, key) -> bool:
+        return False
+
+    def expired_keys(self):
+        return ()
+
+    def victim(self):
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy, key="lru"):
+    def __init__(self):
+        self._order_ = collections.OrderedDict()
+
+    def on_set(self, key):
+        self._order_[key] = None
+        self._order_.move_to_end(key)
+
+    def on_get(self, key):
+        self._order_.move_to_end(key)
+
+    def on_delete(self, key):
+        self._order_.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order_))
+
+
+class LFUPolicy(EvictionPolicy, key="lfu"):
+    def __init__(self):
+        self._freqs_ = {}
+        # Keys of equal frequency are kept in LRU order to break ties
+        self._buckets_ = collections.defaultdict(collections.OrderedDict)
+        self._min_freq_ = 0
+
+    def _unlink_(self, key):
+        freq = self._freqs_.pop(key)
+        bucket = self._buckets_[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets_[freq]
+        return freq
+
+    def _link_(self, key, freq):
+        self._freqs_[key] = freq
+        self._buckets_[freq][key] = None
+
+    def on_set(self, key):
+        if key in self._freqs_:
+            self.on_get(key)
+        else:
+            self._link_(key, 1)
+            self._min_freq_ = 1
+
+    def on_get(self, key):
+        freq = self._unlink_(key)
+        self._link_(key, freq + 1)
+        if self._min_freq_ not in self._buckets_:
+            self._min_freq_ = freq + 1
+
+    def on_delete(self, key):
+        if key not in self._freqs_:
+            return
+        self._unlink_(key)
+        if self._buckets_ and self._min_freq_ not in self._buckets_:
+            self._min_freq_ = min(self._buckets_)
+
+    def victim(self):
+        return next(iter(self._buckets_[self._min_freq_]))
+
+
+class TTLPolicy(EvictionPolicy, key="ttl"):
+    def __init__(self, ttl: float = 60.0, clock=time.monotonic):
+        self._ttl_ = ttl
+        self._clock_ = clock
+        self._deadlines_ = collections.OrderedDict()
+
+    def on_set(self, key):
+        self._deadlines_[key] = self._clock_() + self._ttl_
+        self._deadlines_.move_to_end(key)
+
+    def on_delete(self, key):
+        self._deadlines_.pop(key, None)
+
+    def expired(self, key) -> bool:
+        return self._deadlines_[key] <= self._clock_()
+
+    def expired_keys(self):
+        # Deadlines are kept in ascending order since the TTL is fixed
+        now = self._clock_()
+        for key, deadline in self._deadlines_.items():
+            if deadline > now:
+                break
+            yield key
+
+    def victim(self):
+        return next(iter(self._deadlines_))
+
+
+def _build_policy(policy) -> EvictionPolicy:
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    if isinstance(policy, type) and issubclass(policy, EvictionPolicy):
+        return policy()
+    if policy not in _policy_classes:
+        raise ValueError(f"Unknown eviction policy {policy!r}")
+    return _policy_classes[policy]()
+
+
+class CacheStats:
+    """
+    Counts hits, misses, evictions, stored bytes and time spent computing
+    missed values of a `Cache`, grouped by key prefix. Tuple keys are grouped
+    by their element at `prefix_index`, other keys by themselves. Instances
+    are picklable and can be combined with `merge()`, e.g. across DataLoader
+    workers.
+    """
+
+    fields = ("hits", "misses", "evictions", "nbytes", "compute_time")
+
+    def __init__(self, prefix_index=0):
+        self._prefix_index_ = prefix_index
+        self._records_ = {}
+
+    def _record_(self, key):
+        if isinstance(key, tuple) and len(key) > self._prefix_index_:
+            key = key[self._prefix_index_]
+        record = self._records_.get(key)
+        if record is None:
+            record = self._records_[key] = [0, 0, 0, 0, 0.0]
+        return record
+
+    def record_hit(self, key):
+        self._record_(key)[0] += 1
+
+    def record_miss(self, key):
+        self._record_(key)[1] += 1
+
+    def record_eviction(self, key):
+        self._record_(key)[2] += 1
+
+    def record_nbytes(self, key, delta: int):
+        self._record_(key)[3] += delta
+
+    def record_compute_time(self, key, seconds: float):
+        self._record_(key)[4] += seconds
+
+    def as_dict(self) -> dict:
+        return {prefix: dict(zip(self.fields, record)) for prefix, record in self._records_.items()}
+
+    def totals(self) -> dict:
+        return dict(zip(self.fields, map(sum, zip(*self._records_.values()))))
+
+    def reset(self, keep_nbytes=False):
+        if not keep_nbytes:
+            self._records_.clear()
+            return
+        for record in self._records_.values():
+            record[:] = [0, 0, 0, record[3], 0.0]
+
+    @classmethod
+    def merge(cls, *stats_list):
+        merged = cls(stats_list[0]._prefix_index_ if stats_list else 0)
+        for stats in stats_list:
+            for prefix, record in stats._records_.items():
+                merged_record = merged._records_.setdefault(prefix, [0, 0, 0, 0, 0.0])
+                for i, value in enumerate(record):
+                    merged_record[i] += value
+        return merged
 
 
 class Cache:
 
     Empty = object()
 
-    def __init__(self):
+    def __init__(
+        self,
+        policy=None,
+        *,
+        max_entries=None,
+        max_bytes=None,
+        size_of=estimate_size,
+        stats=None,
+    ):
         self._store_ = {}
 
+        if policy is None and (max_entries is not None or max_bytes is not None):
+            policy = "lru"
+        self._policy_ = None if policy is None else _build_policy(policy)
+        self._max_entries_ = max_entries
+        self._max_bytes_ = max_bytes
+        self._size_of_ = size_of
+        self._sizes_ = {}
+        self._nbytes_ = 0
+        # Pinned keys are never evicted and do not count towards the limits
+        self._pinned_ = set()
+        self._pinned_nbytes_ = 0
+
+        if stats is True:
+            stats = CacheStats()
+        elif stats is False:
+            stats = None
+        self._stats_ = stats
+        self._track_sizes_ = max_bytes is not None or stats is not None
+
     def _encode_key_(self, key):
         if isinstance(key, list):
             return tuple(key)
         return key
 
+    def __len__(self):
+        return len(self._store_)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes_
+
+    @property
+    def stats(self):
+        return self._stats_
+
+    def _over_limits_(self):
+        return (
+            self._max_entries_ is not None
+            and len(self._store_) - len(self._pinned_) > self._max_entries_
+            or self._max_bytes_ is not None
+            and self._nbytes_ - self._pinned_nbytes_ > self._max_bytes_
+        )
+
+    def _evict_(self, key):
+        if self._stats_ is not None:
+            self._stats_.record_eviction(key)
+        self._delete_(key)
+
+    def _delete_(self, key):
+        if key not in self._store_:
+            return False
+        del self._store_[key]
+        pinned = key in self._pinned_
+        if pinned:
+            self._pinned_.remove(key)
+        elif self._policy_ is not None:
+            self._policy_.on_delete(key)
+        if self._track_sizes_:
+            size = self._sizes_.pop(key)
+            self._nbytes_ -= size
+            if pinned:
+                self._pinned_nbytes_ -= size
+            if self._stats_ is not None:
+                self._stats_.record_nbytes(key, -size)
+        return True
+
     def set(self, key, value):
-        key = self._encode_key_(key)
+        self._set_(self._encode_key_(key), value)
+
+    def _set_(self, key, value, pinned=False):
+        policy = self._policy_
+        if policy is None and not self._track_sizes_:
+            if pinned:
+                self._pinned_.add(key)
+            else:
+                self._pinned_.discard(key)
+            self._store_[key] = value
+            return
+
+        self._delete_(key)
+        if policy is not None:
+            for expired_key in list(policy.expired_keys()):
+                self._evict_(expired_key)
+
+        if self._track_sizes_:
+            size = self._size_of_(value)
+            self._nbytes_ += size
+            self._sizes_[key] = size
+            if pinned:
+                self._pinned_nbytes_ += size
+            if self._stats_ is not None:
+                self._stats_.record_nbytes(key, size)
         self._store_[key] = value
+        if pinned:
+            self._pinned_.add(key)
+            return
+        if policy is None:
+            return
+
+        # Victims are chosen before the policy learns about `key`, so that a
+        # new entry is never evicted in favor of older ones
+        while len(self._store_) - len(self._pinned_) > 1 and self._over_limits_():
+            self._evict_(policy.victim())
+        policy.on_set(key)
+        if self._over_limits_():
+            self._evict_(key)
 
     def get(self, key):
         key = self._encode_key_(key)
-        return self._store_.get(key, self.Empty)
+        policy = self._policy_
+        if policy is None and self._stats_ is None:
+            return self._store_.get(key, self.Empty)
+
+        value = self._store_.get(key, self.Empty)
+        if value is not self.Empty and policy is not None and key not in self._pinned_:
+            if policy.expired(key):
+                self._evict_(key)
+                value = self.Empty
+            else:
+                policy.on_get(key)
+
+        if self._stats_ is not None:
+            if value is self.Empty:
+                self._stats_.record_miss(key)
+            else:
+                self._stats_.record_hit(key)
+        return value
+
+    def get_or_compute(self, key, compute, record_time=True, **kwargs):
+        """
+        Returns the value of `key`, calling `compute()` and storing its result
+        on miss. Extra keyword arguments are passed to `set()`. If
+        `record_time` is False, time spent in `compute()` is left for the
+        caller to record, e.g. when it includes computing other keys.
+        """
+        value = self.get(key)
+        if value is not self.Empty:
+            return value
+
+        start = time.perf_counter()
+        value = compute()
+        if record_time and self._stats_ is not None:
+            self._stats_.record_compute_time(self._encode_key_(key), time.perf_counter() - start)
+        self.set(key, value, **kwargs)
+        return value
+
+    def has(self, key):
+        key = self._encode_key_(key)
+        if key not in self._store_:
+            return False
+        if self._policy_ is not None and key not in self._pinned_ and self._policy_.expired(key):
+            self._evict_(key)
+            return False
+        return True
+
+    def delete(self, key):
+        return self._delete_(self._encode_key_(key))
+
+    def clear(self):
+        for key in list(self._store_):
+            self._delete_(key)
+
+
+def _is_tensor(value) -> bool:
+    return type(value).__module__.startswith("torch") and hasattr(value, "numpy")
+
+
+def _is_array(value) -> bool:
+    return type(value).__module__ == "numpy" and type(value).__name__ == "ndarray"
+
+
+class DiskCache(Cache):
+    """
+    A persistent cache tier in a local directory. Values are stored
+    content-addressed under `objects/`, with one small file under `keys/`
+    per key pointing to its object. Arrays and tensors are stored in `.npy`
+    format and memory-mapped copy-on-write when loaded, anything else is
+    pickled. Keys are identified by their `repr()`.
+    """
+    def __init__(self, root):
+        super().__init__()
+        self.root = os.fspath(root)
+        self._keys_dir_ = os.path.join(self.root, "keys")
+        self._objects_dir_ = os.path.join(self.root, "objects")
+
+    @staticmethod
+    def _digest_(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _key_path_(self, key) -> str:
+        return os.path.join(self._keys_dir_, self._digest_(repr(key).encode("utf-8")))
+
+    def _write_atomic_(self, dirname, filename, data: bytes):
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, os.path.join(dirname, filename))
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    @staticmethod
+    def _serialize_(value):
+        if _is_tensor(value):
+            kind, value = "tensor", value.detach().cpu().numpy()
+        elif _is_array(value) and not value.dtype.hasobject:
+            kind = "array"
+        else:
+            return "pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        import numpy as np
+
+        buffer = io.BytesIO()
+        np.save(buffer, value, allow_pickle=False)
+        return kind, buffer.getvalue()
+
+    def _load_object_(self, object_name):
+        path = os.path.join(self._objects_dir_, object_name)
+        kind = object_name.rpartition(".")[2]
+        if kind == "pickle":
+            with open(path, "rb") as f:
+                return pickle.load(f)
+
+        import numpy as np
+
+        array = np.load(path, mmap_mode="c", allow_pickle=False)
+        if kind == "tensor":
+            import torch
+            return torch.from_numpy(array)
+        return array
+
+    def set(self, key, value):
+        key = self._encode_key_(key)
+        kind, data = self._serialize_(value)
+        object_name = f"{self._digest_(data)}.{kind}"
+        if not os.path.exists(os.path.join(self._objects_dir_, object_name)):
+            self._write_atomic_(self._objects_dir_, object_name, data)
+
+        key_path = self._key_path_(key)
+        self._write_atomic_(self._keys_dir_, os.path.basename(key_path), object_name.encode())
+
+    def get(self, key):
+        key = self._encode_key_(key)
+        try:
+            with open(self._key_path_(key), "rb") as f:
+                object_name = f.read().decode()
+            return self._load_object_(object_name)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return self.Empty
 
     def has(self, key):
-        return self._encode_key_(key) in self._store_
+        key = self._encode_key_(key)
+        try:
+            with open(self._key_path_(key), "rb") as f:
+                object_name = f.read().decode()
+        except OSError:
+            return False
+        return os.path.exists(os.path.join(self._objects_dir_, object_name))
+
+    def delete(self, key):
+        try:
+            os.remove(self._key_path_(self._encode_key_(key)))
+        except OSError:
+            return False
+        return True
+
+    def __len__(self):
+        if not os.path.isdir(self._keys_dir_):
+            return 0
+        return sum(1 for name in os.listdir(self._keys_dir_) if not name.endswith(".tmp"))
+
+    def clear(self):
+        for dirname in (self._keys_dir_, self._objects_dir_):
+            if not os.path.isdir(dirname):
+                continue
+            for name in os.listdir(dirname):
+                os.remove(os.path.join(dirname, name))
 
 
 class Scope(enum.IntEnum):
@@ -32,25 +533,184 @@ class Scope(enum.IntEnum):
 
 
 class ScopedCache(Cache):
-    def __init__(self):
-        super().__init__()
-        self.__key_stack__ = [[]]
+    """
+    A `Cache` whose LOCAL entries are dropped when the innermost scope exits.
+    GLOBAL entries are never evicted, and limits of the cache only apply to
+    LOCAL ones.
+
+    If `retain` is given, dropped entries are moved into a secondary `Cache`
+    built with `retain` as keyword arguments (e.g. `{"policy": "lfu",
+    "max_bytes": 2 ** 30}`) instead, so that hot entries survive their scope
+    within a bounded budget.
+    """
+    def __init__(self, *args, retain=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Each scope holds its keys as an insertion-ordered set
+        self.__key_stack__ = [{}]
+        # Key -> the scope holding it, so that keys leave their scope when evicted
+        self._key_scopes_ = {}
+        self._retained_ = None if retain is None else Cache(**retain)
+
+    def _key_stack_(self):
+        return self.__key_stack__
+
+    @property
+    def retained(self):
+        return self._retained_
+
+    def _unscope_(self, key):
+        key_scope = self._key_scopes_.pop(key, None)
+        if key_scope is not None:
+            del key_scope[key]
+
+    def _delete_(self, key):
+        deleted = super()._delete_(key)
+        if deleted:
+            self._unscope_(key)
+        return deleted
 
     def set(self, key, value, scope=Scope.GLOBAL):
         key = self._encode_key_(key)
-        super().set(key, value)
+        if self._retained_ is not None:
+            self._retained_.delete(key)
+        self._unscope_(key)
+        self._set_(key, value, pinned=scope == Scope.GLOBAL)
+        if key not in self._store_:
+            # Rejected by the limits of the cache
+            return
         stack_index = {
             Scope.GLOBAL: 0,
             Scope.LOCAL: -1,
         }[scope]
-        self.__key_stack__[stack_index].append(key)
+        key_scope = self._key_stack_()[stack_index]
+        key_scope[key] = None
+        self._key_scopes_[key] = key_scope
+
+    def get(self, key):
+        if self._retained_ is None:
+            return super().get(key)
+
+        key = self._encode_key_(key)
+        value = self._retained_.get(key)
+        if value is self.Empty:
+            return super().get(key)
+        if self._stats_ is not None:
+            self._stats_.record_hit(key)
+        return value
+
+    def has(self, key):
+        return super().has(key) or self._retained_ is not None and self._retained_.has(key)
+
+    def delete(self, key):
+        deleted = super().delete(key)
+        if self._retained_ is not None:
+            deleted = self._retained_.delete(key) or deleted
+        return deleted
+
+    def clear(self):
+        super().clear()
+        if self._retained_ is not None:
+            self._retained_.clear()
+
+    def release(self, keys):
+        """
+        Ends the lifetime of LOCAL `keys`, moving them into the retained cache
+        if there is one.
+        """
+        for key in list(keys):
+            key = self._encode_key_(key)
+            value = self._store_.get(key, self.Empty)
+            if self._delete_(key) and self._retained_ is not None:
+                self._retained_.set(key, value)
 
     @contextlib.contextmanager
-    def new_scope(self):
-        self.__key_stack__.append([])
+    def new_scope(self, release=True):
+        """
+        Opens a scope for LOCAL entries, yielding the keys it holds. Unless
+        `release` is False, the entries are released when the scope exits;
+        otherwise they outlive it until passed to `release()`.
+        """
+        key_stack = self._key_stack_()
+        key_stack.append({})
+
+        try:
+            yield key_stack[-1]
+        finally:
+            keys = key_stack.pop(-1)
+            if release:
+                self.release(keys)
+
+
+class ConcurrentScopedCache(ScopedCache):
+    """
+    A thread-safe `ScopedCache`. Each thread has its own stack of scopes, and
+    concurrent `get_or_compute()` calls for the same key wait for a single
+    computation instead of duplicating it.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_ = threading.RLock()
+        self._local_ = threading.local()
+        self._flights_ = {}
+
+    def _key_stack_(self):
+        key_stack = getattr(self._local_, "key_stack", None)
+        if key_stack is None:
+            # GLOBAL keys are shared by all threads
+            key_stack = self._local_.key_stack = [self.__key_stack__[0]]
+        return key_stack
+
+    def set(self, key, value, scope=Scope.GLOBAL):
+        with self._lock_:
+            super().set(key, value, scope)
+
+    def get(self, key):
+        with self._lock_:
+            return super().get(key)
+
+    def has(self, key):
+        with self._lock_:
+            return super().has(key)
+
+    def delete(self, key):
+        with self._lock_:
+            return super().delete(key)
+
+    def clear(self):
+        with self._lock_:
+            super().clear()
+
+    def release(self, keys):
+        with self._lock_:
+            super().release(keys)
+
+    def get_or_compute(self, key, compute, record_time=True, **kwargs):
+        key = self._encode_key_(key)
+        with self._lock_:
+            value = super().get(key)
+            if value is not self.Empty:
+                return value
+            flight = self._flights_.get(key)
+            is_owner = flight is None
+            if is_owner:
+                flight = self._flights_[key] = concurrent.futures.Future()
 
-        yield
+        if not is_owner:
+            return flight.result()
 
-        for key in self.__key_stack__[-1]:
-            del self._store_[key]
-        self.__key_stack__.pop(-1)
+        try:
+            start = time.perf_counter()
+            value = compute()
+            with self._lock_:
+                if record_time and self._stats_ is not None:
+                    self._stats_.record_compute_time(key, time.perf_counter() - start)
+                self.set(key, value, **kwargs)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(value)
+        finally:
+            with self._lock_:
+                del self._flights_[key]
+        return value
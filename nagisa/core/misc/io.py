@@ -9,14 +9,9 @@ import hashlib
 import tempfile
 import traceback
 import functools
-import http.cookiejar
-import urllib.request
 from urllib.parse import quote
 from typing import Optional, Union, Callable
 
-import torch
-
-from nagisa.core.misc.progressbar import tqdm
 from nagisa.core.misc.registry import FunctionSelector
 
 __all__ = [
@@ -32,6 +27,9 @@ logger = logging.getLogger(__name__)
 
 NOT_NAGISA = float('inf')
 
+# Same as `torch.hub.HASH_REGEX`, matches e.g. `resnet18-5c106cde.pth`
+HASH_REGEX = re.compile(r'-([a-f0-9]*)\.')
+
 
 @functools.lru_cache()
 def nagisa_root_dir() -> pathlib.Path:
@@ -126,6 +124,10 @@ _google_drive_confirm_regexp = re.compile(rb"confirm=([\w\d_\-]+)")
 
 @URLOpener.r(lambda url: _google_drive_pattern_.match(url) is not None)
 def google_drive_opener(url):
+    # Imported lazily, networking modules are only needed when downloading
+    import http.cookiejar
+    import urllib.request
+
     matched = _google_drive_pattern_.match(url)
     file_id = matched.group("id") or matched.group("id2")
     url = f"https://drive.google.com/uc?id={file_id}"
@@ -151,10 +153,14 @@ def google_drive_opener(url):
 
 @URLOpener.r(lambda: True)
 def default_opener(url):
+    import urllib.request
+
     return urllib.request.urlopen(url)
 
 
 def download_url_to_file(url, dst, hash_prefix=None, progress=True):
+    from nagisa.core.misc.progressbar import tqdm
+
     file_size = None
     u = URLOpener.select(url)(url)
     meta = u.info()
@@ -221,7 +227,7 @@ def prepare_resource(src, dst, progress=True, check_hash=False):
         if isinstance(check_hash, str):
             hash_prefix = check_hash
         else:
-            hash_prefix = (torch.hub.HASH_REGEX.search(filename).group(1) if check_hash else None)
+            hash_prefix = (HASH_REGEX.search(filename).group(1) if check_hash else None)
 
         download_url_to_file(url, dst, hash_prefix, progress=progress)
 
@@ -1,5 +1,6 @@
 import collections
 from nagisa.core.functools import adapt_spec, make_annotator
+from nagisa.core.misc.cache import fingerprint
 
 
 class Registry:
@@ -113,9 +114,23 @@ def _when_annotator_fn(lst, f):
     return lst
 
 
+_MISSING = object()
+
+
 class MultiEntryConditionalFunctionRegistry(MultiEntryFunctionRegistry):
 
     _when_spec_ = [...]
+    _select_cache_size_ = 4096
+
+    def __init__(self, name):
+        super().__init__(name)
+        # Maps (key, *fingerprints of args) to (args, selected). `args` are kept
+        # alive so that identity based fingerprints cannot be reused.
+        self._select_cache_ = {}
+        self.cache_select = True
+        # Bumped on every registration, so that results derived from selected
+        # functions can be invalidated
+        self._version_ = 0
 
     @classmethod
     def when(cls, f):
@@ -127,12 +142,40 @@ class MultiEntryConditionalFunctionRegistry(MultiEntryFunctionRegistry):
 
         return new_f
 
-    def select(self, key, *args):
+    def _register_(self, key, value):
+        value = super()._register_(key, value)
+        self._version_ += 1
+        self.invalidate_cache()
+        return value
+
+    def invalidate_cache(self):
+        self._select_cache_.clear()
+
+    def _select_(self, key, *args):
         for f in self._mapping_[key]:
             if not f.__when__ or any(cond(*args) for cond in f.__when__):
                 return f
         return None
 
+    def select(self, key, *args):
+        if not self.cache_select:
+            return self._select_(key, *args)
+
+        try:
+            cache_key = (key, *map(fingerprint, args))
+        except TypeError:
+            return self._select_(key, *args)
+
+        cached = self._select_cache_.get(cache_key, _MISSING)
+        if cached is not _MISSING:
+            return cached[1]
+
+        selected = self._select_(key, *args)
+        if len(self._select_cache_) >= self._select_cache_size_:
+            self._select_cache_.clear()
+        self._select_cache_[cache_key] = (args, selected)
+        return selected
+
 
 class FunctionSelector(FuncValueMixin, Selector):
     # pylint: disable=dangerous-default-value
@@ -83,6 +83,10 @@ class SwitchableList(ProxyBase):
         if not self.__mutable__:
             raise RuntimeError('Cannot perform this action on immutable list')
 
+        host = self.__host__() if self.__host__ is not None else None
+        if host is not None and hasattr(host, '_touch_'):
+            host._touch_()
+
     # pylint: disable=redefined-builtin
     @wraps(list.append)
     def append(self, object):
@@ -0,0 +1,3 @@
+from nagisa.core import _lazy_submodules
+
+__getattr__, __dir__ = _lazy_submodules(__name__, ["config", "envvar", "schema"])
@@ -39,6 +39,7 @@ class SchemaNode:
         "_entries_",
         "_frozen_",
         "_parent_",
+        "_version_",
         "__weakref__",
     ]
 
@@ -122,6 +123,7 @@ class SchemaNode:
         attrs=None,
         meta=None,
     ):
+        self._version_ = 0
         is_container = default is None and T is None
         if not is_container:
             if meta is None:
@@ -184,6 +186,17 @@ class SchemaNode:
     def __str__(self):
         return self.to_str(level=0)
 
+    def _touch_(self):
+        node = self
+        while node is not None:
+            node._version_ += 1
+            node = node._parent_() if node._parent_ is not None else None
+
+    def _fingerprint_(self):
+        # Identity plus a counter bumped on every mutation of the subtree, so
+        # that caches keyed by a config notice updates without walking it.
+        return (id(self), self._version_)
+
     def _check_frozen_(self, action: str, value: bool):
         if self._frozen_ != value:
             prep = "before" if value else "after"
@@ -225,6 +238,7 @@ class SchemaNode:
 
         node = self.new_from_primitive(value, parent=self, attrs=attrs)
         self._entries_[name] = node
+        self._touch_()
         return node
 
     @classmethod
@@ -333,6 +347,8 @@ class SchemaNode:
                 host=host,
             )
 
+        host._touch_()
+
     @property
     def _mutable_(self):
         return not self._frozen_ or self._meta_.attrs.writable
@@ -427,6 +443,7 @@ class SchemaNode:
             f"Alias target should be valid Python identifier, got {target!r}"
 
         self._alias_entries_[name] = target
+        self._touch_()
         return self
 
     def to_str(self, level=0, indent_size=2):
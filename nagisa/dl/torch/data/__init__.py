@@ -1,4 +1,7 @@
 from .dataset import *
 from .transform import *
 from .dataloader import *
+from .prefetch import *
+from .export import *
+from .table import *
 from ._registries import *
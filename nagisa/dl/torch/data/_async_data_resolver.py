@@ -0,0 +1,161 @@
+# pylint: disable=redefined-builtin
+import os
+import time
+import asyncio
+
+from nagisa.core.misc.cache import Scope
+from nagisa.dl.torch.misc.sharing import SharedValue
+
+from ._data_resolver import DataResolver, IDLIST_RES_NAME
+from ._registries import Resource, Item
+
+
+class AsyncDataResolver(DataResolver):
+    """
+    A `DataResolver` which awaits independent dependencies concurrently, both
+    within a sample and across ids of a batch. Resources and items may be
+    coroutine functions. The synchronous API is kept by running the `a*`
+    methods on an event loop owned by the resolver.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending_ = {}
+        self._loop_ = None
+        self._loop_pid_ = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(_pending_={}, _loop_=None, _loop_pid_=None)
+        return state
+
+    def _run_(self, coro):
+        # Event loops cannot be shared with forked processes
+        if self._loop_ is None or self._loop_pid_ != os.getpid():
+            self._loop_ = asyncio.new_event_loop()
+            self._loop_pid_ = os.getpid()
+        return self._loop_.run_until_complete(coro)
+
+    async def _ainvoke_(self, f, id, deps):
+        result = self._call_(f, id, deps)
+        if f.__is_coroutine__:
+            result = await result
+        return result[0] if f.__batched__ else result
+
+    async def _ainvoke_batch_(self, f, ids):
+        deps = await asyncio.gather(
+            *(self._aget_resources_(ids, dep_name) for dep_name in f.__deps__)
+        )
+        result = f(self.cfg, self.meta, ids, *deps)
+        if f.__is_coroutine__:
+            result = await result
+        return list(result)
+
+    async def _aget_item_(self, id, item_key):
+        f = Item.select(item_key, self.cfg, self.meta)
+        deps = await asyncio.gather(
+            *(self._aget_resource_(id, dep_name) for dep_name in f.__deps__)
+        )
+        return await self._ainvoke_(f, id, deps)
+
+    async def _aget_items_(self, ids, item_key):
+        f = Item.select(item_key, self.cfg, self.meta)
+        if f.__batched__:
+            return await self._ainvoke_batch_(f, ids)
+        return list(await asyncio.gather(*(self._aget_item_(id, item_key) for id in ids)))
+
+    async def _aget_resource_(self, id, res_key):
+        f = Resource.select(res_key, self.cfg, self.meta)
+        cache_key = {
+            Scope.LOCAL: ("resource", res_key, id),
+            Scope.GLOBAL: ("resource", res_key),
+        }[f.__scope__]
+
+        value = self.__cache__.get(cache_key)
+        if value is self.__cache__.Empty:
+            # Concurrent requests of the same resource wait for one computation
+            task = self._pending_.get(cache_key)
+            if task is None:
+                task = asyncio.ensure_future(self._acompute_resource_(f, id, cache_key))
+                self._pending_[cache_key] = task
+                task.add_done_callback(lambda _: self._pending_.pop(cache_key, None))
+            value = await task
+
+        if isinstance(value, SharedValue):
+            value = value.get()
+        return value
+
+    async def _acompute_resource_(self, f, id, cache_key):
+        persisted = self._load_persisted_(f, cache_key)
+        if persisted is not self.__cache__.Empty:
+            self.__cache__.set(cache_key, persisted, scope=f.__scope__)
+            return persisted
+
+        deps = await asyncio.gather(
+            *(self._aget_resource_(id, dep_name) for dep_name in f.__deps__)
+        )
+        start = time.perf_counter()
+        computed = await self._ainvoke_(f, id, deps)
+        if self.__cache__.stats is not None:
+            self.__cache__.stats.record_compute_time(cache_key, time.perf_counter() - start)
+        self.__cache__.set(cache_key, computed, scope=f.__scope__)
+        self._store_persisted_(f, cache_key, computed)
+        return computed
+
+    async def _aget_resources_(self, ids, res_key):
+        f = Resource.select(res_key, self.cfg, self.meta)
+        if f.__scope__ == Scope.GLOBAL:
+            return await self._aget_resource_(None, res_key)
+        if not f.__batched__:
+            return list(await asyncio.gather(*(self._aget_resource_(id, res_key) for id in ids)))
+
+        cache = self.__cache__
+        cache_keys = [("resource", res_key, id) for id in ids]
+        values = [cache.get(cache_key) for cache_key in cache_keys]
+        missing = [i for i, value in enumerate(values) if value is cache.Empty]
+        if missing:
+            start = time.perf_counter()
+            computed = await self._ainvoke_batch_(f, [ids[i] for i in missing])
+            if cache.stats is not None:
+                cache.stats.record_compute_time(
+                    cache_keys[missing[0]],
+                    time.perf_counter() - start,
+                )
+            for i, value in zip(missing, computed):
+                cache.set(cache_keys[i], value, scope=Scope.LOCAL)
+                values[i] = value
+        return values
+
+    async def aget_item(self, id, item_key):
+        self._check_dep_()
+        return await self._aget_item_(id, item_key)
+
+    async def aget_items(self, ids, item_key):
+        self._check_dep_()
+        return await self._aget_items_(list(ids), item_key)
+
+    async def aget_items_dict(self, ids, item_keys):
+        self._check_dep_()
+        ids, item_keys = list(ids), list(item_keys)
+        items_lists = await asyncio.gather(
+            *(self._aget_items_(ids, item_key) for item_key in item_keys)
+        )
+        return dict(zip(item_keys, items_lists))
+
+    async def aget_id_list(self):
+        self._check_dep_()
+        return await self._aget_resource_(None, IDLIST_RES_NAME)
+
+    def _get_resource_(self, id, res_key):
+        return self._run_(self._aget_resource_(id, res_key))
+
+    def get_item(self, id, item_key):
+        return self._run_(self.aget_item(id, item_key))
+
+    def get_items(self, ids, item_key):
+        return self._run_(self.aget_items(ids, item_key))
+
+    def get_items_dict(self, ids, item_keys):
+        return self._run_(self.aget_items_dict(ids, item_keys))
+
+    def get_id_list(self):
+        return self._run_(self.aget_id_list())
@@ -1,18 +1,85 @@
 # pylint: disable=redefined-builtin
+import os
+import time
+import pickle
+import hashlib
+import asyncio
 import contextlib
+import collections
+import concurrent.futures
 
-from nagisa.core.misc.cache import ScopedCache, Scope
+from nagisa.core.misc.cache import (
+    CacheStats,
+    ConcurrentScopedCache,
+    DiskCache,
+    ScopedCache,
+    Scope,
+    estimate_size,
+    fingerprint,
+)
+from nagisa.dl.torch.misc.sharing import SharedValue, share
 
 from ._registries import Resource, Item
 
 IDLIST_RES_NAME = "id_list"
 
+# A resource in a plan. `dep_indices` refer to earlier steps of the same plan,
+# `level` is the length of the longest dependency chain below the step, and
+# `is_plain` tells whether it can be called directly (neither batched nor a
+# coroutine function).
+_PlanStep = collections.namedtuple(
+    "_PlanStep",
+    ("res_key", "f", "dep_indices", "global_cache_key", "level", "is_plain"),
+)
+# Resolution of an item key: `steps` are sorted so that each step comes after
+# its dependencies.
+_Plan = collections.namedtuple("_Plan", ("item_f", "item_dep_indices", "steps"))
+
+
+def _run_coroutine(coro):
+    # `asyncio.run()` is not available before Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def content_digest(obj):
+    """
+    Returns a digest of the content of `obj`, which unlike `fingerprint()` is
+    stable across runs.
+    """
+    if hasattr(obj, "value_dict"):
+        obj = obj.value_dict()
+    return hashlib.sha1(repr(obj).encode("utf-8")).hexdigest()
+
 
 class DataResolver:
-    def __init__(self, cfg, meta):
+    _plan_cache_size_ = 1024
+
+    def __init__(self, cfg, meta, cache_options=None, persist_dir=None, plan_threads=0):
         self.cfg, self.meta = cfg, meta
-        self.__cache__ = ScopedCache()
+        cache_options = dict(cache_options or {})
+        if cache_options.get("stats") is True:
+            # Group statistics by resource name
+            cache_options["stats"] = CacheStats(prefix_index=1)
+        # Resolving items from multiple threads requires a thread-safe cache
+        cache_cls = ConcurrentScopedCache if cache_options.pop("concurrent", False) else ScopedCache
+        self.__cache__ = cache_cls(**cache_options)
+        self.__disk_cache__ = DiskCache(persist_dir) if persist_dir is not None else None
+        self._cfg_digest_ = None
         self.__dep_checked__ = False
+        self._plans_ = {}
+        self.use_plans = True
+        self._plan_threads_ = plan_threads
+        self._executor_ = None
+        self._executor_pid_ = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_executor_=None, _executor_pid_=None)
+        return state
 
     def _check_resource_dep_(self, path, expected_scope, dep_mapping):
         res_key = path[-1]
@@ -63,19 +130,208 @@ class DataResolver:
 
         self.__dep_checked__ = True
 
+    def _is_local_resource_(self, res_key):
+        return Resource.select(res_key, self.cfg, self.meta).__scope__ == Scope.LOCAL
+
     # pylint: disable=inconsistent-return-statements
-    def _invoke_(self, f, id, deps):
+    def _call_(self, f, id, deps):
+        if f.__batched__:
+            deps = [
+                [dep] if self._is_local_resource_(dep_name) else dep
+                for dep_name, dep in zip(f.__deps__, deps)
+            ]
+            return f(self.cfg, self.meta, [id], *deps)
         if f.__scope__ == Scope.LOCAL:
             return f(self.cfg, self.meta, id, *deps)
         elif f.__scope__ == Scope.GLOBAL:
             return f(self.cfg, self.meta, *deps)
 
+    def _invoke_(self, f, id, deps):
+        result = self._call_(f, id, deps)
+        if f.__is_coroutine__:
+            result = _run_coroutine(result)
+        return result[0] if f.__batched__ else result
+
+    def _invoke_batch_(self, f, ids):
+        deps = [self._get_resources_(ids, dep_name) for dep_name in f.__deps__]
+        result = f(self.cfg, self.meta, ids, *deps)
+        if f.__is_coroutine__:
+            result = _run_coroutine(result)
+        return list(result)
+
     def _get_item(self, id, item_key):
+        plan = self._get_plan_(item_key)
+        if plan is not None:
+            return self._run_plan_(plan, id)
+
         f = Item.select(item_key, self.cfg, self.meta)
         deps = [self._get_resource_(id, dep_name) for dep_name in f.__deps__]
         return self._invoke_(f, id, deps)
 
+    def _compile_plan_(self, item_key):
+        steps, index_of = [], {}
+
+        def _visit(res_key):
+            if res_key not in index_of:
+                f = Resource.select(res_key, self.cfg, self.meta)
+                dep_indices = tuple(_visit(dep_name) for dep_name in f.__deps__)
+                global_cache_key = ("resource", res_key) if f.__scope__ == Scope.GLOBAL else None
+                level = max((steps[i].level + 1 for i in dep_indices), default=0)
+                index_of[res_key] = len(steps)
+                is_plain = not f.__batched__ and not f.__is_coroutine__
+                steps.append(
+                    _PlanStep(res_key, f, dep_indices, global_cache_key, level, is_plain)
+                )
+            return index_of[res_key]
+
+        item_f = Item.select(item_key, self.cfg, self.meta)
+        item_dep_indices = tuple(_visit(dep_name) for dep_name in item_f.__deps__)
+        return _Plan(item_f, item_dep_indices, tuple(steps))
+
+    def _get_plan_(self, item_key):
+        """
+        Returns the compiled plan of `item_key`, or None if plans cannot be
+        used. Plans bypass the single-flight computation of caches shared by
+        threads, and cannot be cached if the config is unhashable.
+        """
+        if not self.use_plans or isinstance(self.__cache__, ConcurrentScopedCache):
+            return None
+        try:
+            plan_key = (
+                item_key,
+                Resource._version_,
+                Item._version_,
+                fingerprint(self.cfg),
+                fingerprint(self.meta),
+            )
+        except TypeError:
+            return None
+
+        plan = self._plans_.get(plan_key)
+        if plan is None:
+            plan = self._compile_plan_(item_key)
+            if len(self._plans_) >= self._plan_cache_size_:
+                self._plans_.clear()
+            self._plans_[plan_key] = plan
+        return plan
+
+    def _get_executor_(self):
+        if self._plan_threads_ <= 0:
+            return None
+        # Thread pools cannot be shared with forked processes
+        if self._executor_ is None or self._executor_pid_ != os.getpid():
+            self._executor_ = concurrent.futures.ThreadPoolExecutor(self._plan_threads_)
+            self._executor_pid_ = os.getpid()
+        return self._executor_
+
+    def _invoke_step_(self, step, id, values):
+        start = time.perf_counter()
+        deps = [values[i] for i in step.dep_indices]
+        if step.is_plain:
+            if step.global_cache_key is None:
+                computed = step.f(self.cfg, self.meta, id, *deps)
+            else:
+                computed = step.f(self.cfg, self.meta, *deps)
+        else:
+            computed = self._invoke_(step.f, id, deps)
+        return computed, time.perf_counter() - start
+
+    def _run_plan_(self, plan, id):
+        cache, steps = self.__cache__, plan.steps
+        values = [cache.Empty] * len(steps)
+        cache_keys = [None] * len(steps)
+
+        # Look up needed steps from consumers to dependencies. Dependencies
+        # are only needed if some of their consumers are missing.
+        needed = [False] * len(steps)
+        for i in plan.item_dep_indices:
+            needed[i] = True
+        missing = []
+        for i in range(len(steps) - 1, -1, -1):
+            if not needed[i]:
+                continue
+            step = steps[i]
+            cache_key = cache_keys[i] = step.global_cache_key or ("resource", step.res_key, id)
+            value = cache.get(cache_key)
+            if value is cache.Empty:
+                value = self._load_persisted_(step.f, cache_key)
+                if value is not cache.Empty:
+                    cache.set(cache_key, value, scope=step.f.__scope__)
+            if value is cache.Empty:
+                missing.append(i)
+                for j in step.dep_indices:
+                    needed[j] = True
+            else:
+                values[i] = value.get() if isinstance(value, SharedValue) else value
+
+        # Compute missing steps from dependencies to consumers, running steps
+        # of the same level concurrently if a thread pool is available
+        executor = self._get_executor_() if len(missing) > 1 else None
+        if executor is None:
+            batches = [missing[::-1]]
+        else:
+            levels = collections.defaultdict(list)
+            for i in reversed(missing):
+                levels[steps[i].level].append(i)
+            batches = [levels[level] for level in sorted(levels)]
+
+        for indices in batches:
+            if executor is not None and len(indices) > 1:
+                results = executor.map(lambda i: self._invoke_step_(steps[i], id, values), indices)
+            else:
+                results = (self._invoke_step_(steps[i], id, values) for i in indices)
+            for i, (computed, elapsed) in zip(indices, results):
+                step = steps[i]
+                if cache.stats is not None:
+                    cache.stats.record_compute_time(cache_keys[i], elapsed)
+                cache.set(cache_keys[i], computed, scope=step.f.__scope__)
+                if step.f.__persist__ is not None:
+                    self._store_persisted_(step.f, cache_keys[i], computed)
+                values[i] = computed
+
+        return self._invoke_(plan.item_f, id, [values[i] for i in plan.item_dep_indices])
+
+    def _get_items_(self, ids, item_key):
+        f = Item.select(item_key, self.cfg, self.meta)
+        if f.__batched__:
+            return self._invoke_batch_(f, ids)
+        return [self._get_item(id, item_key) for id in ids]
+
+    def _get_resources_(self, ids, res_key):
+        """
+        Returns a list of values of LOCAL resource `res_key` for `ids`, or the
+        single value of a GLOBAL resource.
+        """
+        f = Resource.select(res_key, self.cfg, self.meta)
+        if f.__scope__ == Scope.GLOBAL:
+            return self._get_resource_(None, res_key)
+        if not f.__batched__:
+            return [self._get_resource_(id, res_key) for id in ids]
+
+        cache = self.__cache__
+        cache_keys = [("resource", res_key, id) for id in ids]
+        values = [cache.get(cache_key) for cache_key in cache_keys]
+        missing = [i for i, value in enumerate(values) if value is cache.Empty]
+        if missing:
+            start = time.perf_counter()
+            computed = self._invoke_batch_(f, [ids[i] for i in missing])
+            if cache.stats is not None:
+                cache.stats.record_compute_time(
+                    cache_keys[missing[0]],
+                    time.perf_counter() - start,
+                )
+            for i, value in zip(missing, computed):
+                cache.set(cache_keys[i], value, scope=Scope.LOCAL)
+                values[i] = value
+        return values
+
     def _get_resource_(self, id, res_key):
+        value = self._get_cached_resource_(id, res_key)[1]
+        if isinstance(value, SharedValue):
+            value = value.get()
+        return value
+
+    def _get_cached_resource_(self, id, res_key):
         f = Resource.select(res_key, self.cfg, self.meta)
 
         cache_key = {
@@ -83,23 +339,141 @@ class DataResolver:
             Scope.GLOBAL: ("resource", res_key),
         }[f.__scope__]
 
-        cached = self.__cache__.get(cache_key)
-        if cached is not self.__cache__.Empty:
-            return cached
+        value = self.__cache__.get_or_compute(
+            cache_key,
+            lambda: self._compute_resource_(f, id, cache_key),
+            record_time=False,
+            scope=f.__scope__,
+        )
+        return cache_key, value
+
+    def _persist_key_(self, f, cache_key):
+        # Persisted values outlive the config, so they are keyed by its content
+        try:
+            cfg_key = fingerprint(self.cfg)
+        except TypeError:
+            cfg_key = None
+        if cfg_key is None or self._cfg_digest_ is None or self._cfg_digest_[0] != cfg_key:
+            self._cfg_digest_ = (cfg_key, content_digest(self.cfg))
+        return (*cache_key, self.meta, self._cfg_digest_[1], f.__persist__)
+
+    def _load_persisted_(self, f, cache_key):
+        if self.__disk_cache__ is None or f.__persist__ is None:
+            return self.__cache__.Empty
+        persisted = self.__disk_cache__.get(self._persist_key_(f, cache_key))
+        if persisted is self.__disk_cache__.Empty:
+            return self.__cache__.Empty
+        return persisted
+
+    def _store_persisted_(self, f, cache_key, value):
+        if self.__disk_cache__ is not None and f.__persist__ is not None:
+            self.__disk_cache__.set(self._persist_key_(f, cache_key), value)
+
+    def _compute_resource_(self, f, id, cache_key):
+        persisted = self._load_persisted_(f, cache_key)
+        if persisted is not self.__cache__.Empty:
+            return persisted
 
         deps = [self._get_resource_(id, dep_name) for dep_name in f.__deps__]
+        # Dependencies record their own time, so that only the call is timed
+        start = time.perf_counter()
         computed = self._invoke_(f, id, deps)
-        self.__cache__.set(cache_key, computed, scope=f.__scope__)
+        if self.__cache__.stats is not None:
+            self.__cache__.stats.record_compute_time(cache_key, time.perf_counter() - start)
+        self._store_persisted_(f, cache_key, computed)
         return computed
 
     def get_item(self, id, item_key):
         self._check_dep_()
         return self._get_item(id, item_key)
 
+    def get_items(self, ids, item_key):
+        """
+        Returns values of `item_key` for a list of ids. Batched implementations
+        of items and resources are called once for all ids, others once per id.
+        """
+        self._check_dep_()
+        return self._get_items_(list(ids), item_key)
+
+    def get_items_dict(self, ids, item_keys):
+        """
+        Returns a dict mapping each of `item_keys` to its values for `ids`.
+        """
+        self._check_dep_()
+        ids = list(ids)
+        return {item_key: self._get_items_(ids, item_key) for item_key in item_keys}
+
+    def _local_resource_keys_(self, item_keys):
+        res_keys = set()
+
+        def _visit(dep_names):
+            for res_key in dep_names:
+                f = Resource.select(res_key, self.cfg, self.meta)
+                if f.__scope__ == Scope.LOCAL and res_key not in res_keys:
+                    res_keys.add(res_key)
+                    _visit(f.__deps__)
+
+        for item_key in item_keys:
+            _visit(Item.select(item_key, self.cfg, self.meta).__deps__)
+        return sorted(res_keys)
+
+    def prefetch(self, id, item_keys):
+        """
+        Resolves LOCAL resources needed by `item_keys` for `id` into the cache.
+        Returns their cache keys and estimated size in bytes.
+        """
+        self._check_dep_()
+        nbytes = 0
+        # Entries computed here belong to a scope of their own, which is left
+        # open until the caller releases them
+        with self.__cache__.new_scope(release=False) as scope_keys:
+            try:
+                for res_key in self._local_resource_keys_(item_keys):
+                    nbytes += estimate_size(self._get_resource_(id, res_key))
+            except BaseException:
+                self.__cache__.release(scope_keys)
+                raise
+        return list(scope_keys), nbytes
+
+    def release(self, cache_keys):
+        self.__cache__.release(cache_keys)
+
     def get_id_list(self):
         self._check_dep_()
         return self._get_resource_(None, IDLIST_RES_NAME)
 
+    def iter_id_list(self):
+        """
+        Calls the `id_list` resource afresh, bypassing the cache, and returns
+        an iterator over its result, which may be a generator.
+        """
+        self._check_dep_()
+        f = Resource.select(IDLIST_RES_NAME, self.cfg, self.meta)
+        deps = [self._get_resource_(None, dep_name) for dep_name in f.__deps__]
+        return iter(self._invoke_(f, None, deps))
+
+    def share_global_resources(self):
+        """
+        Computes all GLOBAL resources and moves them into shared memory, so
+        that DataLoader workers attach to them instead of holding own copies.
+        Values which cannot be pickled are kept as is.
+        """
+        self._check_dep_()
+        for res_key in Resource.keys():
+            f = Resource.select(res_key, self.cfg, self.meta)
+            if f.__scope__ != Scope.GLOBAL:
+                continue
+
+            cache_key, value = self._get_cached_resource_(None, res_key)
+            try:
+                shared = share(value)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                continue
+            self.__cache__.set(cache_key, shared, scope=Scope.GLOBAL)
+
+    def cache_stats(self):
+        return self.__cache__.stats
+
     @contextlib.contextmanager
     def new_scope(self):
         with self.__cache__.new_scope():
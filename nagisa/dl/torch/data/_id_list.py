@@ -0,0 +1,137 @@
+import array
+import hashlib
+import collections.abc
+
+import numpy as np
+
+
+def _int64_array(values):
+    # Indexing `array.array` is much faster than indexing NumPy arrays, and
+    # equally compact
+    result = array.array("q")
+    result.frombytes(np.ascontiguousarray(values, dtype=np.int64).tobytes())
+    return result
+
+
+class _CompactIdList(collections.abc.Sequence):
+    def _get_(self, index):
+        raise NotImplementedError
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get_(i) for i in range(*index.indices(len(self)))]
+        return self._get_(index)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(x == y for x, y in zip(self, other))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(<{len(self)} ids>)"
+
+
+class IntIdList(_CompactIdList):
+    """
+    Integer ids stored as a flat int64 buffer.
+    """
+    def __init__(self, ids):
+        self._array_ = array.array("q", ids)
+
+    def __len__(self):
+        return len(self._array_)
+
+    def _get_(self, index):
+        return self._array_[index]
+
+
+def encode_strings(strings):
+    """
+    Returns `strings` UTF-8 encoded back to back as bytes, and an int64 array
+    of their end offsets.
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    ends = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+    return b"".join(encoded), ends.astype(np.int64, copy=False)
+
+
+class StringIdList(_CompactIdList):
+    """
+    String ids stored UTF-8 encoded back to back in one buffer, located by an
+    array of end offsets. See `encode_strings()`.
+    """
+    def __init__(self, ids):
+        blob, ends = encode_strings(ids)
+        self._blob_ = blob
+        self._ends_ = _int64_array(ends)
+
+    @classmethod
+    def from_buffers(cls, blob, ends):
+        """
+        Wraps buffers produced by `encode_strings()`, which may also be uint8
+        and int64 NumPy arrays, e.g. memory-mapped ones.
+        """
+        self = cls.__new__(cls)
+        self._blob_ = blob
+        self._ends_ = ends
+        return self
+
+    def __len__(self):
+        return len(self._ends_)
+
+    def _get_(self, index):
+        # Bound checks and negative indices are left to the array of ends
+        ends = self._ends_
+        end = ends[index]
+        if index < 0:
+            index += len(ends)
+        # `bytes()` returns bytes objects as is, and copies array slices
+        return bytes(self._blob_[ends[index - 1] if index > 0 else 0:end]).decode("utf-8")
+
+
+def compact_id_list(ids):
+    """
+    Converts a list (or tuple) of ids into a representation holding no Python
+    object per id, so that forked DataLoader workers do not duplicate it page
+    by page while touching reference counts. Contiguous integers become a
+    `range`, other integers an `IntIdList` and strings a `StringIdList`. Other
+    id lists are returned as is.
+    """
+    if not isinstance(ids, (list, tuple)) or not ids:
+        return ids
+
+    if all(type(id) is int for id in ids):
+        step = ids[1] - ids[0] if len(ids) > 1 else 1
+        if step != 0:
+            contiguous = range(ids[0], ids[-1] + (1 if step > 0 else -1), step)
+            if len(contiguous) == len(ids) and all(x == y for x, y in zip(contiguous, ids)):
+                return contiguous
+        try:
+            return IntIdList(ids)
+        except OverflowError:
+            return ids
+
+    if all(type(id) is str for id in ids):
+        return StringIdList(ids)
+
+    return ids
+
+
+def id_list_digest(ids):
+    """
+    Returns a digest of `ids`, stable across runs. Compact id lists are
+    digested from their buffers without decoding ids.
+    """
+    digest = hashlib.sha1(type(ids).__name__.encode("utf-8"))
+    if isinstance(ids, range):
+        digest.update(repr(ids).encode("utf-8"))
+    elif isinstance(ids, IntIdList):
+        digest.update(ids._array_)
+    elif isinstance(ids, StringIdList):
+        digest.update(ids._blob_)
+        digest.update(np.ascontiguousarray(ids._ends_, dtype=np.int64))
+    else:
+        for id in ids:  # pylint: disable=redefined-builtin
+            digest.update(repr(id).encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()
@@ -0,0 +1,43 @@
+# pylint: disable=redefined-builtin
+import os
+import pickle
+import contextlib
+
+from nagisa.dl.torch.misc.records import RecordReader
+
+from .export import ID_LIST_FILENAME, ID_TABLE_DIRNAME
+from .table import ColumnarTable
+
+
+class RecordResolver:
+    """
+    Serves items dicts exported by `export_records()` from `root` in place of
+    a `DataResolver`. Items are memory-mapped rather than resolved, so
+    resources are never touched. Ids are mapped to positions of their records
+    through a memory-mapped `ColumnarTable`, and the id list is kept compact.
+    """
+    def __init__(self, root):
+        self._reader_ = RecordReader(root)
+        self._id_table_ = ColumnarTable.load(os.path.join(root, ID_TABLE_DIRNAME))
+        with open(os.path.join(root, ID_LIST_FILENAME), "rb") as f:
+            self._id_list_ = pickle.load(f)
+
+    def get_items_dict(self, ids, item_keys):
+        records = [self._reader_[self._id_table_.index(id)] for id in ids]
+        return {item_key: [record[item_key] for record in records] for item_key in item_keys}
+
+    def get_id_list(self):
+        return self._id_list_
+
+    def iter_id_list(self):
+        return iter(self._id_list_)
+
+    def share_global_resources(self):
+        pass
+
+    def cache_stats(self):
+        return None
+
+    @contextlib.contextmanager
+    def new_scope(self):
+        yield
@@ -1,3 +1,5 @@
+import inspect
+
 from nagisa.core.misc.cache import Scope
 from nagisa.core.misc.registry import MultiEntryConditionalFunctionRegistry, Registry
 
@@ -13,16 +15,34 @@ class ResourceItemRegistry(MultiEntryConditionalFunctionRegistry):
     _func_spec_ = ["cfg | c?", "meta | m?", ...]
     _when_spec_ = ["cfg | c?", "meta | m?"]
 
+    @staticmethod
+    def persist(version):
+        """
+        Marks a resource to be persisted on disk across runs. Bump `version`
+        whenever the produced value changes.
+        """
+        def _decorator(f):
+            f.__persist__ = str(version)
+            return f
+
+        return _decorator
+
     def _check_value_(self, key, f):
         new_f = super()._check_value_(key, f)
         deps = new_f.__remaining__
-        if deps and deps[0] == "id":
+        # A function taking `ids` computes values of a batch of ids at once
+        if deps and deps[0] in ("id", "ids"):
             scope = Scope.LOCAL
+            batched = deps[0] == "ids"
             deps = deps[1:]
         else:
             scope = Scope.GLOBAL
+            batched = False
         new_f.__deps__ = tuple(deps)
         new_f.__scope__ = scope
+        new_f.__batched__ = batched
+        new_f.__is_coroutine__ = inspect.iscoroutinefunction(inspect.unwrap(f))
+        new_f.__persist__ = getattr(new_f, "__persist__", None)
 
         return new_f
 
@@ -45,3 +65,4 @@ Resource = ResourceItemRegistry("Resource")
 Item = ResourceItemRegistry("Item")
 Transform = Registry("Transform")
 Collate = CollateRegistry("Collate")
+BatchTransform = Registry("BatchTransform")
@@ -1,8 +1,16 @@
+import weakref
+
+import torch.multiprocessing
+from torch.utils.data import get_worker_info
 from torch.utils.data import DataLoader as torch_DataLoader
+from torch.utils.data import BatchSampler, RandomSampler, SequentialSampler
 from torch.utils.data.dataloader import default_collate
 
+from nagisa.core.misc.cache import CacheStats
 from nagisa.core.state.config import cfg_property
 from ._registries import Collate
+from .transform import BatchTransformPipeline
+from .prefetch import PrefetchSampler
 
 __all__ = [
     "DataLoader",
@@ -10,8 +18,9 @@ __all__ = [
 
 
 class CollateFn:
-    def __init__(self, cfg):
+    def __init__(self, cfg, batch_transform=None):
         self._cfg_ = cfg
+        self.batch_transform = batch_transform
 
     cfg = cfg_property
 
@@ -29,10 +38,116 @@ class CollateFn:
                 f = default_collate
             ret_dict[key] = items
 
+        if self.batch_transform is not None:
+            ret_dict = self.batch_transform(ret_dict)
         return ret_dict
 
 
+class _WorkerInitFn:
+    # Hands the statistics sink of a loader to the copy of the dataset in each of
+    # its workers, so that loaders sharing a dataset keep their statistics apart
+    def __init__(self, stats_sink, worker_init_fn=None):
+        self.stats_sink = stats_sink
+        self.worker_init_fn = worker_init_fn
+
+    def __call__(self, worker_id):
+        get_worker_info().dataset._stats_sink_ = self.stats_sink
+        if self.worker_init_fn is not None:
+            self.worker_init_fn(worker_id)
+
+
 class DataLoader(torch_DataLoader):
-    def __init__(self, cfg, *args, **kwargs):
-        kwargs["collate_fn"] = CollateFn(cfg)
+    """
+    If `batched` is set, indices of a whole batch are passed to the dataset
+    at once, so that batched items and resources can be resolved together.
+
+    If `prefetch` is given, LOCAL resources of upcoming samples are resolved in
+    background threads. It holds keyword arguments of `Dataset.enable_prefetch()`
+    and requires `num_workers=0`.
+
+    Transforms of `batch_trans_seq` are applied to collated batches by the
+    collate function, i.e. in workers if any. Set `batch_transform="main"` to
+    apply them in the main process instead, e.g. to run them on the GPU.
+    """
+    def __init__(
+        self, cfg, *args, batched=False, prefetch=None, batch_transform="collate", **kwargs
+    ):
+        if batch_transform not in ("collate", "main"):
+            raise ValueError(f"Unknown batch_transform {batch_transform!r}")
+        dataset = args[0] if args else kwargs["dataset"]
+        pipeline = BatchTransformPipeline(cfg, getattr(dataset, "_meta_", None))
+        if not len(pipeline):
+            pipeline = None
+        self._batch_transform_ = pipeline if batch_transform == "main" else None
+        kwargs["collate_fn"] = CollateFn(cfg, pipeline if batch_transform == "collate" else None)
+        if batched or prefetch is not None:
+            sampler = kwargs.pop("sampler", None)
+            if sampler is None:
+                shuffle = kwargs.pop("shuffle", False)
+                sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+            kwargs["sampler"] = sampler
+        if prefetch is not None:
+            # Prefetched resources live in the cache of the process running the sampler
+            if kwargs.get("num_workers", 0) > 0:
+                raise ValueError("Prefetching is not supported with num_workers > 0")
+            kwargs["sampler"] = PrefetchSampler(
+                kwargs["sampler"],
+                dataset.enable_prefetch(**prefetch),
+            )
+        if batched:
+            kwargs["sampler"] = BatchSampler(
+                kwargs["sampler"],
+                kwargs.pop("batch_size", 1),
+                kwargs.pop("drop_last", False),
+            )
+            kwargs["batch_size"] = None
         super().__init__(*args, **kwargs)
+
+        if self.num_workers > 0 and getattr(self.dataset, "_share_resources_", False):
+            self.dataset.share_global_resources()
+
+        self._stats_manager_ = None
+        self._worker_stats_ = {}
+        if self.num_workers > 0 and any(stats is not None for stats in self._local_stats_()):
+            # Workers report their cumulative statistics into a shared dict
+            context = self.multiprocessing_context or torch.multiprocessing
+            self._stats_manager_ = context.Manager()
+            self._worker_stats_ = self._stats_manager_.dict()
+            self.worker_init_fn = _WorkerInitFn(self._worker_stats_, self.worker_init_fn)
+            # The manager process is stopped once the loader is gone
+            weakref.finalize(self, self._stats_manager_.shutdown)
+
+    def __iter__(self):
+        start_epoch = getattr(self.dataset, "_start_epoch_", None)
+        if start_epoch is not None:
+            start_epoch()
+        batches = super().__iter__()
+        if self._batch_transform_ is None:
+            return batches
+        return map(self._batch_transform_, batches)
+
+    def _local_stats_(self):
+        return tuple(
+            getattr(self.dataset, name, lambda: None)()
+            for name in ("cache_stats", "transform_cache_stats")
+        )
+
+    def _merged_stats_(self, i):
+        local_stats = self._local_stats_()[i]
+        if local_stats is None:
+            return None
+        worker_stats = [stats[i] for stats in self._worker_stats_.values()]
+        return CacheStats.merge(local_stats, *filter(None, worker_stats))
+
+    def cache_stats(self):
+        """
+        Returns cache statistics of the dataset merged over the main process
+        and all workers, or None if statistics are disabled.
+        """
+        return self._merged_stats_(0)
+
+    def transform_cache_stats(self):
+        """
+        Like `cache_stats()`, for cached outputs of deterministic transforms.
+        """
+        return self._merged_stats_(1)
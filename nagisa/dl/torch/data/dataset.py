@@ -1,45 +1,450 @@
+import os
+import time
+import itertools
 import collections
+import multiprocessing.util
+from torch.utils.data import get_worker_info
 from torch.utils.data.dataset import Dataset as torch_Dataset
+from torch.utils.data.dataset import IterableDataset as torch_IterableDataset
 
-from nagisa.core.state.config import ConfigValue, cfg_property
+from nagisa.core.misc.cache import Cache
+from nagisa.core.state.config import ConfigValue, ConfigNode, cfg_property
+from nagisa.dl.torch.misc.comm import get_rank, get_world_size
+from nagisa.dl.torch.misc.records import RecordReader, RecordWriter
 
-from ._data_resolver import DataResolver
-from .transform import apply_transform
+from ._data_resolver import DataResolver, content_digest
+from ._async_data_resolver import AsyncDataResolver
+from ._record_resolver import RecordResolver
+from ._id_list import compact_id_list, id_list_digest
+from .transform import TransformPipeline, TransformCache
 from .dataloader import DataLoader
+from .prefetch import Prefetcher
 
 __all__ = [
     "item_keys",
+    "resource_cache",
+    "resource_persist_dir",
+    "share_resources",
+    "resolve_async",
+    "resolve_threads",
+    "replay_dir",
+    "records_dir",
+    "transform_cache",
     "Dataset",
+    "StreamingDataset",
     "get_dataset",
+    "get_streaming_dataset",
 ]
 
 item_keys = ConfigValue(f"{__name__}.item_keys", func_spec=["cfg|c?", "meta|m?"])
+# Keyword arguments of the `ScopedCache` holding resources, e.g.
+# `{"policy": "lru", "max_bytes": 2 ** 30, "stats": True}`. Pass `"concurrent": True`
+# to resolve items from multiple threads. LOCAL resources are dropped after each sample
+# (or batch) unless `"retain"` is given, e.g. `{"policy": "lfu", "max_bytes": 2 ** 30}`,
+# which keeps them across epochs within the budget. Limits only apply to LOCAL resources,
+# GLOBAL ones are kept until the dataset is gone.
+resource_cache = ConfigValue(
+    f"{__name__}.resource_cache",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: {},
+)
+
+# Directory where resources marked with `Resource.persist()` are stored across runs
+resource_persist_dir = ConfigValue(
+    f"{__name__}.resource_persist_dir",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: None,
+)
+
+# Whether to move GLOBAL resources into shared memory before starting DataLoader workers.
+# Lists and tuples are then returned as a read-only `SharedList`, and dicts with `str` or
+# `int` keys as a read-only `SharedDict`. See `nagisa.dl.torch.misc.sharing.share()`.
+share_resources = ConfigValue(
+    f"{__name__}.share_resources",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: False,
+)
+
+# Whether to resolve items with `AsyncDataResolver`, which awaits independent resources
+# concurrently and allows resources and items to be coroutine functions
+resolve_async = ConfigValue(
+    f"{__name__}.resolve_async",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: False,
+)
+
+# Number of threads used to compute independent resources of a sample concurrently
+resolve_threads = ConfigValue(
+    f"{__name__}.resolve_threads",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: 0,
+)
+
+# Directory where items dicts are materialized during the first epoch, after leading
+# deterministic transforms. Later epochs replay them from there. Records are kept apart
+# per item keys, config, ids and deterministic transforms with their kwargs, but the
+# directory has to be cleared whenever the code of resources or transforms changes.
+# Cannot be combined with `transform_cache`.
+replay_dir = ConfigValue(
+    f"{__name__}.replay_dir",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: None,
+)
+
+# Directory holding records exported by `export_records()`. If set, items dicts are read
+# from there instead of being resolved from resources.
+records_dir = ConfigValue(
+    f"{__name__}.records_dir",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: None,
+)
+
+# Keyword arguments of the `TransformCache` holding items dicts after leading
+# deterministic transforms, e.g. `{"max_bytes": 2 ** 30, "stats": True}`, or None to
+# disable it. Later epochs then skip both resolving and those transforms. Entries are
+# also stored under `"disk_dir"` if given, which is reused across runs and workers. The
+# memory tier lives in each DataLoader worker, so it only survives epochs with
+# `persistent_workers=True`. Later transforms must not modify items in place. Cannot be
+# combined with `replay_dir`.
+transform_cache = ConfigValue(
+    f"{__name__}.transform_cache",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: None,
+)
 
 DatasetMeta = collections.namedtuple("DatasetMeta", ("name", "split"))
 
 
+def _make_data_resolver(cfg, meta):
+    records_root = records_dir.value(cfg, meta)
+    if records_root is not None:
+        return RecordResolver(os.path.join(records_root, meta.name, meta.split))
+
+    cache_options = resource_cache.value(cfg, meta)
+    if isinstance(cache_options, ConfigNode):
+        cache_options = cache_options.value_dict()
+    resolver_cls = AsyncDataResolver if resolve_async.value(cfg, meta) else DataResolver
+    return resolver_cls(
+        cfg,
+        meta,
+        cache_options,
+        persist_dir=resource_persist_dir.value(cfg, meta),
+        plan_threads=resolve_threads.value(cfg, meta),
+    )
+
+
+def _get_transform_pipeline(dataset, check_kwargs=False):
+    # Looking `trans_seq` and `trans_kwargs` up costs more than a few transform
+    # calls, so that unless `check_kwargs` is set, only the config is checked
+    pipeline = dataset._transform_pipeline_
+    if pipeline.is_stale() if check_kwargs else pipeline.is_cfg_changed():
+        pipeline = TransformPipeline(dataset._cfg_, dataset._meta_)
+        dataset._transform_pipeline_ = pipeline
+    return pipeline
+
+
+@property
+def transform_pipeline_property(self):
+    """
+    The `TransformPipeline` of the dataset, rebuilt on access once the config
+    changed, and at the start of each epoch once `trans_seq` or `trans_kwargs`
+    changed. DataLoader workers kept by `persistent_workers=True` hold their
+    own copy of the dataset, which does not follow changes made elsewhere.
+    """
+    return _get_transform_pipeline(self)
+
+
 class Dataset(torch_Dataset):
+
+    # Minimal interval in seconds between two reports of cache statistics
+    # from a DataLoader worker
+    stats_report_interval = 1.0
+    _stats_sink_ = None
+    _prefetcher_ = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_replay_writer_=None, _replay_pid_=None, _replay_seen_=None)
+        return state
+
     def __init__(self, cfg, name, split):
         self._cfg_ = cfg
         self._meta_ = DatasetMeta(name=name, split=split)
-        self._data_resolver_ = DataResolver(cfg, self._meta_)
-        self._id_list_ = self._data_resolver_.get_id_list()
+
+        self._data_resolver_ = _make_data_resolver(cfg, self._meta_)
+        self._transform_pipeline_ = TransformPipeline(cfg, self._meta_)
+        self._id_list_ = compact_id_list(self._data_resolver_.get_id_list())
+        self._stats_reported_at_ = None
+        self._share_resources_ = share_resources.value(cfg, self._meta_)
+
+        replay_root = replay_dir.value(cfg, self._meta_)
+        self._replay_root_ = None
+        if replay_root is not None:
+            self._replay_root_ = os.path.join(replay_root, name, split)
+        # (pipeline, item keys, reader) of the records being replayed
+        self._replay_store_ = None
+        self._replay_writer_ = None
+        self._replay_pid_ = None
+        # Flags of indices visited in current process since the last refresh
+        self._replay_seen_ = None
+
+        cache_options = transform_cache.value(cfg, self._meta_)
+        if isinstance(cache_options, ConfigNode):
+            cache_options = cache_options.value_dict()
+        self._transform_cache_ = None
+        if cache_options is not None:
+            if self._replay_root_ is not None:
+                raise ValueError("replay_dir and transform_cache cannot be both set")
+            self._transform_cache_ = TransformCache(**cache_options)
+        self._transform_cache_digest_ = None
 
     cfg = cfg_property
+    transform_pipeline = transform_pipeline_property
 
     def __len__(self):
         return len(self._id_list_)
 
     def __getitem__(self, index):
-        id = self._id_list_[index]  # pylint: disable=redefined-builtin
+        if isinstance(index, (list, tuple)):
+            return self.get_batch(index)
+        return self.get_batch([index])[0]
+
+    def _resolve_(self, indices):
+        ids = [self._id_list_[index] for index in indices]
+
+        keys = item_keys.value(self.cfg, self._meta_)
+        # LOCAL resources of the batch are dropped (or retained) afterwards
+        with self._data_resolver_.new_scope():
+            items_lists = self._data_resolver_.get_items_dict(ids, keys)
+        if self._prefetcher_ is not None:
+            for index in indices:
+                self._prefetcher_.release(index)
+
+        return [
+            {item_key: items[i] for item_key, items in items_lists.items()}
+            for i in range(len(ids))
+        ]
+
+    def _get_replay_reader_(self, pipeline, stop):
+        keys = tuple(item_keys.value(self.cfg, self._meta_))
+        store = self._replay_store_
+        if store is None or store[0] is not pipeline or store[1] != keys:
+            # Records are stored apart for each combination of item keys, config,
+            # ids and replayed transforms, so that changing any of them replays
+            # nothing stale. Records are located by index, so reordered ids count
+            # as changed ones
+            digest = pipeline.digest(
+                stop,
+                extra=(
+                    tuple(self._meta_),
+                    keys,
+                    content_digest(self.cfg),
+                    id_list_digest(self._id_list_),
+                ),
+            )
+            self._close_replay_writer_()
+            reader = RecordReader(
+                os.path.join(self._replay_root_, digest[:16]),
+                refresh_on_miss=False,
+            )
+            store = self._replay_store_ = (pipeline, keys, reader)
+            self._replay_seen_ = None
+        return store[2]
+
+    def _close_replay_writer_(self):
+        if self._replay_writer_ is not None:
+            self._replay_writer_.close()
+            self._replay_writer_ = None
+
+    def _replay_(self, pipeline, indices, stop):
+        reader = self._get_replay_reader_(pipeline, stop)
+        pid = os.getpid()
+        if self._replay_pid_ != pid:
+            # Writers are not shared with forked processes
+            self._replay_pid_ = pid
+            self._replay_writer_ = None
+            self._replay_seen_ = None
+
+        seen = self._replay_seen_
+        if seen is None or any(seen[index] for index in indices):
+            # Indices visited again mean a new epoch, so records written by all
+            # processes during the last one are picked up, once per epoch
+            reader.refresh()
+            seen = self._replay_seen_ = bytearray(len(self))
+        for index in indices:
+            seen[index] = 1
 
-        items_dict = {}
-        for item_key in item_keys.value(self.cfg, self._meta_):
-            items_dict[item_key] = self._data_resolver_.get_item(id, item_key)
+        items_dicts = [reader.get(index) for index in indices]
+        missing = [i for i, items_dict in enumerate(items_dicts) if items_dict is None]
+        if not missing:
+            return items_dicts
 
-        apply_transform(self.cfg, self._meta_, items_dict)
+        if self._replay_writer_ is None:
+            self._replay_writer_ = RecordWriter(reader.root)
+            # Shards are closed when the process, e.g. a DataLoader worker, exits
+            multiprocessing.util.Finalize(
+                self._replay_writer_, self._replay_writer_.close, exitpriority=10
+            )
+        resolved = self._resolve_([indices[i] for i in missing])
+        for i, items_dict in zip(missing, resolved):
+            items_dict = pipeline(items_dict, stop=stop)
+            self._replay_writer_.write(indices[i], items_dict)
+            items_dicts[i] = items_dict
+        return items_dicts
 
-        return items_dict
+    def _cache_key_suffix_(self, pipeline, stop):
+        keys = tuple(item_keys.value(self.cfg, self._meta_))
+        memo = self._transform_cache_digest_
+        if memo is None or memo[0] is not pipeline or memo[1] != keys:
+            # Resources are resolved with the config, so it is covered as well
+            digest = pipeline.digest(
+                stop,
+                extra=(tuple(self._meta_), keys, content_digest(self.cfg)),
+            )
+            memo = self._transform_cache_digest_ = (pipeline, keys, digest)
+        return pipeline.trans_keys[stop - 1], memo[2]
+
+    def _cached_(self, pipeline, indices, stop):
+        if stop == 0:
+            return self._resolve_(indices)
+
+        cache = self._transform_cache_
+        suffix = self._cache_key_suffix_(pipeline, stop)
+        cache_keys = [(self._id_list_[index], *suffix) for index in indices]
+        items_dicts = [cache.get(cache_key) for cache_key in cache_keys]
+        missing = [i for i, items_dict in enumerate(items_dicts) if items_dict is Cache.Empty]
+        if missing:
+            resolved = self._resolve_([indices[i] for i in missing])
+            for i, items_dict in zip(missing, resolved):
+                items_dict = pipeline(items_dict, stop=stop)
+                cache.set(cache_keys[i], items_dict)
+                items_dicts[i] = items_dict
+        # Cached dicts are never handed out, so that callers may modify them
+        return [dict(items_dict) for items_dict in items_dicts]
+
+    def get_batch(self, indices):
+        """
+        Returns a list of items dicts for `indices`, resolving each item key
+        for all of them at once.
+        """
+        self._report_stats_()
+        pipeline = self.transform_pipeline
+        if self._replay_root_ is not None:
+            start = pipeline.deterministic_stop()
+            items_dicts = self._replay_(pipeline, indices, start)
+        elif self._transform_cache_ is not None:
+            start = pipeline.deterministic_stop()
+            items_dicts = self._cached_(pipeline, indices, start)
+        else:
+            start = 0
+            items_dicts = self._resolve_(indices)
+
+        return [pipeline(items_dict, start=start) for items_dict in items_dicts]
+
+    def enable_prefetch(self, window=16, threads=4, max_bytes=None):
+        """
+        Creates a `Prefetcher` resolving LOCAL resources of upcoming samples in
+        background threads. Upcoming indices are fed by a `PrefetchSampler`.
+        """
+        if self._prefetcher_ is not None:
+            self._prefetcher_.close()
+        self._prefetcher_ = Prefetcher(
+            self,
+            item_keys.value(self.cfg, self._meta_),
+            window=window,
+            threads=threads,
+            max_bytes=max_bytes,
+        )
+        return self._prefetcher_
+
+    def share_global_resources(self):
+        self._data_resolver_.share_global_resources()
+        self._id_list_ = compact_id_list(self._data_resolver_.get_id_list())
+
+    def cache_stats(self):
+        """
+        Returns the `CacheStats` of resources in current process, or None if
+        statistics are disabled.
+        """
+        return self._data_resolver_.cache_stats()
+
+    def transform_cache_stats(self):
+        """
+        Returns the `CacheStats` of the transform cache in current process,
+        grouped by transform key, or None if disabled or without statistics.
+        """
+        if self._transform_cache_ is None:
+            return None
+        return self._transform_cache_.stats()
+
+    def _put_stats_(self, worker_id):
+        self._stats_sink_[(os.getpid(), worker_id)] = (
+            self.cache_stats(),
+            self.transform_cache_stats(),
+        )
+
+    def _report_stats_(self):
+        if self._stats_sink_ is None:
+            return
+        worker_info = get_worker_info()
+        if worker_info is None:
+            return
+
+        now = time.monotonic()
+        if self._stats_reported_at_ is None:
+            # Counters inherited from the main process are already accounted there
+            for stats in (self.cache_stats(), self.transform_cache_stats()):
+                if stats is not None:
+                    stats.reset(keep_nbytes=True)
+            # Make sure the final statistics are sent when the worker exits
+            multiprocessing.util.Finalize(
+                None, self._put_stats_, args=(worker_info.id, ), exitpriority=10
+            )
+        elif now - self._stats_reported_at_ < self.stats_report_interval:
+            return
+        self._stats_reported_at_ = now
+        self._put_stats_(worker_info.id)
+
+    def _start_epoch_(self):
+        # Called by `DataLoader` before iterating, and before workers copy the dataset
+        _get_transform_pipeline(self, check_kwargs=True)
+
+    def as_loader(self, *args, **kwargs):
+        return DataLoader(self.cfg, self, *args, **kwargs)
+
+
+class StreamingDataset(torch_IterableDataset):
+    """
+    Iterates over samples without materializing the id list, which may be
+    produced by a generator and is requested afresh for every epoch. Ids are
+    dealt round-robin to DataLoader workers of all distributed ranks, so that
+    each sample is yielded by exactly one of them.
+    """
+    def __init__(self, cfg, name, split):
+        self._cfg_ = cfg
+        self._meta_ = DatasetMeta(name=name, split=split)
+        self._data_resolver_ = _make_data_resolver(cfg, self._meta_)
+        self._transform_pipeline_ = TransformPipeline(cfg, self._meta_)
+
+    cfg = cfg_property
+    transform_pipeline = transform_pipeline_property
+
+    def _iter_ids_(self):
+        worker_info = get_worker_info()
+        num_workers = 1 if worker_info is None else worker_info.num_workers
+        worker_id = 0 if worker_info is None else worker_info.id
+        num_shards = get_world_size() * num_workers
+        shard = get_rank() * num_workers + worker_id
+        return itertools.islice(self._data_resolver_.iter_id_list(), shard, None, num_shards)
+
+    def __iter__(self):
+        keys = item_keys.value(self.cfg, self._meta_)
+        pipeline = _get_transform_pipeline(self, check_kwargs=True)
+        for id in self._iter_ids_():  # pylint: disable=redefined-builtin
+            with self._data_resolver_.new_scope():
+                items_lists = self._data_resolver_.get_items_dict([id], keys)
+            items_dict = {item_key: items[0] for item_key, items in items_lists.items()}
+            yield pipeline(items_dict)
 
     def as_loader(self, *args, **kwargs):
         return DataLoader(self.cfg, self, *args, **kwargs)
@@ -47,3 +452,7 @@ class Dataset(torch_Dataset):
 
 def get_dataset(name, split, cfg=None):
     return Dataset(cfg, name, split)
+
+
+def get_streaming_dataset(name, split, cfg=None):
+    return StreamingDataset(cfg, name, split)
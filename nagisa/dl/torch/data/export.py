@@ -0,0 +1,64 @@
+import os
+import pickle
+
+from torch.utils.data import DataLoader as torch_DataLoader
+from torch.utils.data.dataset import Dataset as torch_Dataset
+
+from nagisa.dl.torch.misc.records import RecordWriter
+
+from ._id_list import compact_id_list
+from .table import ColumnarTable
+
+__all__ = [
+    "export_records",
+]
+
+ID_LIST_FILENAME = "id_list.pkl"
+# A `ColumnarTable` without columns, mapping ids to positions of their records
+ID_TABLE_DIRNAME = "ids"
+
+
+class _ResolvedItems(torch_Dataset):
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        return self.dataset._resolve_([index])[0]
+
+
+def _identity(x):
+    return x
+
+
+def export_records(dataset, root, shard_size=2**30, num_workers=0):
+    """
+    Resolves all items dicts of `dataset`, without transforms, into record
+    shards of about `shard_size` bytes under `root/<name>/<split>`, the layout
+    read back when `records_dir` is set to `root`. Items are resolved in
+    `num_workers` processes if given, and written sequentially. Records are
+    keyed by position, so ids must be unique.
+    """
+    meta = dataset._meta_
+    root = os.path.join(root, meta.name, meta.split)
+    if os.path.isdir(root) and os.listdir(root):
+        raise FileExistsError(f"Directory {root} is not empty")
+    ids = list(dataset._id_list_)
+    if len(set(ids)) != len(ids):
+        raise ValueError("Cannot export a dataset with duplicate ids")
+
+    loader = torch_DataLoader(
+        _ResolvedItems(dataset),
+        batch_size=None,
+        num_workers=num_workers,
+        collate_fn=_identity,
+    )
+    with RecordWriter(root, shard_size=shard_size, prefix="part") as writer:
+        for index, items_dict in enumerate(loader):
+            writer.write(index, items_dict)
+
+    ColumnarTable(ids, {}).save(os.path.join(root, ID_TABLE_DIRNAME))
+    with open(os.path.join(root, ID_LIST_FILENAME), "wb") as f:
+        pickle.dump(compact_id_list(ids), f, protocol=pickle.HIGHEST_PROTOCOL)
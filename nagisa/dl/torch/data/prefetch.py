@@ -0,0 +1,169 @@
+import threading
+import collections
+import concurrent.futures
+
+from torch.utils.data import Sampler
+
+from nagisa.core.misc.cache import ConcurrentScopedCache
+
+from ._async_data_resolver import AsyncDataResolver
+
+__all__ = [
+    "Prefetcher",
+    "PrefetchSampler",
+]
+
+
+class Prefetcher:
+    """
+    Resolves LOCAL resources needed by `item_keys` for upcoming samples of
+    `dataset` in background threads, filling the cache of its `DataResolver`.
+    At most `window` samples are prefetched ahead, and no new sample is
+    scheduled while prefetched but not yet released resources take more than
+    `max_bytes`.
+
+    Prefetched resources are kept until the dataset releases the sample after
+    resolving it, or until the sample falls outside the window.
+    """
+    def __init__(self, dataset, item_keys, window=16, threads=4, max_bytes=None):
+        resolver = dataset._data_resolver_
+        if not isinstance(getattr(resolver, "__cache__", None), ConcurrentScopedCache):
+            raise ValueError(
+                "Prefetching requires a thread-safe resource cache, "
+                "set `\"concurrent\": True` in resource_cache"
+            )
+        if isinstance(resolver, AsyncDataResolver):
+            raise ValueError("Prefetching is not supported by AsyncDataResolver")
+
+        self.dataset = dataset
+        self.item_keys = list(item_keys)
+        self.window = window
+        self.max_bytes = max_bytes
+        self._threads_ = threads
+        self._executor_ = None
+        # Callbacks of finished futures run in the thread adding them
+        self._lock_ = threading.RLock()
+        # index -> Future of (cache_keys, nbytes)
+        self._scheduled_ = {}
+        self._consumed_ = {}
+        self._nbytes_ = 0
+
+    def __getstate__(self):
+        raise TypeError("Prefetcher cannot be pickled")
+
+    @property
+    def nbytes(self):
+        with self._lock_:
+            return self._nbytes_
+
+    def _get_executor_(self):
+        if self._executor_ is None:
+            self._executor_ = concurrent.futures.ThreadPoolExecutor(
+                self._threads_, thread_name_prefix="prefetch"
+            )
+        return self._executor_
+
+    def _prefetch_(self, index):
+        dataset = self.dataset
+        cache_keys, nbytes = dataset._data_resolver_.prefetch(
+            dataset._id_list_[index], self.item_keys
+        )
+        with self._lock_:
+            self._nbytes_ += nbytes
+        return cache_keys, nbytes
+
+    def _release_future_(self, future):
+        if future.cancel():
+            return
+
+        def _release(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            cache_keys, nbytes = future.result()
+            self.dataset._data_resolver_.release(cache_keys)
+            with self._lock_:
+                self._nbytes_ -= nbytes
+
+        future.add_done_callback(_release)
+
+    def update(self, upcoming, consumed=None):
+        """
+        Moves the window onto `upcoming` indices. `consumed` is the index being
+        handed to the dataset, whose resources are kept until `release()`.
+        Work for indices outside the window is cancelled.
+        """
+        with self._lock_:
+            if consumed is not None and consumed in self._scheduled_:
+                self._consumed_[consumed] = self._scheduled_.pop(consumed)
+
+            upcoming = list(upcoming)[:self.window]
+            upcoming_set = set(upcoming)
+            for index in [index for index in self._scheduled_ if index not in upcoming_set]:
+                self._release_future_(self._scheduled_.pop(index))
+
+            for index in upcoming:
+                if index in self._scheduled_ or index in self._consumed_:
+                    continue
+                if self.max_bytes is not None and self._nbytes_ >= self.max_bytes:
+                    break
+                self._scheduled_[index] = self._get_executor_().submit(self._prefetch_, index)
+
+    def release(self, index):
+        """
+        Drops resources prefetched for `index`. Called after the sample is
+        resolved.
+        """
+        with self._lock_:
+            future = self._consumed_.pop(index, None)
+            if future is None:
+                future = self._scheduled_.pop(index, None)
+        if future is not None:
+            self._release_future_(future)
+
+    def reset(self):
+        with self._lock_:
+            futures = list(self._scheduled_.values()) + list(self._consumed_.values())
+            self._scheduled_.clear()
+            self._consumed_.clear()
+        for future in futures:
+            self._release_future_(future)
+
+    def close(self):
+        self.reset()
+        if self._executor_ is not None:
+            self._executor_.shutdown(wait=True)
+            self._executor_ = None
+
+
+class PrefetchSampler(Sampler):
+    """
+    Wraps `sampler` to look `prefetcher.window` indices ahead and keep the
+    prefetcher busy with them.
+    """
+    def __init__(self, sampler, prefetcher):
+        self.sampler = sampler
+        self.prefetcher = prefetcher
+
+    def __len__(self):
+        return len(self.sampler)
+
+    def __iter__(self):
+        prefetcher = self.prefetcher
+        # Leftovers of an interrupted iteration are no longer needed
+        prefetcher.reset()
+
+        iterator = iter(self.sampler)
+        upcoming = collections.deque()
+        for index in iterator:
+            upcoming.append(index)
+            if len(upcoming) >= prefetcher.window:
+                break
+        prefetcher.update(upcoming)
+
+        while upcoming:
+            index = upcoming.popleft()
+            for next_index in iterator:
+                upcoming.append(next_index)
+                break
+            prefetcher.update(upcoming, consumed=index)
+            yield index
@@ -0,0 +1,228 @@
+import os
+import json
+import collections.abc
+
+import numpy as np
+
+from ._id_list import StringIdList, encode_strings
+
+__all__ = [
+    "ColumnarTable",
+]
+
+_META_FILENAME = "table.json"
+# Columns are saved by position, so that field names never form paths
+_COLUMNS_DIRNAME = "columns"
+
+
+class _StringColumn(StringIdList):
+    """
+    Strings stored like `StringIdList`, in a uint8 array and an int64 array
+    of end offsets.
+    """
+    @classmethod
+    def from_strings(cls, strings):
+        blob, ends = encode_strings(strings)
+        return cls.from_buffers(np.frombuffer(blob, dtype=np.uint8), ends)
+
+    @property
+    def blob(self):
+        return self._blob_
+
+    @property
+    def ends(self):
+        return self._ends_
+
+    @property
+    def nbytes(self):
+        return self._blob_.nbytes + self._ends_.nbytes
+
+
+def _to_column(name, values):
+    if values and all(isinstance(value, str) for value in values):
+        return _StringColumn.from_strings(values)
+    try:
+        column = np.asarray(values)
+    except ValueError as e:
+        raise ValueError(f"Column {name} has values of different shapes") from e
+    if column.dtype.kind == "U":
+        # NumPy would turn values of other types into strings
+        raise TypeError(f"Column {name} has strings mixed with values of other types")
+    return column
+
+
+class ColumnarTable:
+    """
+    Per-id fields stored column by column: numeric fields as NumPy arrays,
+    string fields as offset-encoded buffers. Rows are found by id through a
+    sorted permutation of ids (or arithmetic for contiguous integer ids), so
+    no Python object is held per row. It is meant to be returned by a GLOBAL
+    resource and indexed by LOCAL items, e.g. `table.get(id, "label")`.
+
+    Tables written by `save()` are memory-mapped by `load()`, and such tables
+    are pickled by path, so DataLoader workers share the page cache instead
+    of holding copies.
+    """
+    def __init__(self, ids, columns, order=None):
+        """
+        `columns` maps field names to values of all rows in the order of
+        `ids`. `order`, the stable argsort of `ids`, is computed if not given.
+        """
+        ids = np.asarray(ids)
+        if ids.dtype.kind == "U":
+            ids = np.char.encode(ids, "utf-8")
+        if ids.dtype.kind not in "iuS":
+            raise TypeError(f"Ids must be integers or strings, got {ids.dtype}")
+
+        self._ids_ = ids
+        self._columns_ = {}
+        for name, values in columns.items():
+            if not isinstance(name, str) or not name:
+                raise ValueError(f"Field names must be non-empty strings, got {name!r}")
+            if not isinstance(values, (np.ndarray, _StringColumn)):
+                values = _to_column(name, list(values))
+            if isinstance(values, np.ndarray) and values.dtype.hasobject:
+                # Such columns hold a Python object per row and cannot be saved
+                raise TypeError(
+                    f"Column {name} has values of mixed types or None, got {values.dtype}"
+                )
+            if len(values) != len(ids):
+                raise ValueError(f"Column {name} has {len(values)} rows, expect {len(ids)}")
+            self._columns_[name] = values
+        self._path_ = None
+        self._init_index_(order)
+
+    def _init_index_(self, order):
+        ids = self._ids_
+        self._first_id_ = None
+        self._order_ = None
+        if ids.dtype.kind in "iu" and len(ids) > 0 and (
+            int(ids[-1]) - int(ids[0]) == len(ids) - 1 and bool(np.all(np.diff(ids) == 1))
+        ):
+            self._first_id_ = int(ids[0])
+        else:
+            self._order_ = np.argsort(ids, kind="stable") if order is None else order
+
+    @classmethod
+    def from_records(cls, records, id_field="id"):
+        """
+        Builds a table from an iterable of dicts, each holding `id_field` and
+        the same set of other fields.
+        """
+        ids, columns = [], collections.defaultdict(list)
+        for record in records:
+            ids.append(record[id_field])
+            for name, value in record.items():
+                if name != id_field:
+                    columns[name].append(value)
+        return cls(ids, columns)
+
+    def __len__(self):
+        return len(self._ids_)
+
+    def __reduce__(self):
+        if self._path_ is not None:
+            return (type(self).load, (self._path_, True))
+        return super().__reduce__()
+
+    @property
+    def fields(self):
+        return tuple(self._columns_)
+
+    @property
+    def nbytes(self):
+        return self._ids_.nbytes + sum(column.nbytes for column in self._columns_.values()) + (
+            0 if self._order_ is None else self._order_.nbytes
+        )
+
+    def index(self, id):  # pylint: disable=redefined-builtin
+        """
+        Returns the row of `id`, or raises `KeyError`.
+        """
+        ids = self._ids_
+        if self._first_id_ is not None:
+            if isinstance(id, (int, np.integer)) and 0 <= id - self._first_id_ < len(ids):
+                return int(id - self._first_id_)
+            raise KeyError(id)
+
+        key = id.encode("utf-8") if isinstance(id, str) else id
+        i = int(np.searchsorted(ids, key, sorter=self._order_))
+        if i < len(ids):
+            row = int(self._order_[i])
+            if ids[row] == key:
+                return row
+        raise KeyError(id)
+
+    def __contains__(self, id):  # pylint: disable=redefined-builtin
+        try:
+            self.index(id)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def column(self, field):
+        return self._columns_[field]
+
+    def get(self, id, field):  # pylint: disable=redefined-builtin
+        """
+        Returns `field` of `id`. Scalars are converted to Python objects, rows
+        of multi-dimensional columns are returned as array views.
+        """
+        value = self._columns_[field][self.index(id)]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def row(self, id):  # pylint: disable=redefined-builtin
+        row = self.index(id)
+        result = {}
+        for field, column in self._columns_.items():
+            value = column[row]
+            result[field] = value.item() if isinstance(value, np.generic) else value
+        return result
+
+    __getitem__ = row
+
+    def save(self, path):
+        columns_dir = os.path.join(path, _COLUMNS_DIRNAME)
+        os.makedirs(columns_dir, exist_ok=True)
+        fields = []
+        np.save(os.path.join(path, "ids.npy"), self._ids_, allow_pickle=False)
+        if self._order_ is not None:
+            np.save(os.path.join(path, "order.npy"), self._order_, allow_pickle=False)
+        for i, (field, column) in enumerate(self._columns_.items()):
+            filename = os.path.join(columns_dir, str(i))
+            if isinstance(column, _StringColumn):
+                fields.append([field, "string"])
+                np.save(filename + ".blob.npy", column.blob, allow_pickle=False)
+                np.save(filename + ".ends.npy", column.ends, allow_pickle=False)
+            else:
+                fields.append([field, "array"])
+                np.save(filename + ".npy", column, allow_pickle=False)
+        with open(os.path.join(path, _META_FILENAME), "w") as f:
+            json.dump({"fields": fields}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mmap_mode = "r" if mmap else None
+
+        def _load(*filename):
+            return np.load(os.path.join(path, *filename), mmap_mode=mmap_mode, allow_pickle=False)
+
+        with open(os.path.join(path, _META_FILENAME)) as f:
+            fields = json.load(f)["fields"]
+        columns = {}
+        for i, (field, kind) in enumerate(fields):
+            if kind == "string":
+                columns[field] = _StringColumn.from_buffers(
+                    _load(_COLUMNS_DIRNAME, f"{i}.blob.npy"),
+                    _load(_COLUMNS_DIRNAME, f"{i}.ends.npy"),
+                )
+            else:
+                columns[field] = _load(_COLUMNS_DIRNAME, f"{i}.npy")
+
+        order = _load("order.npy") if os.path.exists(os.path.join(path, "order.npy")) else None
+        table = cls(_load("ids.npy"), columns, order=order)
+        if mmap:
+            table._path_ = os.fspath(path)
+        return table
@@ -1,14 +1,25 @@
-from nagisa.core.misc.cache import Cache
+import time
+import hashlib
+
+from nagisa.core.misc.cache import Cache, CacheStats, DiskCache, estimate_size, fingerprint
 from nagisa.core.misc.naming import camel_to_snake
 from nagisa.core.state.schema import SchemaNode
 from nagisa.core.state.config import ConfigValue, ConfigNode, cfg_property
 
-from ._registries import Transform
+from ._registries import Transform, BatchTransform
 
 __all__ = [
     "trans_seq",
     "trans_kwargs",
+    "batch_trans_seq",
+    "batch_trans_kwargs",
     "BaseTransform",
+    "BaseBatchTransform",
+    "TransformPipeline",
+    "BatchTransformPipeline",
+    "TransformCache",
+    "get_transform_pipeline",
+    "get_transforms",
     "apply_transform",
 ]
 
@@ -23,17 +34,59 @@ trans_kwargs = ConfigValue(
     default=lambda: {},
 )
 
+# Keys of `BaseBatchTransform`s applied to batches collated by the DataLoader, and their
+# keyword arguments, like `trans_seq` and `trans_kwargs`
+batch_trans_seq = ConfigValue(
+    f"{__name__}.batch_trans_seq",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: [],
+)
+batch_trans_kwargs = ConfigValue(
+    f"{__name__}.batch_trans_kwargs",
+    func_spec=["cfg|c?", "meta|m?"],
+    default=lambda: {},
+)
+
+
+def _handler_key(name):
+    if name.startswith("_t_") and name.endswith("_") and len(name) > len("_t__"):
+        return name[len("_t_"):-len("_")]
+    return None
+
 
 class BaseTransform:
+    # Registry where subclasses are registered
+    _registry_ = Transform
+    # Whether outputs depend on inputs only. Leading deterministic transforms of
+    # `trans_seq` are applied once and replayed in later epochs if replay is enabled.
+    _deterministic_ = False
+    # Whether to modify the given items dict instead of returning a new one. Handlers
+    # then see items already transformed by earlier handlers.
+    _inplace_ = False
+
+    # Item key -> name of its `_t_<item key>_` handler, collected once per class and
+    # extended per instance when handlers are assigned to instances. Handlers are looked
+    # up on the instance, so that static methods, class methods and handlers assigned to
+    # instances work as usual. Without `_default_`, handlers run in the sorted order of
+    # their names, followed by those assigned to the instance, and not in the order of
+    # items, which matters for `_inplace_` transforms.
+    _handlers_ = {}
+    _has_default_ = False
+
     @SchemaNode.writable
     class _kwargs_schema_:
         pass
 
-    def __init_subclass__(cls, key=None):
-        if key is None:
-            key = camel_to_snake(cls.__name__)
+    def __init_subclass__(cls, key=None, register=True):
+        cls._handlers_ = {
+            _handler_key(name): name
+            for name in dir(cls) if _handler_key(name) is not None
+        }
+        cls._has_default_ = cls._default_ is not BaseTransform._default_
 
-        Transform.register(key, cls)
+        # Base classes of other kinds of transforms pass `register=False`
+        if register:
+            cls._registry_.register(camel_to_snake(cls.__name__) if key is None else key, cls)
 
     def __init__(self, *, cfg=None, meta=None, **kwargs):
         self._cfg_ = cfg
@@ -42,6 +95,12 @@ class BaseTransform:
         self._check_kwargs_(kwargs)
         self.kwargs = kwargs.freeze()
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        key = _handler_key(name)
+        if key is not None and key not in self._handlers_:
+            self._handlers_ = {**self._handlers_, key: name}
+
     def _check_kwargs_(self, kwargs):
         pass
 
@@ -62,46 +121,266 @@ class BaseTransform:
         if not self._use_me_(item_dict):
             return item_dict
 
-        ret_item_dict = {}
-        for item_key, item in item_dict.items():
-            func_name = f"_t_{item_key}_"
+        ret_item_dict = item_dict if self._inplace_ else dict(item_dict)
+        handlers = self._handlers_
+        if self._has_default_:
+            for item_key, item in item_dict.items():
+                handler_name = handlers.get(item_key)
+                if handler_name is not None:
+                    item = getattr(self, handler_name)(item, item_dict)
+                else:
+                    item = self._default_(item, item_key, item_dict)
+                ret_item_dict[item_key] = item
+        else:
+            # Items without handler are left untouched
+            for item_key, handler_name in handlers.items():
+                if item_key in item_dict:
+                    handler = getattr(self, handler_name)
+                    ret_item_dict[item_key] = handler(item_dict[item_key], item_dict)
 
-            if hasattr(self, func_name):
-                item = getattr(self, func_name)(item, item_dict)
-            else:
-                item = self._default_(item, item_key, item_dict)
+        return ret_item_dict
 
-            ret_item_dict[item_key] = item
 
-        return ret_item_dict
+class BaseBatchTransform(BaseTransform, register=False):
+    """
+    Transform of a batch dict produced by `CollateFn`. Handlers receive the
+    collated items, e.g. batch tensors, so that they can be transformed with
+    vectorized operations once per batch instead of once per sample.
+    """
+    _registry_ = BatchTransform
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return tuple(sorted((key, _freeze(value)) for key, value in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(x) for x in obj)
+    try:
+        return fingerprint(obj)
+    except TypeError:
+        return repr(obj)
+
+
+_DIGEST_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+def _digest_spec(obj):
+    # Unlike `_freeze()`, only accepts values whose repr is the same in every run
+    if isinstance(obj, ConfigNode):
+        obj = obj.value_dict()
+    if isinstance(obj, dict):
+        return tuple(sorted(((_digest_spec(key), _digest_spec(value))
+                             for key, value in obj.items()), key=repr))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_digest_spec(x) for x in obj)
+    if isinstance(obj, _DIGEST_TYPES):
+        return obj
+    raise TypeError(f"{type(obj).__name__} object has no digest stable across runs")
+
+
+def _cfg_key(cfg):
+    try:
+        return fingerprint(cfg)
+    except TypeError:
+        return id(cfg)
+
+
+def _pipeline_spec(cfg, meta, seq_value=trans_seq, kwargs_value=trans_kwargs):
+    trans_seq_list = list(seq_value.func(cfg=cfg, meta=meta))
+
+    trans_kwargs_mapping = kwargs_value.value(cfg=cfg, meta=meta)
+    if isinstance(trans_kwargs_mapping, ConfigNode):
+        trans_kwargs_mapping = trans_kwargs_mapping.value_dict()
+    kwargs_list = [trans_kwargs_mapping.get(trans_key, {}) for trans_key in trans_seq_list]
+
+    key = (meta, _cfg_key(cfg), tuple(trans_seq_list), _freeze(kwargs_list))
+    return key, trans_seq_list, kwargs_list
+
+
+class TransformPipeline:
+    """
+    Transforms of `trans_seq` instantiated with their `trans_kwargs` for a
+    `(cfg, meta)` pair. Build it once and call it on every items dict. If
+    `timing` is set, time spent in each transform is accumulated in current
+    process, see `timings()`.
+    """
+
+    _seq_value_ = trans_seq
+    _kwargs_value_ = trans_kwargs
+    _registry_ = Transform
+
+    def __init__(self, cfg, meta, timing=False):
+        self.cfg, self.meta = cfg, meta
+        self.key, self.trans_keys, kwargs_list = self._spec_()
+        self._kwargs_list_ = kwargs_list
+        self.transforms = [
+            self._registry_[trans_key](cfg=cfg, meta=meta, **kwargs)
+            for trans_key, kwargs in zip(self.trans_keys, kwargs_list)
+        ]
+        self.timing = timing
+        self._calls_ = [0] * len(self.transforms)
+        self._seconds_ = [0.0] * len(self.transforms)
+
+    def __reduce__(self):
+        # Transforms are rebuilt from the registry in the receiving process
+        return (type(self), (self.cfg, self.meta, self.timing))
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def is_stale(self):
+        """
+        Tells whether `trans_seq`, `trans_kwargs` or the config changed since
+        the pipeline was built.
+        """
+        return self._spec_()[0] != self.key
+
+    def is_cfg_changed(self):
+        """
+        Tells whether the config changed since the pipeline was built. Unlike
+        `is_stale()`, it is cheap enough to check for every sample.
+        """
+        return _cfg_key(self.cfg) != self.key[1]
+
+    def deterministic_stop(self):
+        """
+        Returns the number of leading deterministic transforms.
+        """
+        stop = 0
+        for transform in self.transforms:
+            if not transform._deterministic_:
+                break
+            stop += 1
+        return stop
+
+    def digest(self, stop=None, extra=()):
+        """
+        Returns a digest of keys and kwargs of the transforms before `stop`,
+        and of `extra`, which is stable across runs. Raises `TypeError` if
+        kwargs of those transforms hold values other than plain scalars,
+        strings and containers of them, since their repr may change between
+        runs. Such transforms have to be kept out of caching, e.g. by leaving
+        them non-deterministic.
+        """
+        stop = len(self.transforms) if stop is None else stop
+        kwargs_specs = []
+        for trans_key, kwargs in zip(self.trans_keys[:stop], self._kwargs_list_):
+            try:
+                kwargs_specs.append(_digest_spec(kwargs))
+            except TypeError as e:
+                raise TypeError(f"Cannot digest kwargs of transform '{trans_key}': {e}") from e
+        spec = (self.trans_keys[:stop], kwargs_specs, _digest_spec(extra))
+        return hashlib.sha1(repr(spec).encode("utf-8")).hexdigest()
+
+    def _spec_(self):
+        return _pipeline_spec(self.cfg, self.meta, self._seq_value_, self._kwargs_value_)
+
+    def __call__(self, item_dict, start=0, stop=None):
+        """
+        Applies the transforms to `item_dict`, or those in range
+        `[start, stop)` if given.
+        """
+        if not self.timing:
+            for transform in self.transforms[start:stop]:
+                item_dict = transform(item_dict)
+            return item_dict
+
+        for i in range(*slice(start, stop).indices(len(self.transforms))):
+            begin = time.perf_counter()
+            item_dict = self.transforms[i](item_dict)
+            self._seconds_[i] += time.perf_counter() - begin
+            self._calls_[i] += 1
+        return item_dict
+
+    def timings(self):
+        """
+        Returns a list of `(transform key, calls, seconds)` per transform.
+        """
+        return list(zip(self.trans_keys, self._calls_, self._seconds_))
+
+    def reset_timings(self):
+        self._calls_ = [0] * len(self.transforms)
+        self._seconds_ = [0.0] * len(self.transforms)
+
+
+class BatchTransformPipeline(TransformPipeline):
+    """
+    Transforms of `batch_trans_seq` instantiated with their
+    `batch_trans_kwargs`, applied to batch dicts.
+    """
+
+    _seq_value_ = batch_trans_seq
+    _kwargs_value_ = batch_trans_kwargs
+    _registry_ = BatchTransform
+
+
+def _items_size(item_dict):
+    return sum(estimate_size(item) for item in item_dict.values())
+
+
+class TransformCache:
+    """
+    Transformed items dicts keyed by `(id, transform key, digest)`, where the
+    transform is the last one applied and the digest covers the applied
+    transforms and their kwargs. Entries are kept in memory within the limits
+    given by `cache_options`, e.g. `max_bytes`, and in a `DiskCache` under
+    `disk_dir` if given. If `stats` is set, hits of either tier and misses are
+    counted per transform key.
+    """
+    def __init__(self, disk_dir=None, stats=None, **cache_options):
+        if stats is True:
+            stats = CacheStats(prefix_index=1)
+        self.__cache__ = Cache(size_of=_items_size, stats=stats, **cache_options)
+        self.__disk_cache__ = DiskCache(disk_dir) if disk_dir is not None else None
+
+    def stats(self):
+        return self.__cache__.stats
 
+    def get(self, key):
+        cache, disk_cache = self.__cache__, self.__disk_cache__
+        if disk_cache is None or cache.has(key):
+            return cache.get(key)
 
-__cache__ = Cache()
+        value = disk_cache.get(key)
+        stats = cache.stats
+        if value is disk_cache.Empty:
+            if stats is not None:
+                stats.record_miss(key)
+            return cache.Empty
+        if stats is not None:
+            stats.record_hit(key)
+        cache.set(key, value)
+        return value
 
+    def set(self, key, item_dict):
+        self.__cache__.set(key, item_dict)
+        if self.__disk_cache__ is not None:
+            self.__disk_cache__.set(key, item_dict)
 
-def apply_transform(cfg, meta, item_dict):
-    trans_seq_list = trans_seq.func(cfg=cfg, meta=meta)
-    cache_key = (meta, *trans_seq_list)
 
-    transforms = __cache__.get(cache_key)
-    if transforms is __cache__.Empty:
+__cache__ = Cache(max_entries=64)
 
-        trans_kwargs_mapping = trans_kwargs.value(cfg=cfg, meta=meta)
-        if isinstance(trans_kwargs_mapping, ConfigNode):
-            trans_kwargs_mapping = trans_kwargs_mapping.value_dict()
 
-        transforms = []
-        for trans_key in trans_seq_list:
-            if trans_key in trans_kwargs_mapping:
-                kwargs = trans_kwargs_mapping[trans_key]
-            else:
-                kwargs = {}
+def get_transform_pipeline(cfg, meta):
+    """
+    Returns a `TransformPipeline` for `(cfg, meta)`, shared by calls with the
+    same transforms, kwargs and config.
+    """
+    key = _pipeline_spec(cfg, meta)[0]
+    pipeline = __cache__.get(key)
+    if pipeline is __cache__.Empty:
+        pipeline = TransformPipeline(cfg, meta)
+        __cache__.set(key, pipeline)
+    return pipeline
 
-            transforms.append(Transform[trans_key](cfg=cfg, meta=meta, **kwargs))
 
-        __cache__.set(cache_key, transforms)
+def get_transforms(cfg, meta):
+    return get_transform_pipeline(cfg, meta).transforms
 
-    for transform in transforms:
-        item_dict = transform(item_dict)
 
-    return item_dict
+def apply_transform(cfg, meta, item_dict, start=0, stop=None):
+    """
+    Applies transforms of `trans_seq` to `item_dict`, or those in range
+    `[start, stop)` if given.
+    """
+    return get_transform_pipeline(cfg, meta)(item_dict, start, stop)
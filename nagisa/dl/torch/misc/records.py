@@ -0,0 +1,247 @@
+import io
+import os
+import mmap
+import uuid
+import pickle
+import collections.abc
+
+import numpy as np
+import torch
+
+__all__ = [
+    "RecordWriter",
+    "RecordReader",
+]
+
+_ALIGNMENT = 64
+# Rows of a shard index, locating a record within the shard
+_INDEX_DTYPE = np.dtype([("key", "<i8"), ("start", "<i8"), ("end", "<i8")])
+_HEADER_LEN_SIZE = 8
+
+
+def _align(n):
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class _RecordPickler(pickle.Pickler):
+    """
+    Pickles a record, leaving arrays and tensors out of band. Their raw
+    buffers are collected in `payloads`, each at an aligned offset relative
+    to the start of the payload area.
+    """
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.payloads = []
+        self.payloads_size = 0
+        self._pids_ = {}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, torch.Tensor):
+            kind = "tensor"
+            try:
+                array = obj.detach().cpu().numpy()
+            except TypeError:
+                # dtypes unknown to NumPy are pickled as usual
+                return None
+        elif isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+            kind, array = "array", obj
+        else:
+            return None
+
+        pid = self._pids_.get(id(obj))
+        if pid is None:
+            # Unlike `np.ascontiguousarray()`, keeps 0-d arrays as is
+            array = np.require(array, requirements="C")
+            pid = (kind, self.payloads_size, array.dtype.str, array.shape)
+            self.payloads.append(array)
+            self.payloads_size = _align(self.payloads_size + array.nbytes)
+            self._pids_[id(obj)] = pid
+        return pid
+
+
+class _RecordUnpickler(pickle.Unpickler):
+    def __init__(self, file, buffer, payload_start):
+        super().__init__(file)
+        self._buffer_ = buffer
+        self._payload_start_ = payload_start
+
+    def persistent_load(self, pid):
+        kind, offset, dtype, shape = pid
+        dtype = np.dtype(dtype)
+        start = self._payload_start_ + offset
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        array = self._buffer_[start:start + nbytes].view(dtype).reshape(shape)
+        if kind == "tensor":
+            return torch.from_numpy(array)
+        return array
+
+
+def encode_record(obj):
+    """
+    Returns a list of buffers which, written contiguously, form the record of
+    `obj`.
+    """
+    file = io.BytesIO()
+    pickler = _RecordPickler(file)
+    pickler.dump(obj)
+    header = file.getvalue()
+
+    buffers = [np.array(len(header), dtype="<u8").tobytes(), header]
+    pos = _HEADER_LEN_SIZE + len(header)
+    for array in pickler.payloads:
+        padding = _align(pos) - pos
+        if padding:
+            buffers.append(b"\0" * padding)
+        buffers.append(memoryview(array.reshape(-1).view(np.uint8)))
+        pos = _align(pos) + array.nbytes
+    return buffers
+
+
+def decode_record(buffer, start=0):
+    """
+    Loads the record at `start` of a uint8 array `buffer`. Arrays and tensors
+    are views into `buffer`.
+    """
+    header_start = start + _HEADER_LEN_SIZE
+    header_len = int(buffer[start:header_start].view("<u8")[0])
+    header = bytes(buffer[header_start:header_start + header_len])
+    payload_start = start + _align(_HEADER_LEN_SIZE + header_len)
+    return _RecordUnpickler(io.BytesIO(header), buffer, payload_start).load()
+
+
+class RecordWriter:
+    """
+    Appends records with integer keys to shards of about `shard_size` bytes
+    under `root`. Shard `<prefix>-<n>.bin` holds records back to back, and
+    `<prefix>-<n>.idx` holds one `(key, start, end)` row per record, appended
+    after the record itself so that readers only see complete records.
+    Several writers may share `root` as long as their prefixes differ.
+    """
+    def __init__(self, root, shard_size=2**30, prefix=None):
+        self.root = os.fspath(root)
+        self.shard_size = shard_size
+        if prefix is None:
+            prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.prefix = prefix
+        self._shard_no_ = -1
+        self._bin_ = None
+        self._idx_ = None
+        self._pos_ = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_shard_(self):
+        self.close()
+        self._shard_no_ += 1
+        os.makedirs(self.root, exist_ok=True)
+        name = os.path.join(self.root, f"{self.prefix}-{self._shard_no_:05d}")
+        self._bin_ = open(name + ".bin", "wb")
+        self._idx_ = open(name + ".idx", "wb")
+        self._pos_ = 0
+
+    def write(self, key, obj):
+        buffers = encode_record(obj)
+        size = sum(memoryview(buffer).nbytes for buffer in buffers)
+        if self._bin_ is None or self._pos_ > 0 and self._pos_ + size > self.shard_size:
+            self._open_shard_()
+
+        start = self._pos_
+        for buffer in buffers:
+            self._bin_.write(buffer)
+        end = start + size
+        padding = _align(end) - end
+        if padding:
+            self._bin_.write(b"\0" * padding)
+        self._pos_ = end + padding
+        self._bin_.flush()
+
+        row = np.array([(key, start, end)], dtype=_INDEX_DTYPE)
+        self._idx_.write(row.tobytes())
+        self._idx_.flush()
+
+    def close(self):
+        for f in (self._bin_, self._idx_):
+            if f is not None:
+                f.close()
+        self._bin_ = self._idx_ = None
+
+
+class RecordReader(collections.abc.Mapping):
+    """
+    Maps keys to records written by `RecordWriter`s under `root`. Each loaded
+    record is memory-mapped copy-on-write on its own, so its arrays and
+    tensors are not copied and modifying them affects neither the shard nor
+    other loads. Records written after the last `refresh()` are picked up on
+    lookup misses, unless `refresh_on_miss` is False.
+    """
+    def __init__(self, root, refresh_on_miss=True):
+        self.root = os.fspath(root)
+        self.refresh_on_miss = refresh_on_miss
+        # key -> (shard name, start, end)
+        self._index_ = {}
+        self._idx_offsets_ = {}
+        self._files_ = {}
+        self.refresh()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_files_"] = {}
+        return state
+
+    def refresh(self):
+        """
+        Reads index rows appended since last call. Returns whether any was
+        found.
+        """
+        if not os.path.isdir(self.root):
+            return False
+
+        found = False
+        for filename in sorted(os.listdir(self.root)):
+            if not filename.endswith(".idx"):
+                continue
+            path = os.path.join(self.root, filename)
+            offset = self._idx_offsets_.get(filename, 0)
+            size = os.path.getsize(path) // _INDEX_DTYPE.itemsize * _INDEX_DTYPE.itemsize
+            if size <= offset:
+                continue
+
+            with open(path, "rb") as f:
+                f.seek(offset)
+                rows = np.frombuffer(f.read(size - offset), dtype=_INDEX_DTYPE)
+            shard_name = filename[:-len(".idx")]
+            for key, start, end in rows.tolist():
+                self._index_[key] = (shard_name, start, end)
+            self._idx_offsets_[filename] = size
+            found = True
+        return found
+
+    def _map_record_(self, shard_name, start, end):
+        f = self._files_.get(shard_name)
+        if f is None:
+            f = self._files_[shard_name] = open(os.path.join(self.root, shard_name + ".bin"), "rb")
+        map_start = start - start % mmap.ALLOCATIONGRANULARITY
+        buffer = mmap.mmap(f.fileno(), end - map_start, offset=map_start, access=mmap.ACCESS_COPY)
+        return np.frombuffer(buffer, dtype=np.uint8), start - map_start
+
+    def __getitem__(self, key):
+        location = self._index_.get(key)
+        if location is None and self.refresh_on_miss and self.refresh():
+            location = self._index_.get(key)
+        if location is None:
+            raise KeyError(key)
+
+        return decode_record(*self._map_record_(*location))
+
+    def __contains__(self, key):
+        return key in self._index_ or self.refresh_on_miss and self.refresh() and key in self._index_
+
+    def __iter__(self):
+        return iter(self._index_)
+
+    def __len__(self):
+        return len(self._index_)
@@ -0,0 +1,253 @@
+import os
+import pickle
+import collections.abc
+
+import numpy as np
+import torch
+
+__all__ = [
+    "SharedValue",
+    "SharedTensor",
+    "SharedArray",
+    "SharedList",
+    "SharedDict",
+    "SharedBlob",
+    "share",
+]
+
+
+class SharedValue:
+    """
+    A handle of some value living in shared memory. Handles can be passed to
+    subprocesses (e.g. DataLoader workers), which attach to the underlying
+    memory without copying it. Use `get()` to access the value.
+    """
+    def get(self):
+        raise NotImplementedError
+
+
+class SharedTensor(SharedValue):
+    def __init__(self, tensor: torch.Tensor):
+        self._tensor_ = tensor.share_memory_()
+
+    def get(self):
+        return self._tensor_
+
+
+class SharedArray(SharedValue):
+    def __init__(self, array: np.ndarray):
+        self._tensor_ = torch.from_numpy(np.ascontiguousarray(array)).share_memory_()
+
+    def get(self):
+        return self._tensor_.numpy()
+
+
+def _to_uint8_tensor(buffers):
+    if not buffers:
+        return torch.zeros(0, dtype=torch.uint8)
+    return torch.from_numpy(np.frombuffer(b"".join(buffers), dtype=np.uint8).copy())
+
+
+class SharedList(SharedValue, collections.abc.Sequence):
+    """
+    A read-only list stored as one flat buffer of pickled elements. Elements
+    are unpickled on access, so reading them never touches pages of other
+    processes.
+    """
+    def __init__(self, lst):
+        buffers = [pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL) for x in lst]
+        ends = np.cumsum([len(buffer) for buffer in buffers], dtype=np.int64)
+        self._ends_ = torch.from_numpy(ends).share_memory_()
+        self._blob_ = _to_uint8_tensor(buffers).share_memory_()
+        self._init_views_()
+
+    def _init_views_(self):
+        self._ends_view_ = self._ends_.numpy()
+        self._blob_view_ = memoryview(self._blob_.numpy())
+
+    def __getstate__(self):
+        return {"_ends_": self._ends_, "_blob_": self._blob_}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_views_()
+
+    def __len__(self):
+        return len(self._ends_view_)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("SharedList index out of range")
+
+        start = int(self._ends_view_[index - 1]) if index > 0 else 0
+        return pickle.loads(self._blob_view_[start:int(self._ends_view_[index])])
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(x == y for x, y in zip(self, other))
+
+    def __repr__(self):
+        return f"SharedList({list(self)!r})"
+
+    def get(self):
+        return self
+
+
+class SharedDict(SharedValue, collections.abc.Mapping):
+    """
+    A read-only dict whose keys are all `str` or all `int`. Keys are stored
+    sorted in flat buffers and values in a `SharedList`, so that a lookup
+    bisects the keys and unpickles only the value found. As with `SharedList`,
+    every lookup returns a fresh copy of the value.
+    """
+    def __init__(self, dct):
+        if all(type(key) is str for key in dct):
+            keys = sorted(dct)
+            self._str_keys_ = True
+            encoded = [key.encode("utf-8", "surrogatepass") for key in keys]
+            ends = np.cumsum([len(key) for key in encoded], dtype=np.int64)
+            self._keys_ = _to_uint8_tensor(encoded).share_memory_()
+            self._ends_ = torch.from_numpy(ends).share_memory_()
+        elif all(type(key) is int and -2**63 <= key < 2**63 for key in dct):
+            keys = sorted(dct)
+            self._str_keys_ = False
+            self._keys_ = torch.tensor(keys, dtype=torch.int64).share_memory_()
+            self._ends_ = None
+        else:
+            raise TypeError("SharedDict keys must be all str or all int64 int")
+        self._values_ = SharedList([dct[key] for key in keys])
+        self._init_views_()
+
+    def _init_views_(self):
+        if self._str_keys_:
+            self._keys_view_ = memoryview(self._keys_.numpy())
+            self._ends_view_ = self._ends_.numpy()
+        else:
+            self._keys_view_ = self._keys_.numpy()
+
+    def __getstate__(self):
+        return {
+            "_str_keys_": self._str_keys_,
+            "_keys_": self._keys_,
+            "_ends_": self._ends_,
+            "_values_": self._values_,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_views_()
+
+    def __len__(self):
+        return len(self._values_)
+
+    def _key_bytes_(self, index):
+        ends = self._ends_view_
+        start = int(ends[index - 1]) if index > 0 else 0
+        return bytes(self._keys_view_[start:int(ends[index])])
+
+    def _find_(self, key):
+        # Returns the index of `key`, or -1 if it is missing
+        if self._str_keys_:
+            if not isinstance(key, str):
+                return -1
+            encoded = key.encode("utf-8", "surrogatepass")
+            # UTF-8 preserves the order of code points, hence of sorted keys
+            lo, hi = 0, len(self)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._key_bytes_(mid) < encoded:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo if lo < len(self) and self._key_bytes_(lo) == encoded else -1
+
+        if not isinstance(key, (int, np.integer)) or not -2**63 <= key < 2**63:
+            return -1
+        keys = self._keys_view_
+        index = int(np.searchsorted(keys, key))
+        return index if index < len(keys) and keys[index] == key else -1
+
+    def __getitem__(self, key):
+        index = self._find_(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._values_[index]
+
+    def __contains__(self, key):
+        return self._find_(key) >= 0
+
+    def __iter__(self):
+        if not self._str_keys_:
+            return (int(key) for key in self._keys_view_)
+        return (
+            self._key_bytes_(i).decode("utf-8", "surrogatepass") for i in range(len(self))
+        )
+
+    def __repr__(self):
+        return f"SharedDict({dict(self)!r})"
+
+    def get(self, *args):
+        """
+        Returns the dict itself, or with arguments, looks a key up as
+        `dict.get()` does.
+        """
+        if not args:
+            return self
+        return collections.abc.Mapping.get(self, *args)
+
+
+class SharedBlob(SharedValue):
+    """
+    An arbitrary picklable value stored as a pickled buffer. Each process,
+    including the one creating it, unpickles it on first access, so that
+    forked processes never use objects unpickled by their parent. Each of
+    them therefore holds a full private copy of the value.
+    """
+    def __init__(self, value):
+        buffer = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._blob_ = _to_uint8_tensor([buffer]).share_memory_()
+        # (pid, value) of the process which unpickled it
+        self._value_ = None
+
+    def __getstate__(self):
+        return {"_blob_": self._blob_}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._value_ = None
+
+    def get(self):
+        pid = os.getpid()
+        if self._value_ is None or self._value_[0] != pid:
+            self._value_ = (pid, pickle.loads(memoryview(self._blob_.numpy())))
+        return self._value_[1]
+
+
+def share(value) -> SharedValue:
+    """
+    Moves `value` into shared memory. Tensors are shared in place, NumPy
+    arrays of plain dtypes are copied into a shared tensor, lists and tuples
+    become a read-only `SharedList` and dicts a read-only `SharedDict`, which
+    are returned by `get()` in place of the original. Other values are pickled
+    into a `SharedBlob`. Raises `TypeError` for dicts whose keys are not all
+    `str` or all `int`, which are better left unshared than copied into every
+    process by a `SharedBlob`.
+    """
+    if isinstance(value, SharedValue):
+        return value
+    if isinstance(value, torch.Tensor):
+        return SharedTensor(value)
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        return SharedArray(value)
+    if isinstance(value, (list, tuple)):
+        return SharedList(value)
+    if isinstance(value, dict):
+        return SharedDict(value)
+    return SharedBlob(value)
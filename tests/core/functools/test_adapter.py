@@ -56,3 +56,69 @@ class Test_adapt_spec(unittest.TestCase):
             f(1, 2, 3, 4, 5, 6),
             (1, 3, 4, 5, 6),
         )
+
+
+class Test_adapter_code_cache(unittest.TestCase):
+    def test_shared_code(self):
+        def f1(a, b):
+            return ("f1", a, b)
+
+        def f2(x, y):
+            return ("f2", x, y)
+
+        g1 = functools.adapt(["i"], f1, args=["i.0", "i.1"])
+        g2 = functools.adapt(["i"], f2, args=["i.0", "i.1"])
+
+        self.assertIs(g1.__code__, g2.__code__)
+        self.assertEqual(g1([1, 2]), ("f1", 1, 2))
+        self.assertEqual(g2([1, 2]), ("f2", 1, 2))
+        self.assertEqual(g1.__name__, "f1")
+        self.assertEqual(g2.__name__, "f2")
+
+    def test_distinct_mapping(self):
+        def f(a, b):
+            return (a, b)
+
+        g1 = functools.adapt(["i"], f, args=["i.0", "i.1"])
+        g2 = functools.adapt(["i"], f, args=[["i.0"], "i.1"])
+        g3 = functools.adapt(["i"], f, args=[("i.0", ), "i.1"])
+
+        self.assertIsNot(g1.__code__, g2.__code__)
+        self.assertIsNot(g2.__code__, g3.__code__)
+        self.assertEqual(g2([1, 2]), ([1], 2))
+        self.assertEqual(g3([1, 2]), ((1, ), 2))
+
+    def test_bad_accessor_not_cached(self):
+        def f(a):
+            return a
+
+        for _ in range(2):
+            with self.assertRaises(AssertionError):
+                functools.adapt(["i"], f, args=["i..0"])
+
+
+class Test_adapt_spec_identity(unittest.TestCase):
+    def test_identity(self):
+        def f(a, b, c):
+            return a, b, c
+
+        g = functools.adapt_spec(["a", "b?", ...], f, keep_meta=True)
+        self.assertIs(g.__code__, f.__code__)
+        self.assertTrue(g.__is_adapter__)
+        self.assertFalse(hasattr(f, "__is_adapter__"))
+        self.assertEqual(g.__remaining__, ["c"])
+        self.assertEqual(g.__adapter_mapping_spec__, ["a", "b", "_0"])
+        self.assertEqual(g(1, 2, 3), (1, 2, 3))
+
+    def test_not_identity(self):
+        def f(aa, c):
+            return aa, c
+
+        self.assertIsNot(functools.adapt_spec(["a | aa", "c"], f), f)
+        self.assertIsNot(functools.adapt_spec(["a?", "aa", "c"], f), f)
+
+        def f(a, c=None, *, d):
+            return a, c, d
+
+        with self.assertRaises(TypeError):
+            functools.adapt_spec(["a", "c"], f)
@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from nagisa.core.functools import hof
+
+
+class Test_code_cache(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._previous = hof.set_code_cache_dir(self._tmpdir.name)
+
+    def tearDown(self):
+        hof.set_code_cache_dir(self._previous)
+        self._tmpdir.cleanup()
+
+    def _make(self):
+        return hof.make_function(
+            "add",
+            """
+            def add(a, b):
+                return a + b
+            """,
+        )
+
+    def test_persisted(self):
+        self.assertEqual(self._make()(1, 2), 3)
+        self.assertEqual(len(os.listdir(self._tmpdir.name)), 1)
+
+        with mock.patch.object(hof, "compile", create=True, side_effect=AssertionError):
+            self.assertEqual(self._make()(3, 4), 7)
+
+    def test_corrupted_entry(self):
+        self._make()
+        (filename, ) = os.listdir(self._tmpdir.name)
+        with open(os.path.join(self._tmpdir.name, filename), "wb") as f:
+            f.write(b"garbage")
+
+        self.assertEqual(self._make()(1, 2), 3)
+
+    def test_disabled(self):
+        hof.set_code_cache_dir(None)
+        self.assertEqual(self._make()(1, 2), 3)
+        self.assertEqual(os.listdir(self._tmpdir.name), [])
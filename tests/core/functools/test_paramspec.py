@@ -113,3 +113,29 @@ class Test_match_spec(unittest.TestCase):
             f = _make_function(params)
             with self.subTest(params=params, spec=spec):
                 self.assertRaises(RuntimeError, functools.match_spec, spec, f)
+
+    def test_cached_result_isolated(self):
+        f = _make_function(["a", "b", "c"])
+        result = functools.match_spec(["a", ...], f)
+        result.remaining.append("x")
+        result.adapter_signature.clear()
+
+        self.assertEqual(
+            functools.match_spec(["a", ...], f),
+            (["b", "c"], ["a", "_0", "_1"], ["a", "_0", "_1"]),
+        )
+
+    def test_wrapped_signature(self):
+        f = _make_function(["a", "b"])
+
+        def wrapper(x):
+            pass
+
+        wrapper.__wrapped__ = f
+        self.assertEqual(functools.match_spec(["a", "b"], wrapper), ([], ["a", "b"], ["a", "b"]))
+
+        def wrapper(*args):
+            pass
+
+        with self.assertRaises(TypeError):
+            functools.match_spec(["a", "b"], wrapper)
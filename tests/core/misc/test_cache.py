@@ -0,0 +1,352 @@
+import os
+import time
+import copy
+import tempfile
+import threading
+import unittest
+import concurrent.futures
+
+import numpy as np
+import torch
+
+from nagisa.core.misc import cache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEviction(unittest.TestCase):
+    def test_unbounded(self):
+        c = cache.Cache()
+        for i in range(100):
+            c.set(i, i)
+        self.assertEqual(len(c), 100)
+
+    def test_lru(self):
+        c = cache.Cache("lru", max_entries=2)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")
+        c.set("c", 3)
+
+        self.assertTrue(c.has("a"))
+        self.assertFalse(c.has("b"))
+        self.assertTrue(c.has("c"))
+
+    def test_lfu(self):
+        c = cache.Cache("lfu", max_entries=2)
+        c.set("a", 1)
+        c.get("a")
+        c.get("a")
+        c.set("b", 2)
+        c.get("b")
+        c.set("c", 3)
+
+        self.assertTrue(c.has("a"))
+        self.assertFalse(c.has("b"))
+        self.assertTrue(c.has("c"))
+
+        c.set("d", 4)
+        self.assertTrue(c.has("a"))
+        self.assertFalse(c.has("c"))
+        self.assertTrue(c.has("d"))
+
+    def test_ttl(self):
+        clock = _Clock()
+        c = cache.Cache(cache.TTLPolicy(ttl=10, clock=clock))
+        c.set("a", 1)
+        clock.now = 5
+        c.set("b", 2)
+        self.assertEqual(c.get("a"), 1)
+
+        clock.now = 11
+        self.assertIs(c.get("a"), cache.Cache.Empty)
+        self.assertEqual(c.get("b"), 2)
+
+        clock.now = 20
+        c.set("c", 3)
+        self.assertEqual(len(c), 1)
+
+    def test_max_bytes(self):
+        c = cache.Cache(max_bytes=10, size_of=len)
+        c.set("a", b"1234")
+        c.set("b", b"1234")
+        self.assertEqual(c.nbytes, 8)
+        c.set("c", b"1234")
+        self.assertEqual(c.nbytes, 8)
+        self.assertFalse(c.has("a"))
+
+        c.set("b", b"12345678")
+        self.assertEqual(c.nbytes, 8)
+        self.assertEqual(len(c), 1)
+
+        c.set("d", b"12345678901")
+        self.assertEqual(c.nbytes, 0)
+        self.assertEqual(len(c), 0)
+
+    def test_bad_policy(self):
+        with self.assertRaises(ValueError):
+            cache.Cache("bad")
+
+
+class TestScopedCache(unittest.TestCase):
+    def test_scope_with_eviction(self):
+        c = cache.ScopedCache(max_entries=2)
+        c.set("global", 0)
+        with c.new_scope():
+            for i in range(4):
+                c.set(("local", i), i, scope=cache.Scope.LOCAL)
+            self.assertEqual(len(c), 3)
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.get("global"), 0)
+
+    def test_global_keys_not_evicted(self):
+        c = cache.ScopedCache(max_entries=1, max_bytes=100, size_of=lambda value: value)
+        c.set("large", 1000)
+        c.set("small", 1)
+        with c.new_scope():
+            c.set("local1", 50, scope=cache.Scope.LOCAL)
+            c.set("local2", 60, scope=cache.Scope.LOCAL)
+            self.assertFalse(c.has("local1"))
+            self.assertEqual(c.get("local2"), 60)
+            c.set("local3", 200, scope=cache.Scope.LOCAL)
+            self.assertFalse(c.has("local3"))
+        self.assertEqual((c.get("large"), c.get("small")), (1000, 1))
+        self.assertEqual(c.nbytes, 1001)
+
+        # Keys moving between scopes are budgeted accordingly
+        c.set("large", 1000, scope=cache.Scope.LOCAL)
+        self.assertFalse(c.has("large"))
+        c.delete("small")
+        self.assertEqual((len(c), c.nbytes), (0, 0))
+
+    def test_evicted_keys_leave_scope(self):
+        c = cache.ScopedCache(max_entries=2)
+        with c.new_scope():
+            for i in range(100):
+                c.set(("local", i), i, scope=cache.Scope.LOCAL)
+            self.assertEqual(list(c._key_stack_()[-1]), [("local", 98), ("local", 99)])
+
+            with c.new_scope():
+                for key in ["a", "b", "c"]:
+                    c.set(key, 1, scope=cache.Scope.LOCAL)
+                # `a` was evicted, then inserted again as a GLOBAL entry
+                c.set("a", 4)
+            self.assertEqual(c.get("a"), 4)
+        self.assertEqual(c.get("a"), 4)
+        self.assertEqual(list(c._key_stack_()[0]), ["a"])
+
+    def test_scope_released_on_error(self):
+        c = cache.ScopedCache()
+        with self.assertRaises(KeyError):
+            with c.new_scope():
+                c.set("local", 0, scope=cache.Scope.LOCAL)
+                raise KeyError("local")
+        self.assertEqual(len(c._key_stack_()), 1)
+        self.assertFalse(c.has("local"))
+
+        with c.new_scope():
+            c.set("local", 1, scope=cache.Scope.LOCAL)
+        self.assertFalse(c.has("local"))
+
+    def test_retain(self):
+        c = cache.ScopedCache(retain={"max_entries": 2})
+        for i in range(4):
+            with c.new_scope():
+                c.set(("local", i), i, scope=cache.Scope.LOCAL)
+        self.assertEqual(len(c), 0)
+        self.assertEqual(len(c.retained), 2)
+        self.assertIs(c.get(("local", 0)), c.Empty)
+        self.assertEqual(c.get(("local", 2)), 2)
+        self.assertTrue(c.has(("local", 3)))
+
+        c.set(("local", 2), -1)
+        self.assertEqual(len(c.retained), 1)
+        self.assertEqual(c.get(("local", 2)), -1)
+        self.assertTrue(c.delete(("local", 3)))
+        self.assertEqual(len(c.retained), 0)
+
+
+class TestConcurrentScopedCache(unittest.TestCase):
+    def test_thread_local_scopes(self):
+        c = cache.ConcurrentScopedCache()
+        in_scope = threading.Barrier(2)
+        scope_closed = threading.Event()
+        results = {}
+
+        def worker1():
+            with c.new_scope():
+                c.set("a", 1, scope=cache.Scope.LOCAL)
+                c.set("g", 1)
+                in_scope.wait()
+            scope_closed.set()
+
+        def worker2():
+            with c.new_scope():
+                c.set("b", 2, scope=cache.Scope.LOCAL)
+                in_scope.wait()
+                scope_closed.wait()
+                results["a"] = c.get("a")
+                results["b"] = c.get("b")
+
+        threads = [threading.Thread(target=worker1), threading.Thread(target=worker2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIs(results["a"], c.Empty)
+        self.assertEqual(results["b"], 2)
+        self.assertFalse(c.has("b"))
+        self.assertEqual(c.get("g"), 1)
+
+    def test_single_flight(self):
+        c = cache.ConcurrentScopedCache()
+        calls = 0
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            nonlocal calls
+            calls += 1
+            started.set()
+            release.wait()
+            return "value"
+
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            first = executor.submit(c.get_or_compute, "k", compute)
+            started.wait()
+            others = [executor.submit(c.get_or_compute, "k", compute) for _ in range(3)]
+            release.set()
+            results = [future.result() for future in [first] + others]
+
+        self.assertEqual(results, ["value"] * 4)
+        self.assertEqual(calls, 1)
+
+    def test_single_flight_error(self):
+        c = cache.ConcurrentScopedCache()
+
+        def compute():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            c.get_or_compute("k", compute)
+        self.assertFalse(c.has("k"))
+        self.assertEqual(c.get_or_compute("k", lambda: 1), 1)
+
+
+class TestCacheStats(unittest.TestCase):
+    def test_counters(self):
+        c = cache.Cache(max_entries=2, stats=True, size_of=lambda v: v)
+        c.set(("a", 1), 10)
+        c.set(("a", 2), 20)
+        c.set(("b", 1), 30)
+        c.get(("a", 1))
+        c.get(("a", 2))
+        c.get(["b", 1])
+        c.delete(("b", 1))
+
+        self.assertDictEqual(
+            c.stats.as_dict(),
+            {
+                "a": dict(hits=1, misses=1, evictions=1, nbytes=20, compute_time=0.0),
+                "b": dict(hits=1, misses=0, evictions=0, nbytes=0, compute_time=0.0),
+            },
+        )
+        self.assertEqual(c.stats.totals()["hits"], 2)
+
+    def test_disabled(self):
+        c = cache.Cache()
+        c.set("a", 1)
+        self.assertIsNone(c.stats)
+        self.assertEqual(c.nbytes, 0)
+
+    def test_get_or_compute(self):
+        stats = cache.CacheStats(prefix_index=1)
+        c = cache.ScopedCache(stats=stats, size_of=lambda v: 1)
+        times = 0
+
+        def compute():
+            nonlocal times
+            times += 1
+            time.sleep(0.01)
+            return times
+
+        with c.new_scope():
+            self.assertEqual(c.get_or_compute(("r", "x", 1), compute, scope=cache.Scope.LOCAL), 1)
+            self.assertEqual(c.get_or_compute(("r", "x", 1), compute, scope=cache.Scope.LOCAL), 1)
+        self.assertEqual(len(c), 0)
+
+        record = stats.as_dict()["x"]
+        self.assertEqual((record["hits"], record["misses"], record["nbytes"]), (1, 1, 0))
+        self.assertGreaterEqual(record["compute_time"], 0.01)
+
+    def test_merge(self):
+        stats1, stats2 = cache.CacheStats(), cache.CacheStats()
+        stats1.record_hit("a")
+        stats2.record_hit("a")
+        stats2.record_miss("b")
+        merged = cache.CacheStats.merge(*copy.deepcopy([stats1, stats2]))
+        self.assertEqual(merged.as_dict()["a"]["hits"], 2)
+        self.assertEqual(merged.as_dict()["b"]["misses"], 1)
+        self.assertEqual(stats1.as_dict()["a"]["hits"], 1)
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_pickle(self):
+        c = cache.DiskCache(self.root)
+        self.assertIs(c.get("a"), c.Empty)
+        self.assertFalse(c.has("a"))
+        c.set("a", {"x": [1, 2]})
+        self.assertTrue(c.has("a"))
+        self.assertEqual(cache.DiskCache(self.root).get("a"), {"x": [1, 2]})
+
+    def test_array(self):
+        c = cache.DiskCache(self.root)
+        c.set(("arr", 1), np.arange(6).reshape(2, 3))
+        loaded = cache.DiskCache(self.root).get(("arr", 1))
+        self.assertIsInstance(loaded, np.memmap)
+        np.testing.assert_array_equal(loaded, np.arange(6).reshape(2, 3))
+
+        # Loaded arrays are copy-on-write
+        loaded[0, 0] = 100
+        np.testing.assert_array_equal(c.get(("arr", 1)), np.arange(6).reshape(2, 3))
+
+    def test_tensor(self):
+        c = cache.DiskCache(self.root)
+        c.set("t", torch.ones(2, 2))
+        loaded = c.get("t")
+        self.assertIsInstance(loaded, torch.Tensor)
+        self.assertTrue(torch.equal(loaded, torch.ones(2, 2)))
+
+    def test_content_addressed(self):
+        c = cache.DiskCache(self.root)
+        c.set("a", np.zeros(4))
+        c.set("b", np.zeros(4))
+        c.set(["c"], [1])
+        self.assertEqual(len(c), 3)
+        self.assertEqual(len(os.listdir(os.path.join(self.root, "objects"))), 2)
+        self.assertEqual(c.get(("c", )), [1])
+
+    def test_delete_and_clear(self):
+        c = cache.DiskCache(self.root)
+        c.set("a", 1)
+        c.set("b", 2)
+        self.assertTrue(c.delete("a"))
+        self.assertFalse(c.delete("a"))
+        self.assertIs(c.get("a"), c.Empty)
+        c.clear()
+        self.assertEqual(len(c), 0)
+        self.assertIs(c.get("b"), c.Empty)
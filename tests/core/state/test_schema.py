@@ -599,6 +599,35 @@ class TestListValue(unittest.TestCase):
         self.assertRaises(TypeError, cfg.lst.extend, ["foo"])
 
 
+class TestFingerprint(unittest.TestCase):
+    def test_changes_on_update(self):
+        @schema.SchemaNode.from_class
+        class Config:
+            a: int = 1
+            lst: [[int], 'w'] = [0]
+
+            class sub:
+                b: str = "foo"
+
+        cfg = Config().freeze()
+        fingerprints = [cfg._fingerprint_()]
+
+        cfg.lst.append(1)
+        fingerprints.append(cfg._fingerprint_())
+        cfg.lst = [2]
+        fingerprints.append(cfg._fingerprint_())
+
+        cfg = Config()
+        fingerprints.append(cfg._fingerprint_())
+        cfg.sub.b = "bar"
+        fingerprints.append(cfg._fingerprint_())
+        cfg.merge_from_dict({"a": 2})
+        fingerprints.append(cfg._fingerprint_())
+
+        self.assertEqual(len(set(fingerprints)), len(fingerprints))
+        self.assertEqual(cfg._fingerprint_(), cfg._fingerprint_())
+
+
 class TestSingleton(unittest.TestCase):
     def test_singleton_True(self):
         @schema.SchemaNode.from_class(singleton=True)
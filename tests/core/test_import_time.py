@@ -0,0 +1,53 @@
+import re
+import sys
+import unittest
+import subprocess
+
+# Cumulative import time budget of config tooling, in microseconds
+IMPORT_TIME_BUDGET = 1_000_000
+
+_importtime_pattern = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+
+def _importtime(statement):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stderr
+
+    # Maps module name to (cumulative time, nesting level)
+    result = {}
+    for line in stderr.splitlines():
+        matched = _importtime_pattern.match(line)
+        if matched is not None:
+            result[matched.group(4)] = (int(matched.group(2)), len(matched.group(3)))
+    return result
+
+
+class TestImportTime(unittest.TestCase):
+    def test_core_without_torch(self):
+        modules = _importtime(
+            "import nagisa.core.state.config, nagisa.core.state.envvar, "
+            "nagisa.core.misc.io, nagisa.core.misc.serialization"
+        )
+
+        self.assertIn("nagisa.core.state.config", modules)
+        self.assertNotIn("torch", modules)
+        top_level = min(level for _, level in modules.values())
+        self.assertLess(
+            sum(t for k, (t, level) in modules.items() if level == top_level and "nagisa" in k),
+            IMPORT_TIME_BUDGET,
+        )
+
+    def test_lazy_submodules(self):
+        modules = _importtime("import nagisa.core")
+        self.assertNotIn("nagisa.core.state", modules)
+        self.assertNotIn("nagisa.core.misc", modules)
+
+        import nagisa.core
+        self.assertEqual(nagisa.core.state.config.ConfigNode.__module__, "nagisa.core.state.config")
+        with self.assertRaises(AttributeError):
+            nagisa.core.nonexistent  # pylint: disable=pointless-statement
@@ -0,0 +1,140 @@
+import asyncio
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class BaseTestCase(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+        ['DataResolver', 'nagisa.dl.torch.data._data_resolver:DataResolver'],
+        ['AsyncDataResolver', 'nagisa.dl.torch.data._async_data_resolver:AsyncDataResolver'],
+    ]
+
+
+class TestAsyncDataResolver(BaseTestCase):
+    def test_concurrent_deps(self):
+        # Each resource waits for the other one to start, which would never
+        # finish if dependencies were awaited one after another
+        a_started, b_started = asyncio.Event(), asyncio.Event()
+
+        @self.data_module.Resource.r
+        async def res_a(id):
+            a_started.set()
+            await asyncio.wait_for(b_started.wait(), 1)
+            return "a"
+
+        @self.data_module.Resource.r
+        async def res_b(id):
+            b_started.set()
+            await asyncio.wait_for(a_started.wait(), 1)
+            return "b"
+
+        @self.data_module.Item.r
+        def item1(id, res_a, res_b):
+            return res_a + res_b + str(id)
+
+        resolver = self.AsyncDataResolver(None, None)
+        self.assertEqual(resolver.get_item(1, "item1"), "ab1")
+
+    def test_single_flight(self):
+        times = 0
+
+        @self.data_module.Resource.r
+        async def res1():
+            nonlocal times
+            times += 1
+            await asyncio.sleep(0.01)
+            return 1
+
+        @self.data_module.Resource.r
+        async def res2(id, res1):
+            return id + res1
+
+        @self.data_module.Item.r
+        async def item1(id, res1, res2):
+            return res1 + res2
+
+        resolver = self.AsyncDataResolver(None, None)
+        self.assertEqual(resolver.get_items(range(4), "item1"), [2, 3, 4, 5])
+        self.assertEqual(times, 1)
+
+    def test_batched(self):
+        batches = []
+
+        @self.data_module.Resource.r
+        async def rows(ids):
+            batches.append(list(ids))
+            return [id * 10 for id in ids]
+
+        @self.data_module.Item.r
+        def item1(id, rows):
+            return rows
+
+        @self.data_module.Item.r
+        async def item2(ids, rows):
+            return [row + 1 for row in rows]
+
+        resolver = self.AsyncDataResolver(None, None)
+        self.assertEqual(
+            resolver.get_items_dict([1, 2], ["item1", "item2"]),
+            {
+                "item1": [10, 20],
+                "item2": [11, 21]
+            },
+        )
+        self.assertEqual(sum(batches, []).count(1), 1)
+
+    def test_id_list_and_scope(self):
+        times = 0
+
+        @self.data_module.Resource.r
+        async def id_list():
+            return list(range(3))
+
+        @self.data_module.Resource.r
+        async def res1(id):
+            nonlocal times
+            times += 1
+
+        @self.data_module.Item.r
+        def item1(id, res1):
+            pass
+
+        resolver = self.AsyncDataResolver(None, None)
+        self.assertEqual(resolver.get_id_list(), [0, 1, 2])
+        for _ in range(2):
+            with resolver.new_scope():
+                resolver.get_item(1, "item1")
+        self.assertEqual(times, 2)
+
+    def test_sync_resolver(self):
+        @self.data_module.Resource.r
+        async def res1(id):
+            return id
+
+        @self.data_module.Item.r
+        async def item1(id, res1):
+            return res1 * 2
+
+        self.assertEqual(self.DataResolver(None, None).get_items([1, 2], "item1"), [2, 4])
+
+    def test_dataset(self):
+        s = self.data_module
+
+        @s.Resource.r
+        async def id_list():
+            return list(range(4))
+
+        @s.Item.r
+        async def item1(id):
+            return id + 1
+
+        s.item_keys.set(["item1"])
+        s.resolve_async.set(True)
+        ds = s.get_dataset("", "", cfg="mock")
+        self.assertIsInstance(ds._data_resolver_, self.AsyncDataResolver)
+        self.assertEqual(list(ds), [{"item1": i + 1} for i in range(4)])
+        self.assertEqual(ds[[0, 3]], [{"item1": 1}, {"item1": 4}])
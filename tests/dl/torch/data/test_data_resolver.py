@@ -1,4 +1,7 @@
+import tempfile
+import threading
 import unittest
+import concurrent.futures
 
 from nagisa.core.misc.testing import ReloadModuleTestCase
 
@@ -220,6 +223,340 @@ class TestCache(BaseTestCase):
 
         self.assertEqual(times, 2)
 
+    def test_bounded_cache(self):
+        times = 0
+
+        @self.data_module.Resource.r
+        def res1(id):
+            nonlocal times
+            times += 1
+
+        @self.data_module.Item.r
+        def item1(id, res1):
+            pass
+
+        resolver = self.DataResolver(None, None, {"policy": "lru", "max_entries": 2})
+        for id in [1, 2, 1, 3, 1, 2]:
+            resolver.get_item(id, "item1")
+        self.assertEqual(times, 4)
+
+    def test_stats(self):
+        @self.data_module.Resource.r
+        def res1():
+            return 1
+
+        @self.data_module.Resource.r
+        def res2(id, res1):
+            return id
+
+        @self.data_module.Item.r
+        def item1(id, res2):
+            pass
+
+        resolver = self.DataResolver(None, None, {"stats": True})
+        for id in [1, 2, 1]:
+            resolver.get_item(id, "item1")
+
+        stats = resolver.cache_stats().as_dict()
+        self.assertEqual(set(stats), {"res1", "res2"})
+        self.assertEqual((stats["res1"]["hits"], stats["res1"]["misses"]), (1, 1))
+        self.assertEqual((stats["res2"]["hits"], stats["res2"]["misses"]), (1, 2))
+        self.assertIsNone(self.DataResolver(None, None).cache_stats())
+
+    def test_stats_compute_time(self):
+        import time
+
+        @self.data_module.Resource.r
+        def res1():
+            time.sleep(0.05)
+            return 1
+
+        @self.data_module.Resource.r
+        def res2(id, res1):
+            return id
+
+        @self.data_module.Item.r
+        def item1(id, res2):
+            pass
+
+        for cache_options in ({"stats": True}, {"stats": True, "concurrent": True}):
+            resolver = self.DataResolver(None, None, cache_options)
+            resolver.get_item(1, "item1")
+            stats = resolver.cache_stats().as_dict()
+            self.assertGreaterEqual(stats["res1"]["compute_time"], 0.05)
+            # Time spent in dependencies is only recorded for them
+            self.assertLess(stats["res2"]["compute_time"], 0.05)
+
+    def test_concurrent(self):
+        times = 0
+
+        @self.data_module.Resource.r
+        def res1():
+            nonlocal times
+            times += 1
+            return 1
+
+        @self.data_module.Resource.r
+        def res2(id, res1):
+            return id + res1
+
+        @self.data_module.Item.r
+        def item1(id, res2):
+            return res2
+
+        resolver = self.DataResolver(None, None, {"concurrent": True})
+
+        def get(id):
+            with resolver.new_scope():
+                return resolver.get_item(id, "item1")
+
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            self.assertEqual(list(executor.map(get, range(100))), list(range(1, 101)))
+        self.assertEqual(times, 1)
+
+    def test_share_global_resources(self):
+        import numpy as np
+        from nagisa.dl.torch.misc.sharing import SharedValue
+
+        @self.data_module.Resource.r
+        def id_list():
+            return list(range(3))
+
+        @self.data_module.Resource.r
+        def table():
+            return np.arange(3) * 2
+
+        @self.data_module.Resource.r
+        def res1(id, table):
+            return table[id]
+
+        @self.data_module.Resource.r
+        def unpicklable():
+            return lambda: None
+
+        @self.data_module.Item.r
+        def item1(id, res1):
+            return res1
+
+        resolver = self.DataResolver(None, None)
+        resolver.share_global_resources()
+        cache = resolver.__cache__
+        self.assertIsInstance(cache.get(("resource", "table")), SharedValue)
+        self.assertIsInstance(cache.get(("resource", "id_list")), SharedValue)
+        self.assertNotIsInstance(cache.get(("resource", "unpicklable")), SharedValue)
+        self.assertFalse(cache.has(("resource", "res1", None)))
+
+        self.assertEqual(resolver.get_id_list(), [0, 1, 2])
+        self.assertEqual([resolver.get_item(id, "item1") for id in range(3)], [0, 2, 4])
+
+
+class TestGetItems(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.batches = []
+
+        @self.data_module.Resource.r
+        def offset():
+            return 100
+
+        @self.data_module.Resource.r
+        def rows(ids, offset):
+            self.batches.append(list(ids))
+            return [id + offset for id in ids]
+
+        @self.data_module.Resource.r
+        def name(id):
+            return f"name{id}"
+
+        @self.data_module.Item.r
+        def batched_item(ids, rows, name):
+            return list(zip(rows, name))
+
+        @self.data_module.Item.r
+        def single_item(id, rows):
+            return rows
+
+    def test_batched(self):
+        resolver = self.DataResolver(None, None)
+        self.assertEqual(
+            resolver.get_items([1, 2], "batched_item"),
+            [(101, "name1"), (102, "name2")],
+        )
+        self.assertEqual(self.batches, [[1, 2]])
+
+        # Cached values are reused and only missing ids are computed
+        self.assertEqual(resolver.get_items([2, 3], "batched_item")[1], (103, "name3"))
+        self.assertEqual(self.batches, [[1, 2], [3]])
+
+    def test_fallback(self):
+        resolver = self.DataResolver(None, None)
+        self.assertEqual(resolver.get_items([1, 2], "single_item"), [101, 102])
+        self.assertEqual(self.batches, [[1], [2]])
+
+        self.assertEqual(resolver.get_item(4, "batched_item"), (104, "name4"))
+        self.assertEqual(self.batches, [[1], [2], [4]])
+
+
+class TestPlan(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.times = {}
+
+        def _count(name):
+            self.times[name] = self.times.get(name, 0) + 1
+
+        @self.data_module.Resource.r
+        def root():
+            _count("root")
+            return 10
+
+        @self.data_module.Resource.r
+        def res1(id, root):
+            _count("res1")
+            return id + root
+
+        @self.data_module.Resource.r
+        def res2(id, res1):
+            _count("res2")
+            return res1 * 2
+
+        @self.data_module.Item.r
+        def item1(id, res1, res2):
+            return (res1, res2)
+
+    def test_compiled_once(self):
+        resolver = self.DataResolver(None, None)
+        self.assertEqual(resolver.get_item(1, "item1"), (11, 22))
+        self.assertEqual(len(resolver._plans_), 1)
+        plan = next(iter(resolver._plans_.values()))
+        self.assertEqual([step.res_key for step in plan.steps], ["root", "res1", "res2"])
+        self.assertEqual([step.level for step in plan.steps], [0, 1, 2])
+
+        resolver.get_item(2, "item1")
+        self.assertEqual(len(resolver._plans_), 1)
+        self.assertEqual(self.times, {"root": 1, "res1": 2, "res2": 2})
+
+        @self.data_module.Item.r
+        def item2(id, root):
+            return root
+
+        resolver.get_item(2, "item2")
+        self.assertEqual(len(resolver._plans_), 2)
+
+    def test_lazy_dependencies(self):
+        resolver = self.DataResolver(None, None)
+        resolver.get_item(1, "item1")
+        resolver.__cache__.delete(("resource", "root"))
+        self.assertEqual(resolver.get_item(1, "item1"), (11, 22))
+        self.assertEqual(self.times["root"], 1)
+
+        resolver.__cache__.delete(("resource", "res1", 1))
+        resolver.__cache__.delete(("resource", "res2", 1))
+        self.assertEqual(resolver.get_item(1, "item1"), (11, 22))
+        self.assertEqual(self.times, {"root": 2, "res1": 2, "res2": 2})
+
+    def test_same_as_recursive(self):
+        results = []
+        for use_plans in (True, False):
+            resolver = self.DataResolver(None, None)
+            resolver.use_plans = use_plans
+            with resolver.new_scope():
+                results.append([resolver.get_item(id, "item1") for id in range(5)])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(self.times["res2"], 10)
+
+    def test_threads(self):
+        barrier = threading.Barrier(2, timeout=1)
+
+        @self.data_module.Resource.r
+        def branch1(id):
+            barrier.wait()
+            return 1
+
+        @self.data_module.Resource.r
+        def branch2(id):
+            barrier.wait()
+            return 2
+
+        @self.data_module.Item.r
+        def item3(id, branch1, branch2):
+            return branch1 + branch2
+
+        resolver = self.DataResolver(None, None, plan_threads=2)
+        for id in range(3):
+            with resolver.new_scope():
+                self.assertEqual(resolver.get_item(id, "item3"), 3)
+
+
+class TestPersist(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+
+    def _register(self, version):
+        times = []
+
+        @self.data_module.Resource.r
+        @self.data_module.Resource.persist(version)
+        def res1(meta):
+            times.append(1)
+            return [meta]
+
+        @self.data_module.Resource.r
+        def res2():
+            times.append(2)
+
+        @self.data_module.Item.r
+        def item1(res1, res2):
+            return res1
+
+        return times
+
+    def _resolver(self, meta=1, cfg=None):
+        return self.DataResolver(cfg, meta, persist_dir=self._tmpdir.name)
+
+    def test_persist(self):
+        times = self._register("v1")
+        self.assertEqual(self._resolver().get_item(0, "item1"), [1])
+        self.assertEqual(self._resolver().get_item(0, "item1"), [1])
+        self.assertEqual(times, [1, 2, 2])
+
+    def test_version_and_meta(self):
+        times = self._register("v1")
+        self._resolver().get_item(0, "item1")
+        self.assertEqual(self._resolver(meta=2).get_item(0, "item1"), [2])
+        self.assertEqual(times, [1, 2, 1, 2])
+
+        self.data_module.Resource._mapping_.clear()
+        self.data_module.Item._mapping_.clear()
+        times = self._register("v2")
+        self._resolver().get_item(0, "item1")
+        self.assertEqual(times, [1, 2])
+
+    def test_cfg(self):
+        from nagisa.core.state.config import ConfigNode
+
+        @ConfigNode.from_class
+        class Config:
+            root: str = "/data/a"
+
+        times = self._register("v1")
+        cfg = Config()
+        self._resolver(cfg=cfg).get_item(0, "item1")
+        self._resolver(cfg=Config()).get_item(0, "item1")
+        self.assertEqual(times, [1, 2, 2])
+
+        cfg.root = "/data/b"
+        self._resolver(cfg=cfg).get_item(0, "item1")
+        self.assertEqual(times, [1, 2, 2, 1, 2])
+
+    def test_no_persist_dir(self):
+        times = self._register("v1")
+        self.DataResolver(None, 1).get_item(0, "item1")
+        self.DataResolver(None, 1).get_item(0, "item1")
+        self.assertEqual(times, [1, 2, 1, 2])
+
 
 class TestGetIdList(BaseTestCase):
     def test_basic(self):
@@ -1,3 +1,5 @@
+import gc
+
 import torch
 
 from nagisa.core.misc.testing import ReloadModuleTestCase
@@ -89,3 +91,145 @@ class TestDataLoader(BaseDatasetTestCase):
             list(self.dataset.as_loader(batch_size=4)),
             expected,
         )
+
+    def test_batched(self):
+        s = self.data_module
+
+        expected = list(s.DataLoader("mock", self.dataset, batch_size=8))
+        loader = s.DataLoader("mock", self.dataset, batched=True, batch_size=8)
+        self.assertListEqual(list(loader), expected)
+
+        loader = s.DataLoader("mock", self.dataset, batched=True, batch_size=8, drop_last=True)
+        self.assertEqual(len(list(loader)), 12)
+
+
+class TestBatchTransform(BaseDatasetTestCase):
+    def setUp(self):
+        super().setUp()
+        s = self.data_module
+
+        class Scale(s.BaseBatchTransform):
+            class _kwargs_schema_:
+                factor: int = 1
+
+            def _t_item1_(self, batch, _):
+                return batch * self.kwargs.factor
+
+        s.batch_trans_seq.set(["scale"])
+        s.batch_trans_kwargs.set({"scale": {"factor": 10}})
+
+    def test_registry(self):
+        from nagisa.dl.torch.data._registries import Transform, BatchTransform
+
+        self.assertIn("scale", BatchTransform.keys())
+        self.assertNotIn("scale", Transform.keys())
+        self.assertNotIn("base_batch_transform", Transform.keys())
+
+    def test_collate(self):
+        s = self.data_module
+        for batch_transform in ("collate", "main"):
+            loader = s.DataLoader(
+                "mock", self.dataset, batch_size=4, batch_transform=batch_transform
+            )
+            batches = list(loader)
+            self.assertEqual(len(batches), 25)
+            self.assertEqual(batches[1]["item1"].tolist(), [40, 50, 60, 70])
+            self.assertEqual(batches[1]["item2"].tolist(), [4, 5, 6, 7])
+            self.assertEqual(
+                loader.collate_fn.batch_transform is None,
+                batch_transform == "main",
+            )
+
+        with self.assertRaises(ValueError):
+            s.DataLoader("mock", self.dataset, batch_transform="worker")
+
+
+class TestCacheStats(TorchTestCase, ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+    ]
+
+    def test_workers(self):
+        s = self.data_module
+
+        @s.Resource.r
+        def id_list():
+            return list(range(20))
+
+        @s.Resource.r
+        def res1(id):
+            return id
+
+        @s.Item.r
+        def item1(id, res1):
+            return res1
+
+        s.item_keys.set(["item1"])
+        s.resource_cache.set({"stats": True})
+        dataset = s.get_dataset("", "", cfg="mock")
+
+        loader = s.DataLoader("mock", dataset, batch_size=4, num_workers=2)
+        for _ in range(2):
+            self.assertEqual(sum(len(batch["item1"]) for batch in loader), 20)
+
+        stats = loader.cache_stats().as_dict()
+        self.assertEqual(stats["res1"]["misses"], 40)
+        self.assertEqual(stats["id_list"]["misses"], 1)
+
+        local_stats = s.DataLoader("mock", dataset, batch_size=4).cache_stats().as_dict()
+        self.assertNotIn("res1", local_stats)
+        self.assertEqual(local_stats["id_list"]["misses"], 1)
+
+        # Loaders over the same dataset keep statistics of their workers apart
+        other_loader = s.DataLoader(
+            "mock", dataset, batch_size=4, num_workers=2, worker_init_fn=int
+        )
+        self.assertIs(other_loader.worker_init_fn.worker_init_fn, int)
+        self.assertEqual(sum(len(batch["item1"]) for batch in other_loader), 20)
+        self.assertEqual(other_loader.cache_stats().as_dict()["res1"]["misses"], 20)
+        self.assertEqual(loader.cache_stats().as_dict()["res1"]["misses"], 40)
+        self.assertIsNone(dataset._stats_sink_)
+
+        manager = loader._stats_manager_
+        del loader
+        gc.collect()
+        self.assertFalse(manager._process.is_alive())
+
+
+class TestShareResources(TorchTestCase, ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+    ]
+
+    def test_workers(self):
+        import numpy as np
+
+        s = self.data_module
+
+        @s.Resource.r
+        def id_list():
+            return list(range(8))
+
+        @s.Resource.r
+        def table():
+            return torch.arange(8) * 2
+
+        @s.Item.r
+        def item1(id, table):
+            return [table[id].item(), table.is_shared()]
+
+        s.item_keys.set(["item1"])
+        s.share_resources.set(True)
+        dataset = s.get_dataset("", "", cfg="mock")
+
+        loader = s.DataLoader("mock", dataset, batch_size=4, num_workers=2)
+        values, is_shared = zip(*(item for batch in loader for item in zip(*batch["item1"])))
+        self.assertEqual([v.item() for v in values], list(range(0, 16, 2)))
+        self.assertTrue(all(is_shared))
+        self.assertEqual(len(dataset), 8)
@@ -1,4 +1,6 @@
+import os
 import unittest
+import unittest.mock
 
 from nagisa.core.misc.testing import ReloadModuleTestCase
 
@@ -47,3 +49,434 @@ class TestGetDataset(BaseDatasetTestCase):
         ds = s.get_dataset("dataset2", "val", cfg="mock")
         expected = [{"img": Image(f"/path/dataset2/val/img_{x}.png")} for x in range(100)]
         self.assertEqual(list(ds), expected)
+
+
+class TestGetBatch(BaseDatasetTestCase):
+    def test_get_batch(self):
+        s = self.data_module
+        batches = []
+
+        s.item_keys.set(["x", "y"])
+
+        @s.Resource.r
+        def id_list():
+            return list(range(10, 20))
+
+        @s.Item.r
+        def x(ids):
+            batches.append(ids)
+            return [id * 2 for id in ids]
+
+        @s.Item.r
+        def y(id):
+            return -id
+
+        ds = s.get_dataset("dataset1", "train", cfg="mock")
+        expected = [{"x": 22, "y": -11}, {"x": 30, "y": -15}]
+        self.assertEqual(ds.get_batch([1, 5]), expected)
+        self.assertEqual(ds[[1, 5]], expected)
+        self.assertEqual(ds[1], expected[0])
+        self.assertEqual(batches, [[11, 15], [11, 15], [11]])
+
+
+class TestLocalScope(BaseDatasetTestCase):
+    def _register(self, options):
+        s = self.data_module
+        self.computed = []
+
+        @s.Resource.r
+        def id_list():
+            return list(range(10))
+
+        @s.Resource.r
+        def raw(id):
+            self.computed.append(id)
+            return id * 10
+
+        @s.Item.r
+        def x(id, raw):
+            return raw
+
+        s.item_keys.set(["x"])
+        s.resource_cache.set(options)
+        return s.get_dataset("dataset1", "train", cfg="mock")
+
+    def test_local_resources_dropped(self):
+        ds = self._register({})
+        for _ in range(2):
+            self.assertEqual([item["x"] for item in ds], list(range(0, 100, 10)))
+        self.assertEqual(self.computed, list(range(10)) * 2)
+        # Only the id list is kept
+        self.assertEqual(len(ds._data_resolver_.__cache__), 1)
+
+    def test_local_resources_retained(self):
+        ds = self._register({"retain": {"max_entries": 4}})
+        ds.get_batch([0, 1])
+        ds.get_batch([0, 1])
+        self.assertEqual(self.computed, [0, 1])
+        for _ in range(2):
+            list(ds)
+        self.assertEqual(len(ds._data_resolver_.__cache__.retained), 4)
+
+
+class TestReplay(BaseDatasetTestCase):
+    def test_replay(self):
+        import tempfile
+        import numpy as np
+
+        s = self.data_module
+        resolved, transformed = [], []
+
+        @s.Resource.r
+        def id_list():
+            return list(range(5))
+
+        @s.Item.r
+        def x(id):
+            resolved.append(id)
+            return np.full(3, id)
+
+        class Double(s.BaseTransform):
+            _deterministic_ = True
+
+            def _t_x_(self, x, _):
+                transformed.append(int(x[0]))
+                return x * 2
+
+        class Shift(s.BaseTransform):
+            def _t_x_(self, x, _):
+                return x + 1
+
+        s.item_keys.set(["x"])
+        s.trans_seq.set(["double", "shift"])
+        with tempfile.TemporaryDirectory() as root:
+            s.replay_dir.set(root)
+            for _ in range(2):
+                ds = s.get_dataset("dataset1", "train", cfg="mock")
+                for _ in range(2):
+                    self.assertEqual([int(item["x"][0]) for item in ds], [1, 3, 5, 7, 9])
+                    self.assertEqual([int(items["x"][1]) for items in ds[[4, 0]]], [9, 1])
+            self.assertEqual(resolved, list(range(5)))
+            self.assertEqual(transformed, list(range(5)))
+            self.assertTrue(os.path.isdir(os.path.join(root, "dataset1", "train")))
+
+    def test_replay_keyed_and_refreshed_once(self):
+        import tempfile
+        import numpy as np
+        from nagisa.dl.torch.misc.records import RecordReader
+
+        s = self.data_module
+        resolved, refreshed = [], []
+        kwargs = {"mul": {"factor": 2}}
+
+        @s.Resource.r
+        def id_list():
+            return list(range(5))
+
+        @s.Item.r
+        def x(id):
+            resolved.append(id)
+            return np.full(3, id)
+
+        class Mul(s.BaseTransform):
+            _deterministic_ = True
+
+            class _kwargs_schema_:
+                factor: int = 1
+
+            def _t_x_(self, x, _):
+                return x * self.kwargs.factor
+
+        refresh = RecordReader.refresh
+
+        def _refresh(reader):
+            refreshed.append(reader.root)
+            return refresh(reader)
+
+        s.item_keys.set(["x"])
+        s.trans_seq.set(["mul"])
+        s.trans_kwargs.set(lambda: kwargs)
+        with tempfile.TemporaryDirectory() as root, \
+                unittest.mock.patch.object(RecordReader, "refresh", _refresh):
+            s.replay_dir.set(root)
+            ds = s.get_dataset("dataset1", "train", cfg="mock")
+            for _ in range(3):
+                self.assertEqual([int(item["x"][0]) for item in ds], [0, 2, 4, 6, 8])
+            self.assertEqual(resolved, list(range(5)))
+            # Once on creation, then once per epoch
+            self.assertEqual(len(refreshed), 4)
+
+            kwargs = {"mul": {"factor": 3}}
+            ds = s.get_dataset("dataset1", "train", cfg="mock")
+            self.assertEqual([int(item["x"][0]) for item in ds], [0, 3, 6, 9, 12])
+            self.assertEqual(resolved, list(range(5)) * 2)
+            self.assertEqual(len(set(refreshed)), 2)
+
+    def test_replay_keyed_by_ids(self):
+        import tempfile
+
+        s = self.data_module
+        ids = [0, 1, 2]
+
+        @s.Resource.r
+        def id_list():
+            return ids
+
+        @s.Item.r
+        def x(id):
+            return id
+
+        class Double(s.BaseTransform):
+            _deterministic_ = True
+
+            def _t_x_(self, x, _):
+                return x * 2
+
+        s.item_keys.set(["x"])
+        s.trans_seq.set(["double"])
+        with tempfile.TemporaryDirectory() as root:
+            s.replay_dir.set(root)
+            ds = s.get_dataset("dataset1", "train", cfg="mock")
+            self.assertEqual([item["x"] for item in ds], [0, 2, 4])
+            ids = [2, 0, 1]
+            ds = s.get_dataset("dataset1", "train", cfg="mock")
+            self.assertEqual([item["x"] for item in ds], [4, 0, 2])
+            ids = ["a", "b", "c"]
+            ds = s.get_dataset("dataset1", "train", cfg="mock")
+            self.assertEqual([item["x"] for item in ds], ["aa", "bb", "cc"])
+
+
+class TestTransformCache(BaseDatasetTestCase):
+    def setUp(self):
+        super().setUp()
+        import numpy as np
+
+        s = self.data_module
+        self.resolved, self.transformed = [], []
+
+        @s.Resource.r
+        def id_list():
+            return list(range(5))
+
+        @s.Item.r
+        def x(id):
+            self.resolved.append(id)
+            return np.full(3, id)
+
+        class Double(s.BaseTransform):
+            _deterministic_ = True
+
+            def _t_x_(self_, x, _):
+                self.transformed.append(int(x[0]))
+                return x * 2
+
+        class Shift(s.BaseTransform):
+            def _t_x_(self, x, _):
+                return x + 1
+
+        self.trans_seq = ["double", "shift"]
+        s.item_keys.set(["x"])
+        s.trans_seq.set(lambda: self.trans_seq)
+
+    def test_memory(self):
+        s = self.data_module
+        s.transform_cache.set({"stats": True})
+        ds = s.get_dataset("dataset1", "train", cfg="mock")
+        for _ in range(3):
+            self.assertEqual([int(item["x"][0]) for item in ds], [1, 3, 5, 7, 9])
+            self.assertEqual([int(items["x"][1]) for items in ds[[4, 0]]], [9, 1])
+        self.assertEqual(self.resolved, list(range(5)))
+        self.assertEqual(self.transformed, list(range(5)))
+
+        stats = ds.transform_cache_stats().as_dict()
+        self.assertEqual(list(stats), ["double"])
+        self.assertEqual(stats["double"]["misses"], 5)
+        self.assertEqual(stats["double"]["hits"], 16)
+        self.assertEqual(stats["double"]["nbytes"], 5 * 3 * 8)
+
+    def test_disk(self):
+        import tempfile
+
+        s = self.data_module
+        with tempfile.TemporaryDirectory() as root:
+            s.transform_cache.set({"disk_dir": root, "max_entries": 2, "stats": True})
+            for _ in range(2):
+                ds = s.get_dataset("dataset1", "train", cfg="mock")
+                for _ in range(2):
+                    self.assertEqual([int(item["x"][0]) for item in ds], [1, 3, 5, 7, 9])
+            self.assertEqual(self.resolved, list(range(5)))
+            self.assertEqual(self.transformed, list(range(5)))
+            self.assertEqual(ds.transform_cache_stats().totals()["hits"], 10)
+
+    def test_kwargs_without_digest(self):
+        s = self.data_module
+
+        class Apply(s.BaseTransform):
+            _deterministic_ = True
+
+            def __init__(self, *, fn=None, **kwargs):
+                super().__init__(**kwargs)
+                self.fn = fn
+
+            def _t_x_(self, x, _):
+                return self.fn(x)
+
+        self.trans_seq = ["apply", "shift"]
+        s.trans_kwargs.set({"apply": {"fn": lambda x: x * 3}})
+        s.transform_cache.set({})
+        ds = s.get_dataset("dataset1", "train", cfg="mock")
+        with self.assertRaisesRegex(TypeError, "transform 'apply'"):
+            ds[0]
+
+        # Non-deterministic transforms are not cached, so their kwargs need no digest
+        Apply._deterministic_ = False
+        self.assertEqual([int(item["x"][0]) for item in ds], [1, 4, 7, 10, 13])
+        self.assertEqual(self.transformed, [])
+
+    def test_replay_dir_exclusive(self):
+        import tempfile
+
+        s = self.data_module
+        with tempfile.TemporaryDirectory() as root:
+            s.replay_dir.set(root)
+            s.transform_cache.set({})
+            with self.assertRaises(ValueError):
+                s.get_dataset("dataset1", "train", cfg="mock")
+
+
+class TestTransformCacheConfig(BaseDatasetTestCase):
+    def test_cfg(self):
+        import tempfile
+        from nagisa.core.state.config import ConfigNode
+
+        s = self.data_module
+
+        @ConfigNode.from_class
+        class Config:
+            scale: int = 1
+
+        @s.Resource.r
+        def id_list():
+            return list(range(3))
+
+        @s.Item.r
+        def x(cfg, id):
+            return id * cfg.scale
+
+        class Double(s.BaseTransform):
+            _deterministic_ = True
+
+            def _t_x_(self, x, _):
+                return x * 2
+
+        s.item_keys.set(["x"])
+        s.trans_seq.set(["double"])
+        with tempfile.TemporaryDirectory() as root:
+            s.transform_cache.set({"disk_dir": root})
+            cfg = Config()
+            ds = s.get_dataset("dataset1", "train", cfg=cfg)
+            self.assertEqual([item["x"] for item in ds], [0, 2, 4])
+
+            cfg.scale = 100
+            self.assertEqual([item["x"] for item in ds], [0, 200, 400])
+            ds = s.get_dataset("dataset1", "train", cfg=cfg)
+            self.assertEqual([item["x"] for item in ds], [0, 200, 400])
+            ds = s.get_dataset("dataset1", "train", cfg=Config())
+            self.assertEqual([item["x"] for item in ds], [0, 2, 4])
+
+
+class TestStreamingDataset(BaseDatasetTestCase):
+    def test_streaming(self):
+        from unittest import mock
+
+        s = self.data_module
+        calls = []
+
+        @s.Resource.r
+        def offset():
+            return 100
+
+        @s.Resource.r
+        def id_list(offset):
+            calls.append(offset)
+            return (offset + i for i in range(10))
+
+        @s.Item.r
+        def x(id):
+            return id
+
+        class Negate(s.BaseTransform):
+            def _t_x_(self, x, _):
+                return -x
+
+        s.item_keys.set(["x"])
+        s.trans_seq.set(["negate"])
+        ds = s.get_streaming_dataset("dataset1", "train", cfg="mock")
+        expected = [-(100 + i) for i in range(10)]
+        for _ in range(2):
+            self.assertEqual([items["x"] for items in ds], expected)
+        self.assertEqual(calls, [100, 100])
+
+        loader = s.DataLoader("mock", ds, batch_size=2, num_workers=2)
+        self.assertCountEqual([x for batch in loader for x in batch["x"].tolist()], expected)
+
+        module = __import__(s.StreamingDataset.__module__, fromlist=["_"])
+        seen = []
+        for rank in range(3):
+            with mock.patch.object(module, "get_rank", return_value=rank), \
+                    mock.patch.object(module, "get_world_size", return_value=3):
+                seen.append([items["x"] for items in ds])
+        self.assertEqual(seen[1], expected[1::3])
+        self.assertCountEqual(sum(seen, []), expected)
+
+
+class TestTransformPipeline(BaseDatasetTestCase):
+    def test_transforms_follow_kwargs(self):
+        from nagisa.core.state.config import ConfigNode
+
+        s = self.data_module
+        factor = 2
+
+        @ConfigNode.from_class
+        class Config:
+            scale: int = 1
+
+        @s.Resource.r
+        def id_list():
+            return [1, 2]
+
+        @s.Item.r
+        def x(id):
+            return id
+
+        class Mul(s.BaseTransform):
+            class _kwargs_schema_:
+                factor: int = 1
+
+            def _t_x_(self, x, _):
+                return x * self.kwargs.factor
+
+        s.item_keys.set(["x"])
+        s.trans_seq.set(["mul"])
+        s.trans_kwargs.set(lambda cfg: {"mul": {"factor": factor * cfg.scale}})
+        cfg = Config()
+        ds = s.get_dataset("dataset1", "train", cfg=cfg)
+        pipeline = ds.transform_pipeline
+        self.assertEqual([items["x"] for items in ds], [2, 4])
+        self.assertIs(ds.transform_pipeline, pipeline)
+
+        # Kwargs are looked up again at the start of each epoch
+        factor = 3
+        self.assertEqual(ds[0]["x"], 2)
+        loader = ds.as_loader(batch_size=2)
+        self.assertEqual([x for batch in loader for x in batch["x"].tolist()], [3, 6])
+        self.assertEqual(ds[0]["x"], 3)
+        self.assertIsNot(ds.transform_pipeline, pipeline)
+
+        # Config changes are followed on the next access
+        cfg.scale = 2
+        self.assertEqual(ds[0]["x"], 6)
+
+        streaming_ds = s.get_streaming_dataset("dataset1", "train", cfg=cfg)
+        factor = 4
+        self.assertEqual([items["x"] for items in streaming_ds], [8, 16])
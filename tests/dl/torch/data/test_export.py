@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class TestExportRecords(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+    ]
+
+    def setUp(self):
+        super().setUp()
+        s = self.data_module
+        self.resolved = []
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ids = [f"sample_{i}" for i in range(10)]
+
+        @s.Resource.r
+        def id_list():
+            return list(self.ids)
+
+        @s.Item.r
+        def img(id):
+            self.resolved.append(id)
+            return np.full((2, 3), int(id.rpartition("_")[2]), dtype=np.uint8)
+
+        @s.Item.r
+        def label(id):
+            return torch.tensor(int(id.rpartition("_")[2]))
+
+        class AddOne(s.BaseTransform):
+            def _t_img_(self, img, _):
+                return img + 1
+
+        s.item_keys.set(["img", "label"])
+        s.trans_seq.set(["add_one"])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def _check_export(self, num_workers):
+        s = self.data_module
+        root = self.tmpdir.name
+        dataset = s.get_dataset("dataset1", "train", cfg="mock")
+        s.export_records(dataset, root, shard_size=256, num_workers=num_workers)
+        shard_dir = os.path.join(root, "dataset1", "train")
+        self.assertGreater(len([f for f in os.listdir(shard_dir) if f.endswith(".bin")]), 1)
+        with self.assertRaises(FileExistsError):
+            s.export_records(dataset, root)
+
+        s.records_dir.set(root)
+        self.resolved.clear()
+        dataset = s.get_dataset("dataset1", "train", cfg="mock")
+        self.assertEqual(len(dataset), 10)
+        self.assertEqual(type(dataset._data_resolver_.get_id_list()).__name__, "StringIdList")
+        for i, items_dict in enumerate(dataset):
+            np.testing.assert_array_equal(items_dict["img"], np.full((2, 3), i + 1))
+            self.assertEqual(items_dict["label"].item(), i)
+        self.assertEqual(self.resolved, [])
+
+        loader = s.DataLoader("mock", dataset, batch_size=5, num_workers=num_workers)
+        self.assertEqual([batch["label"].tolist() for batch in loader], [[0, 1, 2, 3, 4],
+                                                                         [5, 6, 7, 8, 9]])
+
+    def test_export(self):
+        self._check_export(0)
+
+    def test_export_workers(self):
+        self._check_export(2)
+
+    def test_duplicate_ids(self):
+        s = self.data_module
+        self.ids = ["sample_0", "sample_1", "sample_0"]
+        dataset = s.get_dataset("dataset1", "train", cfg="mock")
+        with self.assertRaises(ValueError):
+            s.export_records(dataset, self.tmpdir.name)
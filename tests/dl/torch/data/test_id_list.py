@@ -0,0 +1,75 @@
+import pickle
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class TestCompactIdList(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['_id_list', 'nagisa.dl.torch.data._id_list'],
+    ]
+
+    def test_range(self):
+        self.assertEqual(self._id_list.compact_id_list(list(range(5, 100))), range(5, 100))
+        self.assertEqual(self._id_list.compact_id_list([9, 6, 3]), range(9, 2, -3))
+        self.assertEqual(self._id_list.compact_id_list([4]), range(4, 5))
+
+    def test_int(self):
+        ids = [3, 1, 4, 1, 5, 9, 2, 6]
+        compact = self._id_list.compact_id_list(ids)
+        self.assertIsInstance(compact, self._id_list.IntIdList)
+        self.assertEqual(compact, ids)
+        self.assertIs(type(compact[2]), int)
+        self.assertEqual(compact[-1], 6)
+        self.assertEqual(compact[2:5], [4, 1, 5])
+        with self.assertRaises(IndexError):
+            compact[8]
+
+    def test_str(self):
+        ids = ["a", "", "ünïcode", "img_0001.png"]
+        compact = self._id_list.compact_id_list(ids)
+        self.assertIsInstance(compact, self._id_list.StringIdList)
+        self.assertEqual(list(compact), ids)
+        self.assertEqual(compact[-2], "ünïcode")
+        self.assertEqual(pickle.loads(pickle.dumps(compact)), ids)
+
+    def test_unchanged(self):
+        for ids in ([], [1, "a"], [(1, 2)], [True, False], [2**70, 1, 5], range(3)):
+            self.assertIs(self._id_list.compact_id_list(ids), ids)
+
+    def test_digest(self):
+        m = self._id_list
+        for ids in ([1, 2, 3], [3, 1, 2], ["b", "a"], [(1, 2)]):
+            compact = m.compact_id_list(ids)
+            self.assertEqual(m.id_list_digest(compact), m.id_list_digest(m.compact_id_list(ids)))
+        digests = {
+            m.id_list_digest(m.compact_id_list(ids))
+            for ids in ([1, 2, 3], [3, 2, 1], [1, 3, 2], ["ab", "c"], ["a", "bc"], [(1, 2)])
+        }
+        self.assertEqual(len(digests), 6)
+
+
+class TestDatasetIdList(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+    ]
+
+    def test_dataset_holds_compact_id_list(self):
+        s = self.data_module
+
+        @s.Resource.r
+        def id_list():
+            return [f"sample_{i}" for i in range(100000)]
+
+        s.item_keys.set([])
+        dataset = s.get_dataset("", "", cfg="mock")
+        self.assertEqual(type(dataset._id_list_).__name__, "StringIdList")
+        # The resource itself is returned as is
+        resolver_id_list = dataset._data_resolver_.get_id_list()
+        self.assertIsInstance(resolver_id_list, list)
+        self.assertEqual(list(dataset._id_list_), resolver_id_list)
@@ -0,0 +1,121 @@
+import time
+import threading
+
+import numpy as np
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class BasePrefetchTestCase(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+    ]
+    cache_options = {"concurrent": True}
+
+    def setUp(self):
+        super().setUp()
+        s = self.data_module
+        self.computed = []
+        self.lock = threading.Lock()
+
+        @s.Resource.r
+        def id_list():
+            return list(range(20))
+
+        @s.Resource.r
+        def offset():
+            return 100
+
+        @s.Resource.r
+        def raw(id, offset):
+            with self.lock:
+                self.computed.append(id)
+            return np.full(10, id + offset, dtype=np.int64)
+
+        @s.Item.r
+        def x(id, raw):
+            return int(raw[0])
+
+        s.item_keys.set(["x"])
+        s.resource_cache.set(self.cache_options)
+        self.dataset = s.get_dataset("", "", cfg="mock")
+
+    def tearDown(self):
+        if self.dataset._prefetcher_ is not None:
+            self.dataset._prefetcher_.close()
+        super().tearDown()
+
+
+class TestNonConcurrentCache(BasePrefetchTestCase):
+    cache_options = {}
+
+    def test_requires_concurrent_cache(self):
+        with self.assertRaises(ValueError):
+            self.dataset.enable_prefetch()
+
+
+class TestPrefetcher(BasePrefetchTestCase):
+    def test_prefetch_and_release(self):
+        prefetcher = self.dataset.enable_prefetch(window=4, threads=2)
+        resolver = self.dataset._data_resolver_
+        prefetcher.update([0, 1, 2, 3, 4, 5])
+        for future in list(prefetcher._scheduled_.values()):
+            future.result()
+        self.assertCountEqual(self.computed, [0, 1, 2, 3])
+        self.assertEqual(prefetcher.nbytes, 4 * 80)
+        # Prefetched entries are not mixed up with GLOBAL ones
+        self.assertFalse([key for key in resolver.__cache__._key_stack_()[0] if key[1] == "raw"])
+
+        prefetcher.update([0, 1])
+        self.assertEqual(prefetcher.nbytes, 2 * 80)
+        self.assertFalse(resolver.__cache__.has(("resource", "raw", 3)))
+        self.assertTrue(resolver.__cache__.has(("resource", "raw", 0)))
+
+        prefetcher.update([1], consumed=0)
+        self.assertEqual(self.dataset[0], {"x": 100})
+        self.assertFalse(resolver.__cache__.has(("resource", "raw", 0)))
+        self.assertEqual(prefetcher.nbytes, 80)
+
+        # Samples outside the window are dropped
+        prefetcher.update([2])
+        self.assertFalse(resolver.__cache__.has(("resource", "raw", 1)))
+        self.assertEqual(prefetcher.nbytes, 0)
+
+    def test_max_bytes(self):
+        prefetcher = self.dataset.enable_prefetch(window=8, threads=1, max_bytes=80)
+        prefetcher.update([0])
+        prefetcher._scheduled_[0].result()
+        prefetcher.update([0, 1, 2])
+        self.assertEqual(list(prefetcher._scheduled_), [0])
+
+
+class TestPrefetchSampler(BasePrefetchTestCase):
+    def test_dataloader(self):
+        s = self.data_module
+        loader = s.DataLoader(
+            "mock",
+            self.dataset,
+            batch_size=4,
+            prefetch={"window": 6, "threads": 2},
+        )
+        for _ in range(2):
+            xs = [x for batch in loader for x in batch["x"].tolist()]
+            self.assertListEqual(xs, list(range(100, 120)))
+        self.assertEqual(sorted(set(self.computed)), list(range(20)))
+
+        # Prefetched LOCAL entries are released with their samples
+        cache = self.dataset._data_resolver_.__cache__
+        # Prefetch threads may still be returning when the epoch ends
+        for _ in range(100):
+            if self.dataset._prefetcher_.nbytes == 0 and not any(
+                    key[1] == "raw" for key in list(cache._store_)):
+                break
+            time.sleep(0.01)
+        self.assertFalse([key for key in cache._key_stack_()[0] if key[1] == "raw"])
+        self.assertFalse([key for key in cache._store_ if key[1] == "raw"])
+
+        with self.assertRaises(ValueError):
+            s.DataLoader("mock", self.dataset, num_workers=2, prefetch={})
@@ -1,7 +1,7 @@
 import unittest
 
 from nagisa.core.misc.cache import Scope
-from nagisa.dl.torch.data._registries import ResourceItemRegistry
+from nagisa.dl.torch.data._registries import ResourceItemRegistry, CollateRegistry
 
 
 class TestRegisterAndSelect(unittest.TestCase):
@@ -80,6 +80,18 @@ class TestRegisterAndSelect(unittest.TestCase):
             pass
 
         self.assertEqual(foo.__scope__, Scope.GLOBAL)
+        self.assertFalse(foo.__batched__)
+
+    def test_batched(self):
+        reg = ResourceItemRegistry("")
+
+        @reg.r
+        def foo(cfg, meta, ids, dep1):
+            pass
+
+        self.assertEqual(foo.__scope__, Scope.LOCAL)
+        self.assertTrue(foo.__batched__)
+        self.assertEqual(foo.__deps__, ("dep1", ))
 
     def test_deps(self):
         reg = ResourceItemRegistry("")
@@ -95,3 +107,94 @@ class TestRegisterAndSelect(unittest.TestCase):
             pass
 
         self.assertEqual(foo.__deps__, ("dep1", "dep2", "dep3"))
+
+    def test_matching_signature_not_wrapped(self):
+        reg = ResourceItemRegistry("")
+
+        def foo(cfg, meta, id, dep1):
+            pass
+
+        def bar(meta, id, dep1):
+            pass
+
+        registered = reg.r(foo)
+        self.assertIs(registered.__code__, foo.__code__)
+        self.assertEqual(registered.__deps__, ("dep1", ))
+        self.assertIsNot(reg.r(bar).__code__, bar.__code__)
+
+    def test_register_in_two_registries(self):
+        collate = CollateRegistry("")
+        resource = ResourceItemRegistry("")
+
+        def foo(cfg, name, batch):
+            return name, batch
+
+        collate.r(foo)
+        resource.r(foo)
+        f = resource.select("foo", None, None)
+        self.assertEqual(f.__deps__, ("name", "batch"))
+        self.assertEqual(f("cfg", "meta", "name", "batch"), ("name", "batch"))
+        f = collate.select("foo", None)
+        self.assertEqual(f("cfg", "name", "batch"), ("name", "batch"))
+
+
+class TestSelectCache(unittest.TestCase):
+    def test_cached(self):
+        reg = ResourceItemRegistry("")
+        calls = 0
+
+        def cond(c, m):
+            nonlocal calls
+            calls += 1
+            return m == "bar"
+
+        @reg.r("foo")
+        @reg.when(cond)
+        def foo1(cfg, meta):
+            pass
+
+        for _ in range(3):
+            self.assertIs(reg.select("foo", None, "bar"), foo1)
+        self.assertEqual(calls, 1)
+
+        @reg.r("foo")
+        def foo2(cfg, meta):
+            pass
+
+        self.assertIs(reg.select("foo", None, "bar"), foo1)
+        self.assertIs(reg.select("foo", None, "baz"), foo2)
+        self.assertEqual(calls, 3)
+
+    def test_config_change(self):
+        from nagisa.core.state.config import ConfigNode
+
+        @ConfigNode.from_class
+        class Config:
+            flag: bool = False
+
+        cfg = Config()
+        reg = ResourceItemRegistry("")
+
+        @reg.r("foo")
+        @reg.when(lambda c: c.flag)
+        def foo1(cfg):
+            pass
+
+        @reg.r("foo")
+        def foo2(cfg):
+            pass
+
+        self.assertIs(reg.select("foo", cfg, None), foo2)
+        cfg.flag = True
+        self.assertIs(reg.select("foo", cfg, None), foo1)
+
+    def test_unhashable_args(self):
+        reg = ResourceItemRegistry("")
+
+        @reg.r("foo")
+        @reg.when(lambda m: m[0] == 1)
+        def foo(meta):
+            pass
+
+        self.assertIs(reg.select("foo", None, [1]), foo)
+        self.assertIsNone(reg.select("foo", None, [2]))
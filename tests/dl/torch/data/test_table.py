@@ -0,0 +1,123 @@
+import copy
+import pickle
+import tempfile
+
+import numpy as np
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class BaseTableTestCase(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch',
+    ]
+    attach = [
+        ['data_module', 'nagisa.dl.torch.data'],
+    ]
+
+    def _records(self):
+        return [
+            {"id": f"img_{i}", "label": i % 3, "box": [i, i, i + 1, i + 1], "name": f"n{i}ü"}
+            for i in (5, 2, 9, 7)
+        ]
+
+
+class TestColumnarTable(BaseTableTestCase):
+    def test_string_ids(self):
+        table = self.data_module.ColumnarTable.from_records(self._records())
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.fields, ("label", "box", "name"))
+        self.assertEqual(table.index("img_9"), 2)
+        self.assertEqual(table.get("img_7", "label"), 1)
+        self.assertIs(type(table.get("img_7", "label")), int)
+        self.assertEqual(table.get("img_2", "name"), "n2ü")
+        np.testing.assert_array_equal(table.get("img_9", "box"), [9, 9, 10, 10])
+        self.assertEqual(table["img_5"]["label"], 2)
+        self.assertIn("img_2", table)
+        self.assertNotIn("img_3", table)
+        self.assertNotIn(3, table)
+        with self.assertRaises(KeyError):
+            table.get("img_10", "label")
+
+    def test_int_ids(self):
+        ColumnarTable = self.data_module.ColumnarTable
+        table = ColumnarTable(range(10, 20), {"x": np.arange(10) * 2})
+        self.assertIsNone(table._order_)
+        self.assertEqual(table.get(13, "x"), 6)
+        self.assertNotIn(20, table)
+        self.assertNotIn(9, table)
+
+        table = ColumnarTable([30, 10, 20], {"x": [3, 1, 2]})
+        self.assertEqual([table.get(id, "x") for id in (10, 20, 30)], [1, 2, 3])
+        self.assertNotIn(15, table)
+
+        with self.assertRaises(ValueError):
+            ColumnarTable([1, 2], {"x": [1]})
+
+    def test_save_and_load(self):
+        ColumnarTable = self.data_module.ColumnarTable
+        table = ColumnarTable.from_records(self._records())
+        with tempfile.TemporaryDirectory() as root:
+            table.save(root)
+            for mmap in (True, False):
+                loaded = ColumnarTable.load(root, mmap=mmap)
+                self.assertEqual(isinstance(loaded.column("label"), np.memmap), mmap)
+                for record in self._records():
+                    row = loaded.row(record["id"])
+                    self.assertEqual(row["label"], record["label"])
+                    self.assertEqual(row["name"], record["name"])
+                    np.testing.assert_array_equal(row["box"], record["box"])
+
+            # Memory-mapped tables are pickled by path
+            loaded = ColumnarTable.load(root)
+            self.assertLess(len(pickle.dumps(loaded)), 200)
+            self.assertEqual(pickle.loads(pickle.dumps(loaded)).get("img_9", "name"), "n9ü")
+            self.assertEqual(copy.deepcopy(table).get("img_9", "name"), "n9ü")
+
+    def test_field_names(self):
+        ColumnarTable = self.data_module.ColumnarTable
+        table = ColumnarTable(["b", "a"], {"ids": [1, 2], "order": ["x", "y"], "../up": [3, 4]})
+        with tempfile.TemporaryDirectory() as root:
+            table.save(root)
+            loaded = ColumnarTable.load(root)
+            self.assertEqual(loaded.row("a"), {"ids": 2, "order": "y", "../up": 4})
+            self.assertEqual(loaded.index("b"), 0)
+
+        for name in ("", 1):
+            with self.assertRaises(ValueError):
+                ColumnarTable([1], {name: [1]})
+
+    def test_column_values(self):
+        import numpy as np
+
+        ColumnarTable = self.data_module.ColumnarTable
+        for values in ([1, None], ["a", 1], np.array([1, "a"], dtype=object)):
+            with self.assertRaisesRegex(TypeError, "Column label"):
+                ColumnarTable([1, 2], {"label": values})
+        with self.assertRaisesRegex(ValueError, "Column box"):
+            ColumnarTable([1, 2], {"box": [[1, 2], [3]]})
+
+        table = ColumnarTable([1, 2], {"box": [[1, 2], [3, 4]]})
+        self.assertEqual(table.get(2, "box").tolist(), [3, 4])
+
+
+class TestTableResource(BaseTableTestCase):
+    def test_local_items(self):
+        s = self.data_module
+        records = self._records()
+
+        @s.Resource.r
+        def annotations():
+            return s.ColumnarTable.from_records(records)
+
+        @s.Resource.r
+        def id_list(annotations):
+            return [record["id"] for record in records]
+
+        @s.Item.r
+        def label(id, annotations):
+            return annotations.get(id, "label")
+
+        s.item_keys.set(["label"])
+        dataset = s.get_dataset("", "", cfg="mock")
+        self.assertEqual([items["label"] for items in dataset], [2, 2, 0, 1])
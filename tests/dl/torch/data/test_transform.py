@@ -289,3 +289,141 @@ class TestApply(BaseTestCase):
         result = self.data_module.apply_transform(None, None, {"num": -10})
         self.assertEqual(result, {"num": 100})
         self.assertEqual(times, 1)
+
+
+class TestDispatch(BaseTestCase):
+    def test_handlers(self):
+        class Base(self.data_module.BaseTransform):
+            def _t_a_(self, a, _):
+                return a + 1
+
+        class Derived(Base):
+            def _t_b_(self, b, item_dict):
+                return b + item_dict["a"]
+
+        self.assertEqual(sorted(Derived._handlers_), ["a", "b"])
+        self.assertFalse(Derived._has_default_)
+
+        item_dict = {"a": 1, "b": 10, "c": 100}
+        result = Derived()(item_dict)
+        self.assertEqual(result, {"a": 2, "b": 11, "c": 100})
+        self.assertEqual(list(result), ["a", "b", "c"])
+        self.assertEqual(item_dict, {"a": 1, "b": 10, "c": 100})
+
+    def test_handler_kinds(self):
+        class Kinds(self.data_module.BaseTransform):
+            offset = 100
+
+            @staticmethod
+            def _t_a_(a, _):
+                return a + 1
+
+            @classmethod
+            def _t_b_(cls, b, _):
+                return b + cls.offset
+
+            def _t_c_(self, c, _):
+                return c
+
+        transform = Kinds()
+        transform._t_c_ = lambda c, _: -c
+        transform._t_d_ = lambda d, _: d * 2
+        self.assertEqual(
+            transform({"a": 1, "b": 2, "c": 3, "d": 4}),
+            {"a": 2, "b": 102, "c": -3, "d": 8},
+        )
+        self.assertEqual(Kinds()({"c": 3, "d": 4}), {"c": 3, "d": 4})
+
+    def test_inplace(self):
+        class Inc(self.data_module.BaseTransform):
+            _inplace_ = True
+
+            def _t_a_(self, a, _):
+                return a + 1
+
+        class IncDefault(Inc):
+            def _default_(self, item, item_key, item_dict):
+                return item * 2
+
+        item_dict = {"a": 1, "b": 10}
+        self.assertIs(Inc()(item_dict), item_dict)
+        self.assertEqual(item_dict, {"a": 2, "b": 10})
+
+        self.assertIs(IncDefault()(item_dict), item_dict)
+        self.assertEqual(item_dict, {"a": 3, "b": 20})
+
+        # Handlers run in the sorted order of their names, not in the order of items
+        class Sum(self.data_module.BaseTransform):
+            _inplace_ = True
+
+            def _t_a_(self, a, item_dict):
+                return a + item_dict["b"]
+
+            def _t_b_(self, b, item_dict):
+                return b + item_dict["a"]
+
+        self.assertEqual(Sum()({"b": 1, "a": 1}), {"b": 3, "a": 2})
+
+
+class TestTransformPipeline(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.instances = 0
+        test_case = self
+
+        class Pow(self.data_module.BaseTransform):
+            class _kwargs_schema_:
+                pow: int = 2
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                test_case.instances += 1
+
+            def _t_num_(self, n, _):
+                return n ** self.kwargs.pow
+
+        class Neg(self.data_module.BaseTransform):
+            def _t_num_(self, n, _):
+                return -n
+
+    def test_kwargs_invalidate(self):
+        s = self.data_module
+        kwargs = {"pow": {"pow": 2}}
+        s.trans_seq.set(["pow", "neg"])
+        s.trans_kwargs.set(lambda: kwargs)
+
+        self.assertEqual(s.apply_transform(None, None, {"num": 3}), {"num": -9})
+        pipeline = s.get_transform_pipeline(None, None)
+        self.assertIs(s.get_transform_pipeline(None, None), pipeline)
+        self.assertFalse(pipeline.is_stale())
+
+        kwargs = {"pow": {"pow": 3}}
+        self.assertTrue(pipeline.is_stale())
+        self.assertEqual(s.apply_transform(None, None, {"num": 3}), {"num": -27})
+        self.assertEqual(self.instances, 2)
+
+        # Entries of transforms not in `trans_seq` do not matter
+        kwargs = {"pow": {"pow": 3}, "other": {"x": 1}}
+        self.assertEqual(s.apply_transform(None, None, {"num": 3}), {"num": -27})
+        self.assertEqual(self.instances, 2)
+
+    def test_pipeline(self):
+        import copy
+
+        s = self.data_module
+        s.trans_seq.set(["pow", "neg"])
+        pipeline = s.TransformPipeline(None, None, timing=True)
+        self.assertEqual(len(pipeline), 2)
+        self.assertEqual(pipeline({"num": 3}), {"num": -9})
+        self.assertEqual(pipeline({"num": 3}, stop=1), {"num": 9})
+        self.assertEqual(pipeline({"num": 3}, start=1), {"num": -3})
+
+        timings = pipeline.timings()
+        self.assertEqual([(key, calls) for key, calls, _ in timings], [("pow", 2), ("neg", 2)])
+        self.assertTrue(all(seconds >= 0 for _, _, seconds in timings))
+        pipeline.reset_timings()
+        self.assertEqual(pipeline.timings()[0][1], 0)
+
+        copied = copy.deepcopy(pipeline)
+        self.assertEqual(copied({"num": 2}), {"num": -4})
+        self.assertTrue(copied.timing)
@@ -0,0 +1,76 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import torch
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class TestRecords(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch.misc.records',
+    ]
+    attach = [
+        ['records', 'nagisa.dl.torch.misc.records'],
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def _record(self, i):
+        return {
+            "array": np.arange(12, dtype=np.float32).reshape(3, 4)[:, ::2] + i,
+            "tensor": torch.arange(i, dtype=torch.int16),
+            "scalar": torch.tensor(i),
+            "name": f"record_{i}",
+            "nested": [np.zeros((0, 3)), (np.array(i), )],
+        }
+
+    def assertRecordEqual(self, record, i):
+        expected = self._record(i)
+        np.testing.assert_array_equal(record["array"], expected["array"])
+        self.assertTrue(torch.equal(record["tensor"], expected["tensor"]))
+        self.assertEqual(record["scalar"].shape, ())
+        self.assertEqual(record["name"], expected["name"])
+        self.assertEqual(record["nested"][0].shape, (0, 3))
+        self.assertEqual(record["nested"][1][0], i)
+
+    def test_write_and_read(self):
+        with self.records.RecordWriter(self.root, shard_size=512) as writer:
+            for i in range(6):
+                writer.write(i, self._record(i))
+        self.assertGreater(len([f for f in os.listdir(self.root) if f.endswith(".bin")]), 1)
+
+        reader = self.records.RecordReader(self.root)
+        self.assertEqual(sorted(reader), list(range(6)))
+        for i in range(6):
+            self.assertRecordEqual(reader[i], i)
+        self.assertIsNone(reader.get(6))
+
+        # Loaded records are private copies on write
+        record = reader[2]
+        record["array"][0, 0] = -1
+        record["tensor"] += 1
+        self.assertRecordEqual(reader[2], 2)
+
+        reader = pickle.loads(pickle.dumps(reader))
+        self.assertRecordEqual(reader[5], 5)
+
+    def test_concurrent_writers(self):
+        reader = self.records.RecordReader(self.root)
+        writers = [self.records.RecordWriter(self.root) for _ in range(2)]
+        for i in range(4):
+            writers[i % 2].write(i, self._record(i))
+            self.assertIn(i, reader)
+            self.assertRecordEqual(reader[i], i)
+        for writer in writers:
+            writer.close()
+        self.assertEqual(len(reader), 4)
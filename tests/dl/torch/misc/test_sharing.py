@@ -0,0 +1,106 @@
+import pickle
+
+import numpy as np
+import torch
+
+from nagisa.core.misc.testing import ReloadModuleTestCase
+
+
+class TestShare(ReloadModuleTestCase):
+    drop_modules = [
+        '^nagisa.dl.torch.misc.sharing',
+    ]
+    attach = [
+        ['sharing', 'nagisa.dl.torch.misc.sharing'],
+    ]
+
+    def test_tensor(self):
+        t = torch.arange(4)
+        shared = self.sharing.share(t)
+        self.assertIsInstance(shared, self.sharing.SharedTensor)
+        self.assertIs(shared.get(), t)
+        self.assertTrue(t.is_shared())
+
+    def test_array(self):
+        arr = np.arange(6).reshape(2, 3)[:, ::2]
+        shared = self.sharing.share(arr)
+        self.assertIsInstance(shared, self.sharing.SharedArray)
+        np.testing.assert_array_equal(shared.get(), arr)
+        self.assertTrue(shared._tensor_.is_shared())
+
+        # Writes to the viewed array go to shared memory
+        shared.get()[0, 0] = 100
+        self.assertEqual(shared.get()[0, 0], 100)
+
+    def test_list(self):
+        lst = [1, "a", {"b": [2, 3]}, None]
+        shared = self.sharing.share(lst)
+        self.assertIsInstance(shared, self.sharing.SharedList)
+        self.assertIs(shared.get(), shared)
+        self.assertEqual(len(shared), 4)
+        self.assertEqual(shared[2], {"b": [2, 3]})
+        self.assertEqual(shared[-1], None)
+        self.assertEqual(shared[1:3], ["a", {"b": [2, 3]}])
+        self.assertEqual(list(shared), lst)
+        self.assertEqual(shared, lst)
+        self.assertIn("a", shared)
+        with self.assertRaises(IndexError):
+            shared[4]
+
+        restored = pickle.loads(pickle.dumps(shared))
+        self.assertEqual(restored, lst)
+        self.assertEqual(len(self.sharing.share(())), 0)
+
+    def test_dict(self):
+        value = {"b": np.arange(3), "a": "c", "\u00e9": 1, "z": None}
+        shared = self.sharing.share(value)
+        self.assertIsInstance(shared, self.sharing.SharedDict)
+        self.assertIs(shared.get(), shared)
+        self.assertEqual(len(shared), 4)
+        self.assertEqual(list(shared), ["a", "b", "z", "\u00e9"])
+        self.assertEqual(shared["a"], "c")
+        np.testing.assert_array_equal(shared["b"], np.arange(3))
+        self.assertIsNone(shared["z"])
+        self.assertIn("\u00e9", shared)
+        self.assertNotIn("c", shared)
+        self.assertNotIn(1, shared)
+        self.assertEqual(shared.get("a"), "c")
+        self.assertEqual(shared.get("x", 0), 0)
+        with self.assertRaises(KeyError):
+            shared["x"]
+
+        restored = pickle.loads(pickle.dumps(shared))
+        self.assertEqual(restored["a"], "c")
+        self.assertEqual(list(restored), list(shared))
+
+        shared = self.sharing.share({3: "c", -1: "a", 2**40: "b"})
+        self.assertEqual(list(shared), [-1, 3, 2**40])
+        self.assertEqual(shared[np.int64(3)], "c")
+        self.assertNotIn("3", shared)
+        self.assertNotIn(2**70, shared)
+        self.assertEqual(shared, {3: "c", -1: "a", 2**40: "b"})
+        self.assertEqual(len(self.sharing.share({})), 0)
+
+        for value in ({1: "a", "b": 2}, {(1, 2): 3}, {2**70: 1}):
+            with self.assertRaises(TypeError):
+                self.sharing.share(value)
+
+    def test_blob(self):
+        from unittest import mock
+
+        value = {"a", "b"}
+        shared = self.sharing.share(value)
+        self.assertIsInstance(shared, self.sharing.SharedBlob)
+        self.assertIs(shared.get(), shared.get())
+        self.assertEqual(shared.get(), value)
+        self.assertEqual(pickle.loads(pickle.dumps(shared)).get(), value)
+
+        # Forked processes unpickle their own copy
+        parent_value = shared.get()
+        with mock.patch("os.getpid", return_value=-1):
+            self.assertIsNot(shared.get(), parent_value)
+            self.assertEqual(shared.get(), value)
+
+    def test_idempotent(self):
+        shared = self.sharing.share([1])
+        self.assertIs(self.sharing.share(shared), shared)